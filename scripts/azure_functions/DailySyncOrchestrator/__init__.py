@@ -0,0 +1,6 @@
+import azure.durable_functions as df
+from shared_code.orchestration import daily_sync
+
+# Fan-out por shard/dimensión y una sola carga transaccional (ver
+# shared_code/orchestration.py)
+main = df.Orchestrator.create(daily_sync)
@@ -0,0 +1,30 @@
+import logging
+from datetime import datetime, timezone
+import azure.durable_functions as df
+import azure.functions as func
+
+ORCHESTRATOR = "DailySyncOrchestrator"
+
+
+def in_progress(status):
+    # Instancia del día todavía pendiente o corriendo
+    return bool(status) and status.runtime_status in (df.OrchestrationRuntimeStatus.Pending,
+                                                      df.OrchestrationRuntimeStatus.Running)
+
+
+def instance_id(day=None):
+    # Una instancia por día: DailySyncStatus la encuentra sin guardar el id
+    day = day or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    return f"daily-sync-{day}"
+
+
+async def main(DailySyncTimer: func.TimerRequest, starter: str) -> None:
+    client = df.DurableOrchestrationClient(starter)
+    current = instance_id()
+
+    if in_progress(await client.get_status(current)):
+        logging.info(f"⏳ {current} sigue en curso, no se inicia otra")
+        return
+
+    await client.start_new(ORCHESTRATOR, current, {})
+    logging.info(f"🚀 Orquestación iniciada: {current}")
@@ -0,0 +1,35 @@
+import json
+import azure.durable_functions as df
+import azure.functions as func
+from DailySyncStarter import ORCHESTRATOR, in_progress, instance_id
+
+# GET  /api/daily-sync/{día}  -> estado y avance (custom status) del día
+# POST /api/daily-sync        -> lanza la sincronización ahora (body: input);
+#                                409 si la instancia del día sigue en curso
+
+
+async def main(req: func.HttpRequest, starter: str) -> func.HttpResponse:
+    client = df.DurableOrchestrationClient(starter)
+    current = instance_id(req.route_params.get("day"))
+
+    if req.method == "POST":
+        if in_progress(await client.get_status(current)):
+            return func.HttpResponse(json.dumps({"instance_id": current, "status": "running"}), status_code=409,
+                                     mimetype="application/json")
+        await client.start_new(ORCHESTRATOR, current, req.get_json() if req.get_body() else {})
+        return client.create_check_status_response(req, current)
+
+    status = await client.get_status(current)
+    if not status or status.runtime_status is None:
+        return func.HttpResponse(json.dumps({"instance_id": current, "status": "not_found"}), status_code=404,
+                                 mimetype="application/json")
+
+    body = {
+        "instance_id": current,
+        "status": status.runtime_status.value,
+        "progress": status.custom_status,
+        "output": status.output,
+        "created": str(status.created_time),
+        "updated": str(status.last_updated_time),
+    }
+    return func.HttpResponse(json.dumps(body, default=str), mimetype="application/json")
@@ -0,0 +1,9 @@
+import time
+from shared_code.orchestration import FETCH_DIMENSION
+
+
+def main(payload: dict):
+    # pandas/sqlalchemy/Blob se importan en la primera invocación, no al cargar
+    started = time.perf_counter()
+    from shared_code.sync_activities import run_activity
+    return run_activity(FETCH_DIMENSION, payload, started)
@@ -1,95 +1,170 @@
+import asyncio
 import logging
 import os
-import pandas as pd
-import requests
+import time
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import create_engine, text
-from azure.storage.blob import BlobServiceClient
 import azure.functions as func
 from dotenv import load_dotenv
+from shared_code.resources import (get_async_blob_container, get_backup_format, get_blob_container, get_checkpoints,
+                                   get_engine, log_startup)
+from shared_code.sellers import DOCUMENTS_EXPAND
 
 load_dotenv(".env")
 
-def main(UpdateDocumentTimer: func.TimerRequest) -> None:
-    logging.info("⏰ Ejecutando función UpdatePayments")
+# sqlalchemy, pyarrow, aiohttp y el SDK de Blob se importan dentro de las
+# funciones que los usan: cargar el módulo (que el worker hace con todas las
+# funciones de la app) no los paga. pandas no se usa: las filas viajan como
+# Records. El engine, los clientes de Blob y los checkpoints viven en
+# shared_code.resources y se reutilizan en caliente.
 
-    ACCESS_TOKEN = os.environ["BSALE_ACCESS_TOKEN"]
-    AZURE_BLOB_CONN_STR = os.environ["AZURE_BLOB_CONN_STR"]
-    BLOB_CONTAINER = os.environ["BLOB_CONTAINER_NAME"]
-    POSTGRES_HOST = os.environ["POSTGRES_HOST"]
-    POSTGRES_DB = os.environ["POSTGRES_DB"]
-    POSTGRES_USER = os.environ["POSTGRES_USER"]
-    POSTGRES_PASSWORD = os.environ["POSTGRES_PASSWORD"]
-    POSTGRES_PORT = os.environ.get("POSTGRES_PORT", "5432")
-
-    pg_engine = create_engine(
-        f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}?sslmode=require"
-    )
-    blob_service = BlobServiceClient.from_connection_string(AZURE_BLOB_CONN_STR)
-    container_client = blob_service.get_container_client(BLOB_CONTAINER)
+# BSALE_ASYNC_MODE=0 vuelve a la descarga síncrona con requests
+ASYNC_MODE = os.environ.get("BSALE_ASYNC_MODE", "1") == "1"
 
-    with pg_engine.connect() as conn:
-        result = conn.execute(text("SELECT MAX(payment_date) FROM pagos"))
-        last_payment_timestamp = result.scalar()
+ENTITY = "documentos"
+
+
+def window_params(window):
+    # La ventana se pide desde el último offset confirmado en el checkpoint
+    return {
+        "emissiondaterange": f"[{window.window_start},{window.window_end}]",
+        "expand": DOCUMENTS_EXPAND,
+        "offset": window.last_offset
+    }
+
+
+def build_batch(window, offset, documentos, detalles):
+    # Blobs y tablas de un lote. El nombre del blob lleva el offset final del
+    # lote, así reprocesarlo sobrescribe el mismo blob. Las filas van como
+    # Records al respaldo y al COPY, sin pasar por pandas.
+    from shared_code.documents import DetailRecord, DocumentRecord
+    from shared_code.records import Records
+
+    backup_format = get_backup_format()
+    docs = Records(DocumentRecord._fields, documentos)
 
-    if last_payment_timestamp is None:
-        last_saved_datetime = datetime.now(timezone.utc) - timedelta(days=90)
+    suffix = f"{window.window_start}_to_{window.window_end}_{offset:07d}{backup_format.extension}"
+    blobs = {f"documentos/documentos_{suffix}": backup_format.dumps(docs, "documentos")}
+    tables = {"documentos": docs}
+
+    if detalles:
+        details = Records(DetailRecord._fields, detalles)
+        blobs[f"document_details/document_details_{suffix}"] = backup_format.dumps(details, "document_details")
+        tables["document_details"] = details
     else:
-        last_saved_datetime = pd.to_datetime(last_payment_timestamp, unit="s").normalize() + timedelta(days=1)
+        logging.info("⚠️ No se encontraron detalles en el lote.")
 
-    start_ts = int(last_saved_datetime.timestamp())
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_ts = int(today.timestamp())
+    return blobs, tables
 
-    if start_ts >= yesterday_ts:
-        logging.info("⚠️ No hay nuevos pagos para procesar.")
-        return
 
-    BASE_URL = "https://api.bsale.cl/v1/payments.json"
-    params = {
-        "recorddaterange": f"[{start_ts},{yesterday_ts}]",
-        "limit": 50,
-        "offset": 0
-    }
-    headers = {"access_token": ACCESS_TOKEN}
+def sync_window(access_token, conn_str, container, pg_engine, checkpoints, window):
+    from shared_code.bsale_client import client_from_env
+    from shared_code.documents import DocumentParser
+
+    with client_from_env(access_token) as client:
+        parser = DocumentParser(client)
+        for offset, documents in client.page_batches("documents.json", window_params(window)):
+            blobs, tables = build_batch(window, offset, *parser.parse_all(documents))
+            upload_blobs(conn_str, container, blobs)
+            load_tables(pg_engine, tables)
+            checkpoints.advance(ENTITY, offset)
+    logging.info(f"👤 Consultas extra de vendedores: {parser.sellers.lookups}")
+    logging.info(f"🔍 Detalles truncados re-consultados: {parser.detail_fetches}")
+    logging.info(f"📊 Peticiones a Bsale: {dict(client.stats)}")
+
+
+async def async_window(access_token, conn_str, container, pg_engine, checkpoints, window):
+    from shared_code.bsale_async import async_client_from_env, parse_documents_async
+
+    async with async_client_from_env(access_token) as client:
+        async for offset, documents in client.page_batches("documents.json", window_params(window)):
+            blobs, tables = build_batch(window, offset, *await parse_documents_async(client, documents))
+            # El respaldo en Blob y la carga en PostgreSQL corren a la vez
+            await asyncio.gather(
+                upload_blobs_async(conn_str, container, blobs),
+                asyncio.to_thread(load_tables, pg_engine, tables)
+            )
+            await asyncio.to_thread(checkpoints.advance, ENTITY, offset)
+    logging.info(f"📊 Peticiones a Bsale: {dict(client.stats)}")
+
+
+def upload_blobs(conn_str, container, blobs):
+    container_client = get_blob_container(conn_str, container)
+    for blob_name, data in blobs.items():
+        container_client.get_blob_client(blob_name).upload_blob(data, overwrite=True)
+        logging.info(f"📄 Guardado en Blob: {blob_name}")
+
+
+async def upload_blobs_async(conn_str, container, blobs):
+    # El cliente aio se reutiliza entre invocaciones: no se cierra aquí
+    container_client = get_async_blob_container(conn_str, container)
+
+    async def upload(blob_name, data):
+        await container_client.get_blob_client(blob_name).upload_blob(data, overwrite=True)
+        logging.info(f"📄 Guardado en Blob: {blob_name}")
+
+    await asyncio.gather(*(upload(name, data) for name, data in blobs.items()))
+
+
+def load_tables(pg_engine, tables):
+    from shared_code.pg_copy import upsert_records
+
+    for table_name, records in tables.items():
+        # Upsert por clave natural: reprocesar un rango no duplica filas
+        result = upsert_records(pg_engine, records, table_name)
+        logging.info(f"✅ {result.rows} filas cargadas en PostgreSQL ({table_name})")
+
+
+def initial_start(pg_engine):
+    # Solo se usa la primera vez, mientras no exista checkpoint
+    from sqlalchemy import text
+    from shared_code.checkpoints import utc_midnight
+
+    with pg_engine.connect() as conn:
+        last_emission_timestamp = conn.execute(text("SELECT MAX(emission_date) FROM documentos")).scalar()
+
+    if last_emission_timestamp is None:
+        return (datetime.now(timezone.utc) - timedelta(days=90)).timestamp()
+    return utc_midnight(datetime.fromtimestamp(last_emission_timestamp, timezone.utc)).timestamp()
+
+
+async def main(UpdateDocumentTimer: func.TimerRequest) -> None:
+    started = time.perf_counter()
+    logging.info(f"⏰ Ejecutando función UpdateDocuments ({'async' if ASYNC_MODE else 'sync'})")
+
+    ACCESS_TOKEN = os.environ["BSALE_ACCESS_TOKEN"]
+    AZURE_BLOB_CONN_STR = os.environ["AZURE_BLOB_CONN_STR"]
+    BLOB_CONTAINER = os.environ["BLOB_CONTAINER_NAME"]
+
+    from shared_code.checkpoints import utc_midnight
+
+    # En frío esto importa sqlalchemy y crea engine y tabla de checkpoints;
+    # en caliente devuelve lo que ya quedó en shared_code.resources
+    checkpoints = await asyncio.to_thread(get_checkpoints)
+    pg_engine = get_engine()
+    log_startup("UpdateDocuments", started)
 
-    pagos = []
-    logging.info(f"🔄 Descargando pagos desde {start_ts} hasta {yesterday_ts}...")
+    yesterday_ts = int(utc_midnight().timestamp())
 
+    # Primero la ventana interrumpida (si la hay), luego la nueva hasta hoy
     while True:
-        res = requests.get(BASE_URL, headers=headers, params=params)
-        if res.status_code != 200:
-            logging.error(f"❌ Error en API: {res.status_code} - {res.text}")
-            break
-
-        items = res.json().get("items", [])
-        if not items:
-            break
-
-        for pay in items:
-            pagos.append({
-                "payment_id": pay.get("id"),
-                "payment_date": pay.get("recordDate"),
-                "amount": pay.get("amount"),
-                "payment_method": pay.get("payment_type", {}).get("id"),
-                "document_id": pay.get("document", {}).get("id"),
-                "client_id": pay.get("user", {}).get("id"),
-                "state": pay.get("state", {})
-            })
-
-        params["offset"] += params["limit"]
-
-    if not pagos:
-        logging.info("⚠️ No se encontraron pagos.")
-        return
-
-    df = pd.DataFrame(pagos)
-    df["payment_date"] = df["payment_date"].astype("int64")
-
-    blob_path = f"pagos/payments_{start_ts}_to_{yesterday_ts}.csv"
-    blob_client = container_client.get_blob_client(blob_path)
-    blob_client.upload_blob(df.to_csv(index=False), overwrite=True)
-    logging.info(f"📄 Pagos guardados en Blob Storage: {blob_path}")
-
-    df.to_sql("pagos", pg_engine, if_exists="append", index=False)
-    logging.info(f"✅ {len(df)} pagos insertados en la base de datos.")
+        window = await asyncio.to_thread(checkpoints.next_window, ENTITY, yesterday_ts, lambda: initial_start(pg_engine))
+        if window is None:
+            logging.info("⏳ No hay nuevos documentos para procesar.")
+            return
+
+        logging.info(f"🔄 Descargando documentos desde {window.window_start} hasta {window.window_end} "
+                     f"(offset {window.last_offset})...")
+        try:
+            if ASYNC_MODE:
+                await async_window(ACCESS_TOKEN, AZURE_BLOB_CONN_STR, BLOB_CONTAINER, pg_engine, checkpoints, window)
+            else:
+                await asyncio.to_thread(sync_window, ACCESS_TOKEN, AZURE_BLOB_CONN_STR, BLOB_CONTAINER,
+                                        pg_engine, checkpoints, window)
+        except Exception as exc:
+            # El checkpoint conserva ventana y offset: la próxima corrida retoma
+            await asyncio.to_thread(checkpoints.fail, ENTITY, exc)
+            raise
+
+        await asyncio.to_thread(checkpoints.complete, ENTITY)
+        if window.window_end >= yesterday_ts:
+            return
@@ -1,114 +1,163 @@
+import asyncio
 import logging
 import os
-import pandas as pd
-import requests
+import time
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import create_engine, text
-from azure.storage.blob import BlobServiceClient
 import azure.functions as func
 from dotenv import load_dotenv
+from shared_code.payments import payment_record
+from shared_code.resources import (get_async_blob_container, get_backup_format, get_blob_container, get_checkpoints,
+                                   get_engine, log_startup)
 
 load_dotenv(".env")
 
-def main(UpdatePaymentTimer: func.TimerRequest) -> None:
-    logging.info("⏰ Ejecutando función UpdateDocuments")
+# Imports pesados diferidos y recursos reutilizados en caliente, igual que en
+# UpdateDocuments
+
+# BSALE_ASYNC_MODE=0 vuelve a la descarga síncrona con requests
+ASYNC_MODE = os.environ.get("BSALE_ASYNC_MODE", "1") == "1"
+
+ENTITY = "pagos"
+
+
+def payment_batch(payments):
+    return {"pagos": [payment_record(pay) for pay in payments]}
+
+
+def shard_spools(conn_str, container):
+    # Cada shard (un día por defecto) guarda sus lotes y su offset en Blob:
+    # si la función se corta, los shards terminados no se vuelven a pedir
+    from shared_code.shards import shard_spool_key
+    from shared_code.spool import BlobSpool
+
+    container_client = get_blob_container(conn_str, container)
+    return lambda shard: BlobSpool(container_client, shard_spool_key(ENTITY, {}, shard))
+
+
+def build_backup(window, spools):
+    # Une los shards sin duplicados por payment_id (Records, sin pandas)
+    from shared_code.shards import merge_spool_records
+
+    records = merge_spool_records(spools, "pagos")
+    blob_path = f"pagos/payments_{window.window_start}_to_{window.window_end}{get_backup_format().extension}"
+    return blob_path, records
+
+
+def clear_spools(spools):
+    for spool in spools:
+        spool.clear()
+
+
+def sync_window(access_token, conn_str, container, pg_engine, window):
+    from shared_code.bsale_client import client_from_env
+    from shared_code.shards import plan_shards, run_shards
+
+    shards = plan_shards(window.window_start, window.window_end)
+    with client_from_env(access_token) as client:
+        spools = run_shards(client, "payments.json", {}, "recorddaterange", shards,
+                            shard_spools(conn_str, container), payment_batch, max_workers=client.max_workers)
+    logging.info(f"📊 Peticiones a Bsale: {dict(client.stats)}")
+
+    blob_path, records = build_backup(window, spools)
+    if records.empty:
+        logging.info("⚠️ No se encontraron pagos.")
+    else:
+        upload_blob(conn_str, container, blob_path, get_backup_format().dumps(records, "pagos"))
+        load_payments(pg_engine, records)
+    clear_spools(spools)
 
-    ACCESS_TOKEN = os.environ["BSALE_ACCESS_TOKEN"]
-    AZURE_BLOB_CONN_STR = os.environ["AZURE_BLOB_CONN_STR"]
-    BLOB_CONTAINER = os.environ["BLOB_CONTAINER_NAME"]
-    POSTGRES_HOST = os.environ["POSTGRES_HOST"]
-    POSTGRES_DB = os.environ["POSTGRES_DB"]
-    POSTGRES_USER = os.environ["POSTGRES_USER"]
-    POSTGRES_PASSWORD = os.environ["POSTGRES_PASSWORD"]
-    POSTGRES_PORT = os.environ.get("POSTGRES_PORT", "5432")
-
-    pg_engine = create_engine(
-        f"postgresql+psycopg2://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{POSTGRES_PORT}/{POSTGRES_DB}?sslmode=require"
-    )
-    blob_service = BlobServiceClient.from_connection_string(AZURE_BLOB_CONN_STR)
-    container_client = blob_service.get_container_client(BLOB_CONTAINER)
+
+async def async_window(access_token, conn_str, container, pg_engine, window):
+    from shared_code.bsale_async import async_client_from_env
+    from shared_code.shards import plan_shards, run_shards_async
+
+    shards = plan_shards(window.window_start, window.window_end)
+    async with async_client_from_env(access_token) as client:
+        spools = await run_shards_async(client, "payments.json", {}, "recorddaterange", shards,
+                                        shard_spools(conn_str, container), payment_batch)
+    logging.info(f"📊 Peticiones a Bsale: {dict(client.stats)}")
+
+    blob_path, records = await asyncio.to_thread(build_backup, window, spools)
+    if records.empty:
+        logging.info("⚠️ No se encontraron pagos.")
+    else:
+        # El respaldo en Blob y la carga en PostgreSQL corren a la vez
+        await asyncio.gather(
+            upload_blob_async(conn_str, container, blob_path, get_backup_format().dumps(records, "pagos")),
+            asyncio.to_thread(load_payments, pg_engine, records)
+        )
+    await asyncio.to_thread(clear_spools, spools)
+
+
+def upload_blob(conn_str, container, blob_name, data):
+    container_client = get_blob_container(conn_str, container)
+    container_client.get_blob_client(blob_name).upload_blob(data, overwrite=True)
+    logging.info(f"📄 Pagos guardados en Blob Storage: {blob_name}")
+
+
+async def upload_blob_async(conn_str, container, blob_name, data):
+    # El cliente aio se reutiliza entre invocaciones: no se cierra aquí
+    container_client = get_async_blob_container(conn_str, container)
+    await container_client.get_blob_client(blob_name).upload_blob(data, overwrite=True)
+    logging.info(f"📄 Pagos guardados en Blob Storage: {blob_name}")
+
+
+def load_payments(pg_engine, records):
+    # Upsert por payment_id: reprocesar un rango no duplica pagos
+    from shared_code.pg_copy import upsert_records
+
+    result = upsert_records(pg_engine, records, "pagos")
+    logging.info(f"✅ {result.rows} pagos cargados en la base de datos.")
+
+
+def initial_start(pg_engine):
+    # Solo se usa la primera vez, mientras no exista checkpoint
+    from sqlalchemy import text
+    from shared_code.checkpoints import utc_midnight
 
     with pg_engine.connect() as conn:
-        result = conn.execute(text("SELECT MAX(emission_date) FROM documentos"))
-        last_payment_timestamp = result.scalar()
+        last_payment_timestamp = conn.execute(text("SELECT MAX(payment_date) FROM pagos")).scalar()
 
     if last_payment_timestamp is None:
-        last_saved_datetime = datetime.now(timezone.utc) - timedelta(days=90)
-    else:
-        last_saved_datetime = pd.to_datetime(last_payment_timestamp, unit="s").normalize() + timedelta(days=1)
+        return (datetime.now(timezone.utc) - timedelta(days=90)).timestamp()
+    return utc_midnight(datetime.fromtimestamp(last_payment_timestamp, timezone.utc)).timestamp()
+
 
-    start_ts = int(last_saved_datetime.timestamp())
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_ts = int(today.timestamp())
+async def main(UpdatePaymentTimer: func.TimerRequest) -> None:
+    started = time.perf_counter()
+    logging.info(f"⏰ Ejecutando función UpdatePayments ({'async' if ASYNC_MODE else 'sync'})")
+
+    ACCESS_TOKEN = os.environ["BSALE_ACCESS_TOKEN"]
+    AZURE_BLOB_CONN_STR = os.environ["AZURE_BLOB_CONN_STR"]
+    BLOB_CONTAINER = os.environ["BLOB_CONTAINER_NAME"]
 
-    if start_ts >= yesterday_ts:
-        logging.info("⏳ No hay nuevos documentos para procesar.")
-        return
+    from shared_code.checkpoints import utc_midnight
 
-    BASE_URL = "https://api.bsale.cl/v1/documents.json"
-    params = {
-        "emissiondaterange": f"[{start_ts},{yesterday_ts}]",
-        "expand": "details",
-        "limit": 50,
-        "offset": 0
-    }
-    headers = { "access_token": ACCESS_TOKEN }
+    checkpoints = await asyncio.to_thread(get_checkpoints)
+    pg_engine = get_engine()
+    log_startup("UpdatePayments", started)
 
-    documentos = []
-    logging.info(f"🔄 Descargando documentos desde {start_ts} hasta {yesterday_ts}...")
+    yesterday_ts = int(utc_midnight().timestamp())
 
+    # Primero la ventana interrumpida (si la hay), luego la nueva hasta hoy
     while True:
-        res = requests.get(BASE_URL, headers=headers, params=params)
-        if res.status_code != 200:
-            logging.error(f"❌ Error en API: {res.status_code} - {res.text}")
-            break
-
-        items = res.json().get("items", [])
-        if not items:
-            break
-
-        for doc in items:
-            doc_data = {
-                "document_id": doc.get("id"),
-                "emission_date": doc.get("emissionDate"),
-                "total_amount": doc.get("totalAmount"),
-                "net_amount": doc.get("netAmount"),
-                "tax_amount": doc.get("taxAmount"),
-                "address": doc.get("address"),
-                "municipality": doc.get("municipality"),
-                "city": doc.get("city"),
-                "state": doc.get("state"),
-                "number": doc.get("number"),
-                "client_id": doc.get("client", {}).get("id"),
-                "document_type_id": doc.get("document_type", {}).get("id"),
-                "user_id": doc.get("user", {}).get("id"),
-                "details_url": doc.get("details", {}).get("href"),
-                "seller_url": doc.get("sellers", {}).get("href")
-            }
-
-            if doc_data["seller_url"]:
-                sres = requests.get(doc_data["seller_url"], headers=headers)
-                if sres.status_code == 200:
-                    sitems = sres.json().get("items", [])
-                    doc_data["seller_id"] = sitems[0]["id"] if sitems else None
-                else:
-                    doc_data["seller_id"] = None
-
-            documentos.append(doc_data)
-
-        params["offset"] += params["limit"]
-
-    if not documentos:
-        logging.info("⚠️ No se encontraron nuevos documentos.")
-        return
-
-    df_docs = pd.DataFrame(documentos)
-    df_docs["emission_date"] = df_docs["emission_date"].astype("int64")
-
-    doc_blob_name = f"documentos/documentos_{start_ts}_to_{yesterday_ts}.csv"
-    blob_client = container_client.get_blob_client(doc_blob_name)
-    blob_client.upload_blob(df_docs.to_csv(index=False), overwrite=True)
-    logging.info(f"📄 Documentos guardados en Blob: {doc_blob_name}")
-
-    df_docs.to_sql("documentos", pg_engine, if_exists="append", index=False)
-    logging.info(f"✅ {len(df_docs)} documentos insertados en PostgreSQL")
+        window = await asyncio.to_thread(checkpoints.next_window, ENTITY, yesterday_ts, lambda: initial_start(pg_engine))
+        if window is None:
+            logging.info("⚠️ No hay nuevos pagos para procesar.")
+            return
+
+        logging.info(f"🔄 Descargando pagos desde {window.window_start} hasta {window.window_end}...")
+        try:
+            if ASYNC_MODE:
+                await async_window(ACCESS_TOKEN, AZURE_BLOB_CONN_STR, BLOB_CONTAINER, pg_engine, window)
+            else:
+                await asyncio.to_thread(sync_window, ACCESS_TOKEN, AZURE_BLOB_CONN_STR, BLOB_CONTAINER, pg_engine, window)
+        except Exception as exc:
+            # El checkpoint conserva la ventana y los spools lo ya descargado
+            # por cada shard: la próxima corrida retoma
+            await asyncio.to_thread(checkpoints.fail, ENTITY, exc)
+            raise
+
+        await asyncio.to_thread(checkpoints.complete, ENTITY)
+        if window.window_end >= yesterday_ts:
+            return
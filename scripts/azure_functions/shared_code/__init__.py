@@ -0,0 +1,2 @@
+# Código compartido entre las Azure Functions y los scripts locales
+# (scripts/download_csvs, scripts/upload_to_postgres).
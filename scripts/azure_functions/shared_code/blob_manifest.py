@@ -0,0 +1,80 @@
+from sqlalchemy import text
+
+# === Manifest de blobs cargados en PostgreSQL ===
+# Guarda el ETag y last_modified de cada blob ya procesado en la tabla
+# etl_blob_manifest. En cada corrida solo se cargan los blobs nuevos o que
+# cambiaron; las tablas sin blobs pendientes no se tocan.
+#
+# `sources` mapea un blob a su tabla destino y modo de carga:
+#   - clave exacta ("clients/clients_data.csv"): snapshot completo
+#   - clave terminada en "/" ("documentos/"): todos los .csv y .parquet bajo
+#     ese prefijo
+# Modos: "replace" recrea la tabla con el blob; "upsert" lo mezcla por clave
+# natural (ver pg_copy.NATURAL_KEYS).
+
+MANIFEST_TABLE = "etl_blob_manifest"
+BACKUP_EXTENSIONS = (".csv", ".parquet")
+
+
+def source_for(blob_name, sources):
+    if blob_name in sources:
+        return sources[blob_name]
+    for key, source in sources.items():
+        if key.endswith("/") and blob_name.startswith(key) and blob_name.endswith(BACKUP_EXTENSIONS):
+            return source
+    return None
+
+
+class BlobManifest:
+    def __init__(self, engine, table_name=MANIFEST_TABLE):
+        self.engine = engine
+        self.table_name = table_name
+        self.entries = {}
+
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table_name} ("
+                "blob_name TEXT PRIMARY KEY, etag TEXT NOT NULL, last_modified TIMESTAMPTZ, "
+                "table_name TEXT NOT NULL, rows BIGINT, loaded_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ))
+            for row in conn.execute(text(f"SELECT blob_name, etag FROM {table_name}")):
+                self.entries[row.blob_name] = row.etag
+
+    def is_current(self, blob):
+        return self.entries.get(blob.name) == blob.etag
+
+    def record(self, blob, table_name, rows):
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {self.table_name} (blob_name, etag, last_modified, table_name, rows, loaded_at) "
+                "VALUES (:blob_name, :etag, :last_modified, :table_name, :rows, now()) "
+                "ON CONFLICT (blob_name) DO UPDATE SET etag = EXCLUDED.etag, "
+                "last_modified = EXCLUDED.last_modified, table_name = EXCLUDED.table_name, "
+                "rows = EXCLUDED.rows, loaded_at = EXCLUDED.loaded_at"
+            ), {
+                "blob_name": blob.name,
+                "etag": blob.etag,
+                "last_modified": blob.last_modified,
+                "table_name": table_name,
+                "rows": rows
+            })
+        self.entries[blob.name] = blob.etag
+
+
+def pending_blobs(container_client, sources, manifest):
+    # Devuelve [(blob, table_name, mode)] por cargar, ordenados por nombre
+    # para que los incrementales se apliquen en orden cronológico, y el
+    # conjunto de tablas que no tienen cambios
+    pending, tables = [], set()
+    for blob in container_client.list_blobs():
+        source = source_for(blob.name, sources)
+        if source is None:
+            continue
+        table_name, mode = source
+        tables.add(table_name)
+        if not manifest.is_current(blob):
+            pending.append((blob, table_name, mode))
+
+    pending.sort(key=lambda item: item[0].name)
+    unchanged = tables - {table_name for _, table_name, _ in pending}
+    return pending, unchanged
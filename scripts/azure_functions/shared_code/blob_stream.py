@@ -0,0 +1,109 @@
+import io
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shared_code.serialization import csv_dtypes, to_pandas
+
+# === Lectura de respaldos desde Blob por bloques ===
+# En vez de download_blob().readall() + read_csv del archivo completo, el
+# blob se baja en rangos de BLOB_CHUNK_BYTES (StorageStreamDownloader.chunks)
+# y pandas lo parsea de a `chunksize` filas. En memoria solo conviven un
+# rango del blob y un bloque de filas, sin importar el tamaño del archivo.
+# Los respaldos Parquet se leen igual, por row groups, pidiendo a Blob solo
+# los rangos de bytes que pyarrow necesita (footer y columnas).
+# Con `schema` (serialization.SCHEMAS) todos los bloques salen con los
+# mismos tipos declarados, sin inferencia bloque a bloque.
+
+BLOB_CHUNK_BYTES = 4 * 1024 * 1024
+CSV_CHUNKSIZE = 100_000
+
+# Pasar a BlobServiceClient.from_connection_string para que tanto la primera
+# petición como las siguientes sean rangos de BLOB_CHUNK_BYTES
+BLOB_CLIENT_OPTIONS = {
+    "max_single_get_size": BLOB_CHUNK_BYTES,
+    "max_chunk_get_size": BLOB_CHUNK_BYTES,
+}
+
+
+class ChunkStream(io.RawIOBase):
+    # Adapta un iterable de bloques de bytes a un archivo de solo lectura
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._current:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._current = memoryview(chunk)
+
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+
+def read_csv_chunks(blob_client, chunksize=CSV_CHUNKSIZE, schema=None, **download_kwargs):
+    # Genera DataFrames de hasta `chunksize` filas a medida que llegan los rangos
+    downloader = blob_client.download_blob(max_concurrency=1, **download_kwargs)
+    stream = io.BufferedReader(ChunkStream(downloader.chunks()), buffer_size=BLOB_CHUNK_BYTES)
+    dtype = csv_dtypes(schema) if schema is not None else None
+    with pd.read_csv(stream, chunksize=chunksize, dtype=dtype) as reader:
+        yield from reader
+
+
+class BlobRangeFile(io.RawIOBase):
+    # Archivo de solo lectura con seek sobre un blob: cada lectura es un GET
+    # por rango. Parquet necesita acceso aleatorio (el esquema está al final).
+    def __init__(self, blob_client, size, **download_kwargs):
+        self._blob_client = blob_client
+        self._size = size
+        self._position = 0
+        self._download_kwargs = download_kwargs
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self._size
+        self._position = max(0, offset)
+        return self._position
+
+    def readinto(self, buffer):
+        length = min(len(buffer), self._size - self._position)
+        if length <= 0:
+            return 0
+        data = self._blob_client.download_blob(offset=self._position, length=length, **self._download_kwargs).readall()
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def read_parquet_chunks(blob_client, chunksize=CSV_CHUNKSIZE, schema=None, **download_kwargs):
+    size = blob_client.get_blob_properties(**download_kwargs).size
+    stream = io.BufferedReader(BlobRangeFile(blob_client, size, **download_kwargs), buffer_size=BLOB_CHUNK_BYTES)
+    columns = schema.names if schema is not None else None
+    for batch in pq.ParquetFile(stream).iter_batches(batch_size=chunksize, columns=columns):
+        if schema is not None:
+            batch = pa.Table.from_batches([batch]).select(schema.names).cast(schema)
+        yield to_pandas(batch)
+
+
+def read_blob_chunks(blob_client, blob_name, chunksize=CSV_CHUNKSIZE, schema=None, **download_kwargs):
+    # Elige el lector según la extensión del blob
+    if blob_name.endswith(".parquet"):
+        return read_parquet_chunks(blob_client, chunksize, schema, **download_kwargs)
+    return read_csv_chunks(blob_client, chunksize, schema, **download_kwargs)
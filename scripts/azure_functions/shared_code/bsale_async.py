@@ -0,0 +1,225 @@
+import asyncio
+import logging
+import os
+from collections import Counter
+import aiohttp
+from shared_code.bsale_client import (BSALE_BASE_URL, DEFAULT_BATCH_PAGES, DEFAULT_LIMIT, DEFAULT_POOL_SIZE,
+                                      DEFAULT_RATE_PER_SECOND, DEFAULT_TIMEOUT, BsaleAPIError)
+from shared_code.documents import detail_record, document_record, embedded_detail_items
+from shared_code.fetcher import DEFAULT_MAX_WORKERS
+from shared_code.json_codec import loads
+from shared_code.rate_limit import MAX_RETRIES, RETRY_STATUSES, HostRateLimiter, backoff_delay, retry_after_seconds
+from shared_code.sellers import MISSING, embedded_seller_id, seller_id_from_response
+
+# === Cliente asíncrono de Bsale ===
+# Versión asyncio del BsaleClient para las Azure Functions: la paginación, los
+# vendedores y los detalles faltantes se piden en el mismo event loop, con
+# `max_workers` peticiones en vuelo como máximo.
+
+
+class AsyncBsaleClient:
+    def __init__(self, access_token, base_url=BSALE_BASE_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 rate_limiter=None, max_workers=DEFAULT_MAX_WORKERS, max_retries=MAX_RETRIES):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip("/")
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.stats = Counter()
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        self.session = aiohttp.ClientSession(
+            headers={"access_token": self.access_token},
+            connector=aiohttp.TCPConnector(limit=self.pool_size),
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _url(self, path_or_url):
+        if path_or_url.startswith("http"):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    async def _get(self, url, params):
+        # Devuelve (status, headers, json o texto del error)
+        async with self._semaphore:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(url)
+            self.stats["requests"] += 1
+            async with self.session.get(url, params=params) as response:
+                if response.status == 200:
+                    return response.status, response.headers, loads(await response.read())
+                return response.status, response.headers, await response.text()
+
+    async def get_json(self, path_or_url, params=None):
+        # Misma política de reintentos que BsaleClient.get_json
+        url = self._url(path_or_url)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                status, headers, body = await self._get(url, params)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                delay = backoff_delay(attempt)
+            else:
+                if status == 200:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success(url)
+                    return body
+
+                error = f"{status} - {body}"
+                if status not in RETRY_STATUSES:
+                    self.stats["errors"] += 1
+                    raise BsaleAPIError(f"❌ Error en API: {error}")
+
+                delay = backoff_delay(attempt)
+                if status == 429:
+                    self.stats["throttled"] += 1
+                    retry_after = retry_after_seconds(headers)
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_throttle(url, retry_after)
+                        delay = 0
+                    elif retry_after is not None:
+                        delay = retry_after
+
+            if attempt == self.max_retries:
+                break
+
+            self.stats["retries"] += 1
+            logging.warning(f"🔁 Reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s: {error}")
+            if delay:
+                await asyncio.sleep(delay)
+
+        self.stats["errors"] += 1
+        raise BsaleAPIError(f"❌ Error en API tras {self.max_retries} reintentos: {error}")
+
+    # === Paginación ===
+    async def paginate(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        params = dict(params or {})
+        params.setdefault("limit", limit)
+        params.setdefault("offset", 0)
+
+        first = await self.get_json(path_or_url, params=params)
+        items = list(first.get("items", []))
+        count = first.get("count")
+
+        if count is None:
+            # Sin total: se continúa página a página
+            page = items
+            while page:
+                params["offset"] += params["limit"]
+                page = (await self.get_json(path_or_url, params=params)).get("items", [])
+                items.extend(page)
+            return items
+
+        offsets = range(params["offset"] + params["limit"], count, params["limit"])
+        pages = await asyncio.gather(*(self.get_json(path_or_url, params=dict(params, offset=offset)) for offset in offsets))
+
+        # gather respeta el orden de los offsets
+        for data in pages:
+            items.extend(data.get("items", []))
+        return items
+
+    async def count(self, path_or_url, params=None):
+        return (await self.get_json(path_or_url, params=dict(params or {}, limit=1, offset=0))).get("count")
+
+    async def page_batches(self, path_or_url, params=None, batch_pages=DEFAULT_BATCH_PAGES, limit=DEFAULT_LIMIT):
+        # Igual que BsaleClient.page_batches: genera (offset siguiente, items)
+        # por lote; las páginas de cada lote se piden a la vez
+        params = dict(params or {})
+        params.setdefault("limit", limit)
+        params.setdefault("offset", 0)
+        step = params["limit"]
+
+        first = await self.get_json(path_or_url, params=params)
+        count = first.get("count")
+        batch = list(first.get("items", []))
+        offset = params["offset"] + step
+
+        if count is None:
+            # Sin total: se continúa página a página
+            page, pages = batch, 1
+            while page:
+                if pages == batch_pages:
+                    yield offset, batch
+                    batch, pages = [], 0
+                page = (await self.get_json(path_or_url, params=dict(params, offset=offset))).get("items", [])
+                batch.extend(page)
+                pages += 1
+                offset += len(page)
+            if batch:
+                yield offset, batch
+            return
+
+        # El primer lote completa sus páginas junto a la primera
+        pending = batch_pages - 1
+        while offset < count or batch:
+            offsets = range(offset, min(count, offset + pending * step), step)
+            pages = await asyncio.gather(*(self.get_json(path_or_url, params=dict(params, offset=o)) for o in offsets))
+            for data in pages:
+                batch.extend(data.get("items", []))
+            offset = min(count, offset + pending * step)
+            if batch:
+                yield offset, batch
+            batch, pending = [], batch_pages
+
+    # === Endpoints ===
+    async def documents(self, **params):
+        return await self.paginate("documents.json", params)
+
+    async def payments(self, **params):
+        return await self.paginate("payments.json", params)
+
+    async def document_details(self, details_url):
+        return await self.paginate(details_url)
+
+
+def async_client_from_env(access_token, **kwargs):
+    max_workers = int(os.getenv("BSALE_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    rate_per_second = float(os.getenv("BSALE_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND))
+
+    kwargs.setdefault("pool_size", max(max_workers, DEFAULT_POOL_SIZE))
+    kwargs.setdefault("rate_limiter", HostRateLimiter(rate_per_second))
+    kwargs.setdefault("max_workers", max_workers)
+    return AsyncBsaleClient(access_token, **kwargs)
+
+
+async def parse_documents_async(client, documents):
+    # Igual que DocumentParser.parse_all, pero los vendedores y detalles que
+    # no vinieron embebidos se piden todos a la vez (deduplicados por URL)
+    seller_urls = {doc["sellers"]["href"] for doc in documents if embedded_seller_id(doc) is MISSING}
+    truncated = [doc for doc in documents if embedded_detail_items(doc) is None]
+
+    seller_urls = list(seller_urls)
+    seller_pages, detail_pages = await asyncio.gather(
+        asyncio.gather(*(client.get_json(url) for url in seller_urls)),
+        asyncio.gather(*(client.document_details(doc["details"]["href"]) for doc in truncated))
+    )
+    seller_ids = {url: seller_id_from_response(data) for url, data in zip(seller_urls, seller_pages)}
+    fetched_details = {id(doc): items for doc, items in zip(truncated, detail_pages)}
+
+    doc_rows, detail_rows = [], []
+    for doc in documents:
+        seller_id = embedded_seller_id(doc)
+        if seller_id is MISSING:
+            seller_id = seller_ids[doc["sellers"]["href"]]
+
+        row = document_record(doc, seller_id)
+        doc_rows.append(row)
+
+        items = embedded_detail_items(doc)
+        if items is None:
+            items = fetched_details[id(doc)]
+        detail_rows.extend(detail_record(row.document_id, item) for item in items)
+
+    logging.info(f"👤 Consultas extra de vendedores: {len(seller_urls)}")
+    logging.info(f"🔍 Detalles truncados re-consultados: {len(truncated)}")
+    return doc_rows, detail_rows
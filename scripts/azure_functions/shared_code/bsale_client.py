@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from shared_code.fetcher import DEFAULT_MAX_WORKERS, map_ordered
+from shared_code.json_codec import loads
+from shared_code.rate_limit import MAX_RETRIES, RETRY_STATUSES, HostRateLimiter, backoff_delay, retry_after_seconds
+
+# === Configuración de la API de Bsale ===
+BSALE_BASE_URL = "https://api.bsale.cl/v1"
+MAX_LIMIT = 50  # Tamaño de página máximo que acepta la API
+DEFAULT_LIMIT = MAX_LIMIT
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+DEFAULT_RATE_PER_SECOND = 10
+DEFAULT_BATCH_PAGES = 20  # Páginas por lote en page_batches (1000 items)
+
+
+class BsaleAPIError(Exception):
+    pass
+
+
+class BsaleClient:
+    # Cliente único para la API de Bsale. Reutiliza una sesión HTTP con
+    # conexiones keep-alive, así cada página, vendedor o detalle no paga un
+    # nuevo handshake TCP+TLS contra api.bsale.cl.
+
+    def __init__(self, access_token, base_url=BSALE_BASE_URL, pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT,
+                 rate_limiter=None, max_workers=1, max_retries=MAX_RETRIES):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+
+        # Contadores de la ejecución: requests, throttled (429), retries, errors
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update({"access_token": access_token})
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _url(self, path_or_url):
+        # Acepta rutas relativas ("documents.json") o hrefs completos que
+        # devuelve la API (details.href, sellers.href, etc.)
+        if path_or_url.startswith("http"):
+            return path_or_url
+        return f"{self.base_url}/{path_or_url.lstrip('/')}"
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get(self, path_or_url, params=None):
+        url = self._url(path_or_url)
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(url)
+        self._count("requests")
+        return self.session.get(url, params=params, timeout=self.timeout)
+
+    def get_json(self, path_or_url, params=None):
+        # Reintenta 429, 5xx y timeouts con backoff exponencial; cualquier otro
+        # error o el agotamiento de reintentos se propaga como BsaleAPIError
+        # para no truncar silenciosamente la descarga.
+        url = self._url(path_or_url)
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.get(url, params=params)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                delay = backoff_delay(attempt)
+            else:
+                if response.status_code == 200:
+                    if self.rate_limiter is not None:
+                        self.rate_limiter.on_success(url)
+                    # msgspec/orjson si están instalados (ver json_codec)
+                    return loads(response.content)
+
+                error = f"{response.status_code} - {response.text}"
+                if response.status_code not in RETRY_STATUSES:
+                    self._count("errors")
+                    raise BsaleAPIError(f"❌ Error en API: {error}")
+
+                delay = backoff_delay(attempt)
+                if response.status_code == 429:
+                    self._count("throttled")
+                    retry_after = retry_after_seconds(response.headers)
+                    if self.rate_limiter is not None:
+                        # El limitador ya bloquea el host durante Retry-After
+                        self.rate_limiter.on_throttle(url, retry_after)
+                        delay = 0
+                    elif retry_after is not None:
+                        delay = retry_after
+
+            if attempt == self.max_retries:
+                break
+
+            self._count("retries")
+            logging.warning(f"🔁 Reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s: {error}")
+            if delay:
+                time.sleep(delay)
+
+        self._count("errors")
+        raise BsaleAPIError(f"❌ Error en API tras {self.max_retries} reintentos: {error}")
+
+    # === Paginación ===
+    def paginate(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        if self.max_workers > 1:
+            return self.paginate_parallel(path_or_url, params, limit)
+        return self.paginate_sequential(path_or_url, params, limit)
+
+    def paginate_sequential(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        for _, items in self.pages_sequential(path_or_url, params, limit):
+            yield from items
+
+    def paginate_parallel(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        for _, items in self.pages_parallel(path_or_url, params, limit):
+            yield from items
+
+    def pages(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        # Igual que paginate pero entrega (offset, items) por página
+        if self.max_workers > 1:
+            return self.pages_parallel(path_or_url, params, limit)
+        return self.pages_sequential(path_or_url, params, limit)
+
+    def pages_sequential(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        params = dict(params or {})
+        params.setdefault("limit", limit)
+        params.setdefault("offset", 0)
+
+        while True:
+            data = self.get_json(path_or_url, params=params)
+            items = data.get("items", [])
+            if not items:
+                break
+
+            yield params["offset"], items
+            params["offset"] += params["limit"]
+
+            # Si la API informa el total, evitamos pedir una última página vacía
+            count = data.get("count")
+            if count is not None and params["offset"] >= count:
+                break
+
+    def pages_parallel(self, path_or_url, params=None, limit=DEFAULT_LIMIT):
+        # La primera página trae el "count" total; con él se calculan las
+        # ventanas de offset restantes y se piden en paralelo. Las páginas se
+        # entregan en orden de offset, igual que en la paginación secuencial.
+        params = dict(params or {})
+        params.setdefault("limit", limit)
+        params.setdefault("offset", 0)
+
+        first = self.get_json(path_or_url, params=params)
+        items = first.get("items", [])
+        if items:
+            yield params["offset"], items
+
+        count = first.get("count")
+        if count is None:
+            # Sin total no se pueden planificar ventanas: se sigue en secuencia
+            if items:
+                rest = dict(params, offset=params["offset"] + params["limit"])
+                yield from self.pages_sequential(path_or_url, rest)
+            return
+
+        offsets = range(params["offset"] + params["limit"], count, params["limit"])
+
+        def fetch_page(offset):
+            return offset, self.get_json(path_or_url, params=dict(params, offset=offset)).get("items", [])
+
+        for offset, page in map_ordered(fetch_page, offsets, max_workers=self.max_workers):
+            if page:
+                yield offset, page
+
+    def page_batches(self, path_or_url, params=None, batch_pages=DEFAULT_BATCH_PAGES, limit=DEFAULT_LIMIT, parallel=True):
+        # Agrupa las páginas en lotes y entrega (offset siguiente, items del
+        # lote). Quien consume guarda el lote y luego el offset como
+        # checkpoint; params["offset"] permite retomar desde ahí.
+        # parallel=False pagina en secuencia (cuando ya se paraleliza por fuera).
+        pages = self.pages if parallel else self.pages_sequential
+        batch, pages_in_batch = [], 0
+        for offset, items in pages(path_or_url, params, limit):
+            batch.extend(items)
+            pages_in_batch += 1
+            if pages_in_batch == batch_pages:
+                yield offset + len(items), batch
+                batch, pages_in_batch = [], 0
+        if batch:
+            yield offset + len(items), batch
+
+    def count(self, path_or_url, params=None):
+        # Total de items de una consulta, con una sola petición de limit=1
+        return self.get_json(path_or_url, params=dict(params or {}, limit=1, offset=0)).get("count")
+
+    # === Endpoints ===
+    def documents(self, **params):
+        return self.paginate("documents.json", params)
+
+    def payments(self, **params):
+        return self.paginate("payments.json", params)
+
+    def variants(self, **params):
+        return self.paginate("variants.json", params)
+
+    def products(self, **params):
+        return self.paginate("products.json", params)
+
+    def product_types(self, **params):
+        return self.paginate("product_types.json", params)
+
+    def clients(self, **params):
+        return self.paginate("clients.json", params)
+
+    def users(self, **params):
+        return self.paginate("users.json", params)
+
+    def document_types(self, **params):
+        return self.paginate("document_types.json", params)
+
+    def payment_types(self, **params):
+        return self.paginate("payment_types.json", params)
+
+    def document_details(self, details_url):
+        # El detalle de un documento casi siempre cabe en una página
+        return self.paginate_sequential(details_url)
+
+
+def client_from_env(access_token, **kwargs):
+    # Concurrencia y presupuesto de peticiones configurables por entorno
+    max_workers = int(os.getenv("BSALE_MAX_WORKERS", DEFAULT_MAX_WORKERS))
+    rate_per_second = float(os.getenv("BSALE_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND))
+
+    kwargs.setdefault("pool_size", max(max_workers, DEFAULT_POOL_SIZE))
+    kwargs.setdefault("rate_limiter", HostRateLimiter(rate_per_second))
+    kwargs.setdefault("max_workers", max_workers)
+    return BsaleClient(access_token, **kwargs)
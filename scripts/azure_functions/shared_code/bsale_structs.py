@@ -0,0 +1,179 @@
+from typing import Any, List, Optional
+import msgspec
+from shared_code.documents import DetailRecord, DocumentRecord
+from shared_code.payments import PaymentRecord
+
+# === Páginas Bsale tipadas (msgspec) ===
+# Structs con solo los campos que usan document_record, detail_record,
+# payment_record y variant_row. msgspec decodifica la página directo a estos
+# objetos (ignora el resto del JSON) y de ahí salen los registros sin crear
+# un dict por documento ni encadenar .get(). Hoy solo lo usa el benchmark
+# (scripts/benchmarks/json_decoding.py) para medirlo contra json_codec.loads
+# + los builders de siempre; el paginado sigue con dicts.
+#
+# Si la API devuelve un tipo inesperado, decode_page lanza
+# msgspec.ValidationError.
+
+
+class Ref(msgspec.Struct):
+    id: Optional[int] = None
+    href: Optional[str] = None
+
+
+class DetailItem(msgspec.Struct):
+    lineNumber: Optional[int] = None
+    quantity: Optional[float] = None
+    netUnitValue: Optional[float] = None
+    totalUnitValue: Optional[float] = None
+    netAmount: Optional[float] = None
+    taxAmount: Optional[float] = None
+    totalAmount: Optional[float] = None
+    variant: Optional[Ref] = None
+    relatedDetailId: Optional[int] = None
+
+
+class Details(msgspec.Struct):
+    href: Optional[str] = None
+    count: Optional[int] = None
+    items: Optional[List[DetailItem]] = None
+
+
+class Sellers(msgspec.Struct):
+    href: Optional[str] = None
+    items: Optional[List[Ref]] = None
+
+
+class Document(msgspec.Struct):
+    id: Optional[int] = None
+    emissionDate: Optional[int] = None
+    totalAmount: Optional[float] = None
+    netAmount: Optional[float] = None
+    taxAmount: Optional[float] = None
+    address: Optional[str] = None
+    municipality: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[int] = None
+    number: Optional[int] = None
+    client: Optional[Ref] = None
+    document_type: Optional[Ref] = None
+    user: Optional[Ref] = None
+    details: Optional[Details] = None
+    sellers: Optional[Sellers] = None
+
+
+class Payment(msgspec.Struct):
+    id: Optional[int] = None
+    recordDate: Optional[int] = None
+    amount: Optional[float] = None
+    payment_type: Optional[Ref] = None
+    document: Optional[Ref] = None
+    user: Optional[Ref] = None
+    state: Any = None
+
+
+class Variant(msgspec.Struct):
+    id: Optional[int] = None
+    description: Optional[str] = None
+    unlimitedStock: Any = None
+    allowNegativeStock: Any = None
+    state: Any = None
+    barCode: Optional[str] = None
+    code: Optional[str] = None
+    imagestionCenterCost: Any = None
+    imagestionAccount: Any = None
+    imagestionConceptCod: Any = None
+    imagestionProyectCod: Any = None
+    imagestionCategoryCod: Any = None
+    imagestionProductId: Any = None
+    serialNumber: Any = None
+    prestashopCombinationId: Any = None
+    prestashopValueId: Any = None
+    product: Optional[Ref] = None
+    costs: Optional[Ref] = None
+
+
+class DocumentPage(msgspec.Struct):
+    count: Optional[int] = None
+    items: List[Document] = []
+
+
+class DetailPage(msgspec.Struct):
+    count: Optional[int] = None
+    items: List[DetailItem] = []
+
+
+class PaymentPage(msgspec.Struct):
+    count: Optional[int] = None
+    items: List[Payment] = []
+
+
+class VariantPage(msgspec.Struct):
+    count: Optional[int] = None
+    items: List[Variant] = []
+
+
+PAGE_DECODERS = {
+    "documents": msgspec.json.Decoder(DocumentPage),
+    "details": msgspec.json.Decoder(DetailPage),
+    "payments": msgspec.json.Decoder(PaymentPage),
+    "variants": msgspec.json.Decoder(VariantPage),
+}
+
+
+def decode_page(kind, data):
+    return PAGE_DECODERS[kind].decode(data)
+
+
+def _id(ref):
+    return ref.id if ref is not None else None
+
+
+def _href(ref):
+    return ref.href if ref is not None else None
+
+
+def document_record(doc, seller_id=None):
+    return DocumentRecord(
+        doc.id, doc.emissionDate, doc.totalAmount, doc.netAmount, doc.taxAmount, doc.address, doc.municipality,
+        doc.city, doc.state, doc.number, _id(doc.client), _id(doc.document_type), _id(doc.user),
+        _href(doc.details), _href(doc.sellers), seller_id
+    )
+
+
+def detail_record(document_id, item):
+    return DetailRecord(
+        document_id, item.lineNumber, item.quantity, item.netUnitValue, item.totalUnitValue, item.netAmount,
+        item.taxAmount, item.totalAmount, _id(item.variant), item.relatedDetailId
+    )
+
+
+def payment_record(pay):
+    return PaymentRecord(
+        pay.id, pay.recordDate, pay.amount, _id(pay.payment_type), _id(pay.document), _id(pay.user),
+        pay.state if pay.state is not None else {}
+    )
+
+
+def variant_row(variant):
+    # Mismas claves que dimensions.variant_row
+    return {
+        "variant_id": variant.id,
+        "description": variant.description,
+        "unlimited_stock": variant.unlimitedStock,
+        "allow_negative_stock": variant.allowNegativeStock,
+        "state": variant.state,
+        "bar_code": variant.barCode,
+        "code": variant.code,
+        "imagestion_center_cost": variant.imagestionCenterCost,
+        "imagestion_account": variant.imagestionAccount,
+        "imagestion_concept_cod": variant.imagestionConceptCod,
+        "imagestion_project_cod": variant.imagestionProyectCod,
+        "imagestion_category_cod": variant.imagestionCategoryCod,
+        "imagestion_product_id": variant.imagestionProductId,
+        "serial_number": variant.serialNumber,
+        "prestashop_combination_id": variant.prestashopCombinationId,
+        "prestashop_value_id": variant.prestashopValueId,
+        "product_id": _id(variant.product),
+        "costs_href": _href(variant.costs),
+    }
+
@@ -0,0 +1,107 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+
+# === Checkpoints de sincronización incremental ===
+# La tabla etl_checkpoints guarda por entidad (documentos, pagos, ...) la
+# ventana en curso, el último offset ya cargado, el estado de la corrida y
+# el high-water mark (fin de la última ventana completada). Reemplaza el
+# SELECT MAX(...) sobre la tabla de hechos:
+#   - Si la corrida anterior quedó a medias (running/failed), se retoma la
+#     misma ventana desde el último offset confirmado.
+#   - Si no, la ventana nueva parte LOOKBACK antes del high-water mark, para
+#     recoger documentos que llegan tarde al último día (la carga es upsert,
+#     así que re-leerlos no duplica nada).
+
+CHECKPOINT_TABLE = "etl_checkpoints"
+LOOKBACK = timedelta(days=int(os.getenv("ETL_LOOKBACK_DAYS", "1")))
+
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+Checkpoint = namedtuple("Checkpoint", ["entity", "high_water_mark", "window_start", "window_end", "last_offset", "status"])
+
+
+def utc_midnight(now=None):
+    now = now or datetime.now(timezone.utc)
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class CheckpointStore:
+    def __init__(self, engine, table_name=CHECKPOINT_TABLE):
+        self.engine = engine
+        self.table_name = table_name
+
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {table_name} ("
+                "entity TEXT PRIMARY KEY, high_water_mark BIGINT, window_start BIGINT, window_end BIGINT, "
+                "last_offset INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, error TEXT, "
+                "updated_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ))
+
+    def get(self, entity):
+        with self.engine.connect() as conn:
+            row = conn.execute(text(
+                f"SELECT entity, high_water_mark, window_start, window_end, last_offset, status "
+                f"FROM {self.table_name} WHERE entity = :entity"
+            ), {"entity": entity}).first()
+        return Checkpoint(*row) if row else None
+
+    def _execute(self, sql, **values):
+        with self.engine.begin() as conn:
+            conn.execute(text(sql), values)
+
+    def start(self, entity, window_start, window_end):
+        self._execute(
+            f"INSERT INTO {self.table_name} (entity, window_start, window_end, last_offset, status, error, updated_at) "
+            "VALUES (:entity, :window_start, :window_end, 0, :status, NULL, now()) "
+            "ON CONFLICT (entity) DO UPDATE SET window_start = EXCLUDED.window_start, "
+            "window_end = EXCLUDED.window_end, last_offset = 0, status = EXCLUDED.status, error = NULL, "
+            "updated_at = now()",
+            entity=entity, window_start=window_start, window_end=window_end, status=RUNNING
+        )
+        return Checkpoint(entity, None, window_start, window_end, 0, RUNNING)
+
+    def advance(self, entity, offset):
+        # Llamar después de cargar el lote que termina en `offset`
+        self._execute(
+            f"UPDATE {self.table_name} SET last_offset = :offset, status = :status, updated_at = now() "
+            "WHERE entity = :entity",
+            entity=entity, offset=offset, status=RUNNING
+        )
+
+    def complete(self, entity):
+        self._execute(
+            f"UPDATE {self.table_name} SET high_water_mark = window_end, last_offset = 0, status = :status, "
+            "error = NULL, updated_at = now() WHERE entity = :entity",
+            entity=entity, status=COMPLETED
+        )
+
+    def fail(self, entity, error):
+        # Conserva ventana y offset para que la próxima corrida retome
+        self._execute(
+            f"UPDATE {self.table_name} SET status = :status, error = :error, updated_at = now() "
+            "WHERE entity = :entity",
+            entity=entity, status=FAILED, error=str(error)[:2000]
+        )
+
+    def next_window(self, entity, window_end, initial_start):
+        # Devuelve la ventana a procesar: la que quedó interrumpida (con su
+        # offset) o una nueva hasta `window_end`; None si no hay nada.
+        # `initial_start()` solo se llama si la entidad no tiene checkpoint.
+        checkpoint = self.get(entity)
+
+        if checkpoint is not None and checkpoint.status in (RUNNING, FAILED) and checkpoint.window_start is not None:
+            return checkpoint
+
+        if checkpoint is None or checkpoint.high_water_mark is None:
+            start = int(initial_start())
+        else:
+            start = int(checkpoint.high_water_mark - LOOKBACK.total_seconds())
+
+        if start >= window_end:
+            return None
+        return self.start(entity, start, window_end)
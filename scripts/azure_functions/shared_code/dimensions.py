@@ -0,0 +1,107 @@
+from collections import namedtuple
+
+# === Dimensiones Bsale ===
+# Filas de cada dimensión, las mismas para las Functions y para los scripts
+# de download_csvs (clientes.py, variantes.py, ...). Cada dimensión
+# se baja completa y reemplaza su tabla; el respaldo queda en el mismo blob
+# CSV que ya lee etl_blob_to_postgres.py.
+
+Dimension = namedtuple("Dimension", ["path", "table_name", "blob_name", "key_column", "row"])
+
+
+def client_row(client):
+    return {
+        "client_id": client.get("id"),
+        "first_name": client.get("firstName"),
+        "last_name": client.get("lastName"),
+        "email": client.get("email"),
+        "rut": client.get("code"),
+    }
+
+
+def product_row(product):
+    return {
+        "product_id": product.get("id"),
+        "name": product.get("name"),
+        "description": product.get("description"),
+        "classification": product.get("classification"),
+        "ledger_account": product.get("ledgerAccount"),
+        "cost_center": product.get("costCenter"),
+        "allow_decimal": product.get("allowDecimal"),
+        "stock_control": product.get("stockControl"),
+        "print_detail_pack": product.get("printDetailPack"),
+        "state": product.get("state"),
+        "prestashop_product_id": product.get("prestashopProductId"),
+        "prestashop_attribute_id": product.get("presashopAttributeId"),
+        "product_type_id": product.get("product_type", {}).get("id"),
+    }
+
+
+def product_type_row(product_type):
+    return {
+        "product_type_id": product_type.get("id"),
+        "name": product_type.get("name"),
+    }
+
+
+def user_row(user):
+    return {
+        "user_id": user.get("id"),
+        "first_name": user.get("firstName"),
+        "last_name": user.get("lastName"),
+    }
+
+
+def variant_row(variant):
+    return {
+        "variant_id": variant.get("id"),
+        "description": variant.get("description"),
+        "unlimited_stock": variant.get("unlimitedStock"),
+        "allow_negative_stock": variant.get("allowNegativeStock"),
+        "state": variant.get("state"),
+        "bar_code": variant.get("barCode"),
+        "code": variant.get("code"),
+        "imagestion_center_cost": variant.get("imagestionCenterCost"),
+        "imagestion_account": variant.get("imagestionAccount"),
+        "imagestion_concept_cod": variant.get("imagestionConceptCod"),
+        "imagestion_project_cod": variant.get("imagestionProyectCod"),
+        "imagestion_category_cod": variant.get("imagestionCategoryCod"),
+        "imagestion_product_id": variant.get("imagestionProductId"),
+        "serial_number": variant.get("serialNumber"),
+        "prestashop_combination_id": variant.get("prestashopCombinationId"),
+        "prestashop_value_id": variant.get("prestashopValueId"),
+        "product_id": variant.get("product", {}).get("id"),
+        "costs_href": variant.get("costs", {}).get("href"),
+    }
+
+
+def document_type_row(doc_type):
+    return {
+        "document_type_id": doc_type.get("id"),
+        "description": doc_type.get("name"),
+    }
+
+
+def payment_type_row(payment_method):
+    return {
+        "payment_type_id": payment_method.get("id"),
+        "name": payment_method.get("name"),
+        "is_creditnote": payment_method.get("isCreditNote"),
+        "isClientCredit": payment_method.get("isClientCredit"),
+        "isCash": payment_method.get("isCash"),
+        "state": payment_method.get("state"),
+    }
+
+
+DIMENSIONS = {
+    "clients": Dimension("clients.json", "clients_data", "clients/clients_data.csv", "client_id", client_row),
+    "products": Dimension("products.json", "products_data", "products/products_data.csv", "product_id", product_row),
+    "product_types": Dimension("product_types.json", "product_types_data", "product_types/product_types_data.csv",
+                               "product_type_id", product_type_row),
+    "users": Dimension("users.json", "users_data", "users/users_data.csv", "user_id", user_row),
+    "variants": Dimension("variants.json", "variants_data", "variants/variants_data.csv", "variant_id", variant_row),
+    "document_types": Dimension("document_types.json", "document_types", "document_types/document_types.csv",
+                                "document_type_id", document_type_row),
+    "payment_types": Dimension("payment_types.json", "tipos_de_pago", "tipos_de_pago/tipos_de_pago.csv",
+                               "payment_type_id", payment_type_row),
+}
@@ -0,0 +1,109 @@
+import threading
+from collections import namedtuple
+from shared_code.sellers import SellerResolver
+
+# === Parser de documentos Bsale ===
+# Con expand=[details,sellers] cada documento ya trae sus líneas de detalle.
+# El parser arma en una sola pasada la fila de "documentos" y las filas de
+# "document_details", y solo llama al details.href cuando el detalle embebido
+# viene truncado (details.count mayor que los items recibidos).
+
+DocumentRecord = namedtuple("DocumentRecord", [
+    "document_id", "emission_date", "total_amount", "net_amount", "tax_amount", "address", "municipality", "city",
+    "state", "number", "client_id", "document_type_id", "user_id", "details_url", "seller_url", "seller_id"
+])
+
+DetailRecord = namedtuple("DetailRecord", [
+    "document_id", "line_number", "quantity", "net_unit_value", "total_unit_value", "net_amount", "tax_amount",
+    "total_amount", "variant_id", "related_detail_id"
+])
+
+
+def document_record(doc, seller_id=None):
+    # Tupla compacta (sin dict por fila); pd.DataFrame y Records la aceptan tal cual
+    return DocumentRecord(
+        doc.get("id"),
+        doc.get("emissionDate"),
+        doc.get("totalAmount"),
+        doc.get("netAmount"),
+        doc.get("taxAmount"),
+        doc.get("address"),
+        doc.get("municipality"),
+        doc.get("city"),
+        doc.get("state"),
+        doc.get("number"),
+        doc.get("client", {}).get("id"),
+        doc.get("document_type", {}).get("id"),
+        doc.get("user", {}).get("id"),
+        doc.get("details", {}).get("href"),
+        doc.get("sellers", {}).get("href"),
+        seller_id
+    )
+
+
+def detail_record(document_id, item):
+    return DetailRecord(
+        document_id,
+        item.get("lineNumber"),
+        item.get("quantity"),
+        item.get("netUnitValue"),
+        item.get("totalUnitValue"),
+        item.get("netAmount"),
+        item.get("taxAmount"),
+        item.get("totalAmount"),
+        item.get("variant", {}).get("id"),
+        item.get("relatedDetailId")
+    )
+
+
+def document_row(doc, seller_id=None):
+    return document_record(doc, seller_id)._asdict()
+
+
+def detail_row(document_id, item):
+    return detail_record(document_id, item)._asdict()
+
+
+def embedded_detail_items(doc):
+    # Devuelve las líneas embebidas, o None si vienen truncadas y hay que
+    # pedirlas completas al details.href
+    details = doc.get("details") or {}
+    items = details.get("items")
+    count = details.get("count")
+
+    if items is not None and (count is None or len(items) >= count):
+        return items
+    if not details.get("href"):
+        return items or []
+    return None
+
+
+class DocumentParser:
+    def __init__(self, client):
+        self.client = client
+        self.sellers = SellerResolver(client)
+        self._lock = threading.Lock()
+        self.detail_fetches = 0
+
+    def parse(self, doc):
+        row = document_record(doc, self.sellers.seller_id(doc))
+        details = [detail_record(row.document_id, item) for item in self._detail_items(doc)]
+        return row, details
+
+    def parse_all(self, documents):
+        doc_rows, detail_rows = [], []
+        for doc in documents:
+            row, details = self.parse(doc)
+            doc_rows.append(row)
+            detail_rows.extend(details)
+        return doc_rows, detail_rows
+
+    def _detail_items(self, doc):
+        items = embedded_detail_items(doc)
+        if items is not None:
+            return items
+
+        # Detalle truncado o no expandido: se pide completo al endpoint
+        with self._lock:
+            self.detail_fetches += 1
+        return list(self.client.document_details(doc["details"]["href"]))
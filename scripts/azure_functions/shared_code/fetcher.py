@@ -0,0 +1,23 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# === Descarga concurrente con orden preservado ===
+# Aplica `fn` a cada elemento con un pool de hilos acotado y entrega los
+# resultados en el mismo orden de entrada, a medida que están listos. Solo
+# mantiene `window` peticiones en vuelo, así la memoria no crece con el total.
+
+DEFAULT_MAX_WORKERS = 8
+
+
+def map_ordered(fn, iterable, max_workers=DEFAULT_MAX_WORKERS, window=None):
+    window = window or max_workers * 4
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque()
+        for item in iterable:
+            pending.append(pool.submit(fn, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,51 @@
+import json
+import os
+
+# === Decodificador JSON intercambiable ===
+# Las páginas de documentos con details y sellers expandidos son grandes y el
+# json de la stdlib es lo más caro del parseo. Si están instalados se usa
+# msgspec u orjson (JSON_DECODER=msgspec|orjson|json fuerza uno; "auto" por
+# defecto). Todos reciben los bytes de la respuesta y devuelven dicts y
+# listas, así el resto del código no cambia.
+#
+# Con msgspec además se pueden decodificar las páginas directo a Structs
+# tipados (shared_code/bsale_structs.py, hoy solo en el benchmark).
+
+
+def _msgspec():
+    import msgspec
+    return msgspec.json.Decoder().decode
+
+
+def _orjson():
+    import orjson
+    return orjson.loads
+
+
+def _stdlib():
+    return json.loads
+
+
+DECODERS = {
+    "msgspec": _msgspec,
+    "orjson": _orjson,
+    "json": _stdlib,
+}
+
+
+def get_decoder(name=None):
+    # Devuelve (nombre, loads). "auto" usa el primero disponible.
+    name = (name or os.getenv("JSON_DECODER", "auto")).lower()
+    if name == "auto":
+        for candidate in ("msgspec", "orjson"):
+            try:
+                return candidate, DECODERS[candidate]()
+            except ImportError:
+                continue
+        return "json", _stdlib()
+    if name not in DECODERS:
+        raise ValueError(f"Decodificador JSON desconocido: {name}")
+    return name, DECODERS[name]()
+
+
+DECODER_NAME, loads = get_decoder()
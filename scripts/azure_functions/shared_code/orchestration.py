@@ -0,0 +1,144 @@
+import json
+import logging
+import os
+from collections import namedtuple
+from shared_code.dimensions import DIMENSIONS
+from shared_code.fetcher import DEFAULT_MAX_WORKERS, map_ordered
+
+# === Sincronización diaria en fan-out / fan-in (Durable Functions) ===
+# El orquestador daily_sync reparte la descarga en actividades
+# independientes y junta los resultados para una sola carga:
+#
+#   PlanSync        ventanas por entidad (checkpoints) y shards de un día
+#   FetchShard      un shard de documentos (+ detalles) o de pagos -> spool
+#   FetchDimension  una dimensión completa (clientes, variantes, ...) -> spool
+#   LoadSync        une los spools, sube los respaldos a Blob y carga todas
+#                   las tablas en UNA transacción; luego cierra checkpoints
+#   FailSync        marca los checkpoints como fallidos para retomar
+#
+# Las actividades (shared_code/sync_activities.py) solo intercambian JSON
+# pequeño (claves de spool); los datos viajan por los spools. El avance se
+# publica con set_custom_status (etapa, tareas hechas/total, filas cargadas)
+# y se consulta con el estado de la instancia. run_inline ejecuta el mismo
+# orquestador en proceso, sin el runtime de Durable, para probar la
+# sincronización completa en local.
+#
+# Este módulo no importa pandas ni sqlalchemy: el orquestador se re-ejecuta
+# (replay) en cada paso y debe cargar rápido.
+
+PLAN = "PlanSync"
+FETCH_SHARD = "FetchShard"
+FETCH_DIMENSION = "FetchDimension"
+LOAD = "LoadSync"
+FAIL = "FailSync"
+
+# Actividades en vuelo por tanda; tras cada tanda se actualiza el avance
+FAN_OUT = int(os.getenv("SYNC_FAN_OUT", "16"))
+
+
+def _status(context, progress, **changes):
+    progress.update(changes)
+    context.set_custom_status(dict(progress))
+
+
+def daily_sync(context):
+    # Orquestador (generador determinista): no lee reloj ni entorno, todo lo
+    # variable lo deciden las actividades. Las dimensiones se bajan solo en
+    # la primera vuelta; se repite mientras quede una ventana atrasada.
+    settings = context.get_input() or {}
+    fan_out = settings.get("fan_out", FAN_OUT)
+    dimensions = settings.get("dimensions", list(DIMENSIONS))
+    progress = {"stage": "plan", "iteration": 0, "tasks_total": 0, "tasks_done": 0, "loaded": {}}
+
+    while True:
+        _status(context, progress, stage="plan", iteration=progress["iteration"] + 1)
+        plan = yield context.call_activity(PLAN, dict(settings, dimensions=dimensions))
+
+        tasks = [(FETCH_SHARD, shard) for shard in plan["shards"]]
+        tasks += [(FETCH_DIMENSION, {"name": name, "day": plan["window_end"]}) for name in plan["dimensions"]]
+
+        try:
+            _status(context, progress, stage="fetch", tasks_total=len(tasks), tasks_done=0)
+            results = []
+            for start in range(0, len(tasks), fan_out):
+                wave = [context.call_activity(name, task) for name, task in tasks[start:start + fan_out]]
+                results += yield context.task_all(wave)
+                _status(context, progress, tasks_done=len(results))
+
+            _status(context, progress, stage="load")
+            loaded = yield context.call_activity(LOAD, {"plan": plan, "results": results})
+        except Exception as exc:
+            _status(context, progress, stage="failed", error=str(exc))
+            yield context.call_activity(FAIL, {"entities": list(plan["windows"]), "error": str(exc)})
+            raise
+
+        for table_name, rows in loaded.items():
+            progress["loaded"][table_name] = progress["loaded"].get(table_name, 0) + rows
+        dimensions = []
+        if plan["caught_up"]:
+            break
+
+    _status(context, progress, stage="done")
+    return progress["loaded"]
+
+
+# === Ejecución en proceso (sin runtime de Durable) ===
+
+def _roundtrip(value):
+    # Durable serializa entradas y salidas como JSON; aquí también, para que
+    # lo que pasa en local pase igual en Azure
+    return json.loads(json.dumps(value))
+
+
+class InlineTask(namedtuple("InlineTask", ["name", "payload"])):
+    pass
+
+
+class InlineContext:
+    # Sustituto del DurableOrchestrationContext con lo que usa daily_sync
+    def __init__(self, payload, activities, max_workers=DEFAULT_MAX_WORKERS, instance_id="inline"):
+        self.instance_id = instance_id
+        self.activities = activities
+        self.max_workers = max_workers
+        self.custom_status = None
+        self.status_history = []
+        self._input = _roundtrip(payload)
+
+    def get_input(self):
+        return self._input
+
+    def call_activity(self, name, payload=None):
+        return InlineTask(name, _roundtrip(payload))
+
+    def task_all(self, tasks):
+        return list(tasks)
+
+    def set_custom_status(self, status):
+        self.custom_status = _roundtrip(status)
+        self.status_history.append(self.custom_status)
+        logging.info(f"📈 {self.instance_id}: {self.custom_status}")
+
+    def run(self, task):
+        # Un task_all corre sus actividades en paralelo con hilos
+        if isinstance(task, list):
+            return list(map_ordered(self.run, task, max_workers=self.max_workers))
+        return _roundtrip(self.activities[task.name](task.payload))
+
+
+def run_inline(orchestrator, payload=None, activities=None, max_workers=DEFAULT_MAX_WORKERS):
+    # Ejecuta el orquestador de principio a fin en este proceso. Los errores
+    # de una actividad se lanzan dentro del generador, como en Durable.
+    # Devuelve (resultado, contexto) para revisar el avance publicado.
+    context = InlineContext(payload, activities, max_workers)
+    steps = orchestrator(context)
+    outcome, error = None, None
+
+    while True:
+        try:
+            task = steps.send(outcome) if error is None else steps.throw(error)
+        except StopIteration as stop:
+            return stop.value, context
+        try:
+            outcome, error = context.run(task), None
+        except Exception as exc:
+            outcome, error = None, exc
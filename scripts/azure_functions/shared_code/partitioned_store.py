@@ -0,0 +1,133 @@
+import os
+import uuid
+import pandas as pd
+from shared_code.pg_copy import NATURAL_KEYS
+from shared_code.serialization import read_parquet, write_parquet
+
+# === Almacén local particionado (Parquet por mes de emisión) ===
+# Reemplaza el patrón "leer el CSV global + pd.concat + reescribirlo":
+#
+#   <root>/<entidad>/month=YYYY-MM/part-<id>.parquet
+#
+# - append() solo escribe archivos nuevos en los meses que recibe; nunca
+#   reescribe historia. Cada archivo se escribe oculto (".tmp") y se
+#   renombra al final, así ni los lectores ni OneDrive ven archivos a medias.
+# - Las entidades con esquema en serialization.SCHEMAS se escriben siempre
+#   con ese esquema, así todas las partes de una partición son compatibles.
+# - compact() junta los archivos de cada mes en uno solo, deduplicando por
+#   clave natural (gana la última versión).
+# - read() entrega todas las particiones como un único DataFrame, sin
+#   duplicados por clave natural aunque falte compactar.
+
+DEFAULT_ROOT = os.environ.get("LOCAL_STORE_DIR", "data/store")
+# Partición de las filas sin fecha de emisión válida (o sin documento)
+UNKNOWN_MONTH = "unknown"
+
+
+def emission_month(timestamps):
+    # UNIX timestamp (segundos) -> "YYYY-MM"; NaN si falta o no se entiende
+    return pd.to_datetime(pd.to_numeric(timestamps, errors="coerce"), unit="s", errors="coerce").dt.strftime("%Y-%m")
+
+
+def detail_months(documents, details):
+    # Los detalles se particionan por el mes de emisión de su documento,
+    # que llega en el mismo lote
+    documents = documents.drop_duplicates(subset="document_id", keep="last")
+    lookup = emission_month(documents["emission_date"]).set_axis(documents["document_id"])
+    return details["document_id"].map(lookup).fillna(UNKNOWN_MONTH)
+
+
+class PartitionedStore:
+    def __init__(self, entity, root=DEFAULT_ROOT, key_columns=None):
+        self.entity = entity
+        self.path = os.path.join(root, entity)
+        self.key_columns = key_columns or NATURAL_KEYS[entity]
+
+    def partitions(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(
+            name.split("=", 1)[1] for name in os.listdir(self.path)
+            if name.startswith("month=") and self._parts(name.split("=", 1)[1])
+        )
+
+    def _partition_dir(self, month):
+        return os.path.join(self.path, f"month={month}")
+
+    def _parts(self, month):
+        directory = self._partition_dir(month)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if name.startswith("part-") and name.endswith(".parquet")
+        )
+
+    def _write(self, df, month):
+        directory = self._partition_dir(month)
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{pd.Timestamp.now(tz='UTC'):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet"
+        tmp_path = os.path.join(directory, f".{name}.tmp")
+        write_parquet(df, tmp_path, self.entity)
+        os.replace(tmp_path, os.path.join(directory, name))
+        return os.path.join(directory, name)
+
+    def append(self, df, months):
+        # `months` es una Serie "YYYY-MM" alineada con df (ver emission_month).
+        # Las filas sin mes van a la partición "unknown" en vez de perderse.
+        # Devuelve los meses tocados.
+        if df.empty:
+            return []
+        df = df.reset_index(drop=True)
+        months = pd.Series(months).reset_index(drop=True).fillna(UNKNOWN_MONTH)
+
+        touched = []
+        for month, rows in df.groupby(months, sort=True, dropna=False):
+            self._write(rows, month)
+            touched.append(month)
+        return touched
+
+    def read_partition(self, month, columns=None):
+        parts = self._parts(month)
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        return pd.concat((read_parquet(part, columns=columns) for part in parts), ignore_index=True)
+
+    def read(self, columns=None, months=None):
+        # Una fila por clave natural (gana la última parte escrita), aunque
+        # el mes no se haya compactado: las corridas incrementales vuelven a
+        # traer el último día guardado
+        months = self.partitions() if months is None else months
+        read_columns = None if columns is None else list(columns) + [
+            key for key in self.key_columns if key not in columns
+        ]
+        frames = [self.read_partition(month, read_columns) for month in months]
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        df = pd.concat(frames, ignore_index=True)
+        df = df.drop_duplicates(subset=self.key_columns, keep="last").reset_index(drop=True)
+        return df if columns is None else df[list(columns)]
+
+    def max_value(self, column):
+        # Solo lee la última partición con datos ("unknown" no cuenta)
+        for month in reversed([month for month in self.partitions() if month != UNKNOWN_MONTH]):
+            values = self.read_partition(month, columns=[column])[column]
+            if values.notna().any():
+                return values.max()
+        return None
+
+    def compact(self, months=None):
+        # Un archivo por mes, sin duplicados. Devuelve {mes: filas}.
+        compacted = {}
+        for month in (self.partitions() if months is None else months):
+            parts = self._parts(month)
+            if len(parts) < 2:
+                continue
+            df = self.read_partition(month)
+            df = df.drop_duplicates(subset=self.key_columns, keep="last")
+            self._write(df, month)
+            for part in parts:
+                os.remove(part)
+            compacted[month] = len(df)
+        return compacted
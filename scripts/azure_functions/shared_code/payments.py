@@ -0,0 +1,24 @@
+from collections import namedtuple
+
+# === Pagos Bsale ===
+# Fila de la tabla "pagos" a partir de un pago de payments.json
+
+PaymentRecord = namedtuple("PaymentRecord", [
+    "payment_id", "payment_date", "amount", "payment_method", "document_id", "client_id", "state"
+])
+
+
+def payment_record(pay):
+    return PaymentRecord(
+        pay.get("id"),
+        pay.get("recordDate"),
+        pay.get("amount"),
+        pay.get("payment_type", {}).get("id"),
+        pay.get("document", {}).get("id"),
+        pay.get("user", {}).get("id"),
+        pay.get("state", {})
+    )
+
+
+def payment_row(pay):
+    return payment_record(pay)._asdict()
@@ -0,0 +1,357 @@
+import io
+import itertools
+import logging
+import time
+import uuid
+from collections import namedtuple
+from shared_code.records import Records
+from shared_code.serialization import SCHEMAS
+
+# === Carga masiva en PostgreSQL con COPY ===
+# Reemplaza DataFrame.to_sql (un INSERT por fila) por COPY FROM STDIN vía
+# psycopg2 copy_expert. Los datos viajan como CSV en bloques de `chunksize`
+# filas dentro de una sola transacción. copy_frames/upsert_frames aceptan un
+# iterable de DataFrames para cargar archivos grandes por bloques.
+# Cada bloque también puede ser un Records (shared_code/records.py): sus
+# tuplas van directo al buffer del COPY con el writer csv, sin pandas.
+#
+# Los tipos de cada tabla no se infieren de los datos: salen del esquema
+# declarado (serialization.SCHEMAS) o de la tabla existente, y cada bloque
+# se ajusta a ellos (conform). Así un bloque con una columna vacía o solo
+# con enteros no decide el tipo de la tabla.
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Claves naturales de las tablas de hechos, usadas por upsert_dataframe
+NATURAL_KEYS = {
+    "documentos": ["document_id"],
+    "document_details": ["document_id", "line_number"],
+    "pagos": ["payment_id"],
+}
+
+ARROW_PG_TYPES = {
+    "int64": "BIGINT",
+    "double": "DOUBLE PRECISION",
+    "string": "TEXT",
+    "bool": "BOOLEAN",
+}
+INTEGER_TYPES = {"BIGINT", "INTEGER", "SMALLINT"}
+FLOAT_TYPES = {"DOUBLE PRECISION", "REAL", "NUMERIC"}
+# (tipo en la tabla, tipo declarado) que _repair_columns corrige
+REPAIRABLE = {("TEXT", "BIGINT"), ("TEXT", "DOUBLE PRECISION"), ("BIGINT", "DOUBLE PRECISION")}
+
+
+class CopyResult(namedtuple("CopyResult", ["rows", "seconds"])):
+    @property
+    def rows_per_second(self):
+        return self.rows / max(self.seconds, 1e-9)
+
+
+def quote_ident(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def pg_type(dtype):
+    # Mismo mapeo que usaría to_sql al crear la tabla
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(dtype):
+        return "BOOLEAN"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "BIGINT"
+    if pd.api.types.is_float_dtype(dtype):
+        return "DOUBLE PRECISION"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def declared_types(table_name, schema=None):
+    # {columna: tipo PostgreSQL} del esquema declarado (serialization.SCHEMAS)
+    schema = schema if schema is not None else SCHEMAS.get(table_name)
+    if schema is None:
+        return None
+    return {field.name: ARROW_PG_TYPES[str(field.type)] for field in schema}
+
+
+def existing_types(cursor, table_name):
+    # {columna: tipo PostgreSQL} de la tabla; vacío si no existe
+    cursor.execute(
+        "SELECT column_name, upper(data_type) FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position",
+        (table_name,)
+    )
+    return dict(cursor.fetchall())
+
+
+def inferred_types(df, table_name):
+    # Último recurso, solo para tablas nuevas sin esquema declarado. Un
+    # Records no tiene dtypes: sus tipos tienen que estar declarados.
+    if isinstance(df, Records):
+        raise ValueError(f"{table_name} no tiene esquema en serialization.SCHEMAS ni existe en PostgreSQL")
+    return {c: pg_type(df[c].dtype) for c in df.columns}
+
+
+def conform(df, types):
+    # Ajusta un bloque a los tipos de la tabla. Un valor con decimales en una
+    # columna entera es un error (astype("Int64") lo rechaza), nunca se
+    # redondea; lo no numérico queda nulo, igual que serialization.to_arrow.
+    # Un Records se convierte con las mismas reglas (Records.conform).
+    if isinstance(df, Records):
+        return df.conform(_arrow_schema(types))
+
+    import pandas as pd
+
+    df = df.copy()
+    for column in df.columns:
+        kind = types.get(column)
+        if kind in INTEGER_TYPES:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("Int64")
+        elif kind in FLOAT_TYPES:
+            df[column] = pd.to_numeric(df[column], errors="coerce").astype("Float64")
+    return df
+
+
+def _arrow_schema(types):
+    # Tipos PostgreSQL -> esquema pyarrow, para Records.conform
+    import pyarrow as pa
+
+    fields = []
+    for column, kind in types.items():
+        if kind in INTEGER_TYPES:
+            fields.append((column, pa.int64()))
+        elif kind in FLOAT_TYPES:
+            fields.append((column, pa.float64()))
+        elif kind == "TEXT":
+            fields.append((column, pa.string()))
+    return pa.schema(fields)
+
+
+def create_table_sql(table_name, types, unlogged=False):
+    # `types` es {columna: tipo PostgreSQL}
+    columns = ", ".join(f"{quote_ident(c)} {t}" for c, t in types.items())
+    kind = "UNLOGGED TABLE" if unlogged else "TABLE"
+    return f"CREATE {kind} IF NOT EXISTS {quote_ident(table_name)} ({columns})"
+
+
+def _repair_columns(cursor, table_name, existing, declared):
+    # Columnas que una carga anterior creó con un tipo inferido de un bloque
+    # (TEXT si venía vacía, BIGINT si solo traía enteros) pasan al tipo
+    # declarado. Solo conversiones sin pérdida: si una columna va a entero y
+    # tiene algún valor con decimales, se lanza ValueError en vez de redondear.
+    for column, kind in declared.items():
+        if (existing.get(column), kind) not in REPAIRABLE:
+            continue
+        name = quote_ident(column)
+        if kind in INTEGER_TYPES:
+            value = f"NULLIF({name}::TEXT, '')::NUMERIC"
+            cursor.execute(f"SELECT count(*) FROM {quote_ident(table_name)} WHERE {value} <> trunc({value})")
+            fractional = cursor.fetchone()[0]
+            if fractional:
+                raise ValueError(f"{table_name}.{column}: {fractional} valores con decimales, "
+                                 f"no se puede convertir {existing[column]} -> {kind} sin perderlos")
+        logging.warning(f"🔧 {table_name}.{column}: {existing[column]} -> {kind}")
+        cursor.execute(f"ALTER TABLE {quote_ident(table_name)} ALTER COLUMN {name} TYPE {kind} "
+                       f"USING NULLIF({name}::TEXT, '')::NUMERIC::{kind}")
+        existing[column] = kind
+
+
+def _prepare_table(cursor, table_name, first, schema=None):
+    # Crea la tabla si falta y devuelve sus tipos {columna: tipo PostgreSQL}.
+    # Los tipos salen del esquema declarado o de la tabla ya existente; los
+    # datos solo deciden en una tabla nueva sin esquema declarado.
+    declared = declared_types(table_name, schema)
+    existing = existing_types(cursor, table_name)
+    if existing:
+        if declared:
+            _repair_columns(cursor, table_name, existing, declared)
+        return existing
+    types = declared or inferred_types(first, table_name)
+    cursor.execute(create_table_sql(table_name, types))
+    return types
+
+
+def copy_sql(table_name, columns):
+    column_list = ", ".join(quote_ident(c) for c in columns)
+    return f"COPY {quote_ident(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv, HEADER false)"
+
+
+def _chunks(df, chunksize):
+    for start in range(0, len(df), chunksize):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunksize].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        yield buffer
+
+
+def _copy_into(cursor, table_name, df, chunksize):
+    sql = copy_sql(table_name, df.columns)
+    chunks = df.csv_chunks(chunksize) if isinstance(df, Records) else _chunks(df, chunksize)
+    for buffer in chunks:
+        cursor.copy_expert(sql, buffer)
+
+
+def _run(engine, work):
+    # Ejecuta `work(cursor)` en una sola transacción
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        outcome = work(cursor)
+        raw.commit()
+        return outcome
+    except Exception:
+        raw.rollback()
+        raise
+    finally:
+        raw.close()
+
+
+def _frames(frames):
+    # Separa el primer bloque, que crea la tabla si falta. Los vacíos se
+    # saltan (un Records vacío no tiene columnas).
+    frames = (df for df in frames if not (isinstance(df, Records) and df.empty))
+    first = next(frames, None)
+    return first, frames
+
+
+def _conformed(frames, types):
+    for df in frames:
+        yield conform(df, types)
+
+
+def _copy_work(cursor, frames, table_name, if_exists, chunksize, schema=None):
+    first, rest = _frames(frames)
+    if first is None:
+        return 0
+    if if_exists == "replace":
+        cursor.execute(f"DROP TABLE IF EXISTS {quote_ident(table_name)}")
+    types = _prepare_table(cursor, table_name, first, schema)
+
+    rows = 0
+    for df in _conformed(itertools.chain([first], rest), types):
+        _copy_into(cursor, table_name, df, chunksize)
+        rows += len(df)
+    return rows
+
+
+def copy_frames(engine, frames, table_name, if_exists="append", chunksize=DEFAULT_CHUNKSIZE, schema=None):
+    # Igual que copy_dataframe pero recibe un iterable de DataFrames (p. ej.
+    # read_csv con chunksize): se cargan uno a uno en la misma transacción,
+    # sin tener nunca el archivo completo en memoria. `schema` (pyarrow)
+    # reemplaza al de SCHEMAS para la tabla.
+    started = time.perf_counter()
+    rows = _run(engine, lambda cursor: _copy_work(cursor, frames, table_name, if_exists, chunksize, schema))
+
+    result = CopyResult(rows, time.perf_counter() - started)
+    logging.info(f"🚚 COPY {table_name}: {result.rows} filas en {result.seconds:.2f}s ({result.rows_per_second:,.0f} filas/s)")
+    return result
+
+
+def copy_dataframe(engine, df, table_name, if_exists="append", chunksize=DEFAULT_CHUNKSIZE):
+    return copy_frames(engine, [df], table_name, if_exists, chunksize)
+
+
+def _ensure_unique_key(cursor, table_name, key_columns):
+    # ON CONFLICT necesita un índice único sobre la clave natural. La primera
+    # vez se borran los duplicados que hayan dejado cargas anteriores (gana
+    # la fila física más reciente) y se reemplaza el índice no único.
+    target = quote_ident(table_name)
+    unique_name = quote_ident(f"ux_{table_name}_{'_'.join(key_columns)}")
+    cursor.execute("SELECT to_regclass(%s)", (unique_name,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    match = " AND ".join(f"a.{quote_ident(k)} = b.{quote_ident(k)}" for k in key_columns)
+    cursor.execute(f"DELETE FROM {target} a USING {target} b WHERE {match} AND a.ctid < b.ctid")
+    if cursor.rowcount:
+        logging.warning(f"🧹 {table_name}: {cursor.rowcount} filas duplicadas eliminadas antes de crear la clave única")
+    cursor.execute(f"DROP INDEX IF EXISTS {quote_ident(f'ix_{table_name}_' + '_'.join(key_columns))}")
+    keys = ", ".join(quote_ident(k) for k in key_columns)
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {unique_name} ON {target} ({keys})")
+
+
+def _upsert_work(cursor, frames, table_name, key_columns, chunksize, schema=None):
+    key_columns = key_columns or NATURAL_KEYS[table_name]
+    target = quote_ident(table_name)
+    staging_name = f"{table_name}_staging_{uuid.uuid4().hex[:8]}"
+    staging = quote_ident(staging_name)
+    keys = ", ".join(quote_ident(k) for k in key_columns)
+
+    first, rest = _frames(frames)
+    if first is None:
+        return 0
+    columns = ", ".join(quote_ident(c) for c in first.columns)
+    updates = ", ".join(f"{quote_ident(c)} = EXCLUDED.{quote_ident(c)}" for c in first.columns if c not in key_columns)
+
+    types = _prepare_table(cursor, table_name, first, schema)
+    _ensure_unique_key(cursor, table_name, key_columns)
+    # La staging copia las columnas de la tabla destino: mismos tipos
+    cursor.execute(f"CREATE UNLOGGED TABLE {staging} (LIKE {target} INCLUDING DEFAULTS)")
+    for df in _conformed(itertools.chain([first], rest), types):
+        _copy_into(cursor, staging_name, df, chunksize)
+
+    # Un NULL en la clave no choca con el índice único ni con ON CONFLICT:
+    # esas filas se duplicarían en cada carga, así que no se insertan
+    complete = " AND ".join(f"{quote_ident(k)} IS NOT NULL" for k in key_columns)
+    cursor.execute(f"SELECT count(*) FROM {staging} WHERE NOT ({complete})")
+    skipped = cursor.fetchone()[0]
+    if skipped:
+        logging.warning(f"⚠️ {table_name}: {skipped} filas sin clave ({', '.join(key_columns)}) no se cargan")
+
+    cursor.execute(
+        f"INSERT INTO {target} ({columns}) "
+        f"SELECT DISTINCT ON ({keys}) {columns} FROM {staging} WHERE {complete} ORDER BY {keys}, ctid DESC "
+        f"ON CONFLICT ({keys}) " + (f"DO UPDATE SET {updates}" if updates else "DO NOTHING")
+    )
+    upserted = cursor.rowcount
+    cursor.execute(f"DROP TABLE {staging}")
+    return upserted
+
+
+def upsert_frames(engine, frames, table_name, key_columns=None, chunksize=DEFAULT_CHUNKSIZE, schema=None):
+    # Carga idempotente: COPY a una tabla staging UNLOGGED (con los tipos de
+    # la tabla destino) y luego, en la misma transacción, INSERT ... ON
+    # CONFLICT sobre la clave natural (índice único), deduplicando el lote
+    # por clave. Volver a cargar un rango ya procesado deja la tabla igual y
+    # dos cargas concurrentes no pueden duplicar una clave.
+    started = time.perf_counter()
+    rows = _run(engine, lambda cursor: _upsert_work(cursor, frames, table_name, key_columns, chunksize, schema))
+
+    result = CopyResult(rows, time.perf_counter() - started)
+    logging.info(f"🚚 UPSERT {table_name}: {rows} filas en {result.seconds:.2f}s ({result.rows_per_second:,.0f} filas/s)")
+    return result
+
+
+def upsert_dataframe(engine, df, table_name, key_columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    return upsert_frames(engine, [df], table_name, key_columns, chunksize)
+
+
+def copy_records(engine, records, table_name, if_exists="append", chunksize=DEFAULT_CHUNKSIZE):
+    return copy_frames(engine, [records], table_name, if_exists, chunksize)
+
+
+def upsert_records(engine, records, table_name, key_columns=None, chunksize=DEFAULT_CHUNKSIZE):
+    return upsert_frames(engine, [records], table_name, key_columns, chunksize)
+
+
+def load_tables(engine, loads, chunksize=DEFAULT_CHUNKSIZE):
+    # Carga varias tablas en una sola transacción: o quedan todas o ninguna.
+    # `loads` es [(tabla, frames, modo)] con modo "replace" o "upsert".
+    # Devuelve {tabla: CopyResult}.
+    started = time.perf_counter()
+
+    def work(cursor):
+        rows = {}
+        for table_name, frames, mode in loads:
+            if mode == "replace":
+                rows[table_name] = _copy_work(cursor, frames, table_name, "replace", chunksize)
+            else:
+                rows[table_name] = _upsert_work(cursor, frames, table_name, None, chunksize)
+        return rows
+
+    rows = _run(engine, work)
+
+    seconds = time.perf_counter() - started
+    results = {table_name: CopyResult(count, seconds) for table_name, count in rows.items()}
+    logging.info(f"🚚 Carga transaccional de {len(results)} tablas ({sum(rows.values())} filas) en {seconds:.2f}s")
+    return results
@@ -0,0 +1,104 @@
+import asyncio
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# === Límite de peticiones por host ===
+# Token bucket por host compartido entre hilos y corrutinas. Arranca en
+# `rate_per_second`; cada 429 reduce la tasa a la mitad y bloquea el host el
+# tiempo que indique Retry-After, y cada respuesta correcta la recupera de a
+# poco hasta el máximo configurado.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+class HostRateLimiter:
+    def __init__(self, rate_per_second, burst=None, min_rate=0.5):
+        self.max_rate = rate_per_second
+        self.min_rate = min(min_rate, rate_per_second) if rate_per_second else 0.0
+        self.burst = burst or max(1.0, rate_per_second or 0)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, url, now):
+        host = urlsplit(url).netloc
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = {"tokens": self.burst, "rate": self.max_rate, "updated": now, "blocked_until": 0.0}
+        else:
+            bucket["tokens"] = min(self.burst, bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+            bucket["updated"] = now
+        return bucket
+
+    def _reserve(self, url):
+        # Toma un token (puede quedar en negativo = turno reservado) y devuelve
+        # cuánto hay que esperar antes de enviar la petición
+        if not self.max_rate:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(url, now)
+            bucket["tokens"] -= 1
+            wait = -bucket["tokens"] / bucket["rate"] if bucket["tokens"] < 0 else 0.0
+            return max(wait, bucket["blocked_until"] - now)
+
+    def acquire(self, url):
+        delay = self._reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, url):
+        delay = self._reserve(url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def on_throttle(self, url, retry_after=None):
+        if not self.max_rate:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            bucket = self._bucket(url, now)
+            bucket["rate"] = max(self.min_rate, bucket["rate"] / 2)
+            bucket["tokens"] = min(bucket["tokens"], 0.0)
+            pause = retry_after if retry_after is not None else 1.0 / bucket["rate"]
+            bucket["blocked_until"] = max(bucket["blocked_until"], now + pause)
+
+    def on_success(self, url):
+        if not self.max_rate:
+            return
+
+        with self._lock:
+            bucket = self._bucket(url, time.monotonic())
+            if bucket["rate"] < self.max_rate:
+                bucket["rate"] = min(self.max_rate, bucket["rate"] + self.max_rate / 100)
+
+    def rate(self, url):
+        with self._lock:
+            return self._bucket(url, time.monotonic())["rate"]
+
+
+# === Reintentos ===
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_CAP):
+    # Backoff exponencial con "full jitter"
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def retry_after_seconds(headers):
+    value = headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,149 @@
+import csv
+import io
+
+# === Registros sin pandas ===
+# Camino rápido para las Functions: las filas se arman como namedtuples
+# (tuplas compactas, sin dict por fila) y viajan en un Records (columnas +
+# lista de tuplas) hasta el CSV del respaldo, el Parquet (pyarrow) y el
+# buffer del COPY, sin pasar por un DataFrame. pandas queda opcional:
+# Records.to_frame() lo importa solo si alguien lo pide para análisis.
+
+COPY_CHUNK_ROWS = 100_000
+
+
+class Records:
+    __slots__ = ("columns", "rows")
+
+    def __init__(self, columns, rows=None):
+        self.columns = tuple(columns)
+        self.rows = rows if rows is not None else []
+
+    @classmethod
+    def of(cls, rows):
+        # Columnas desde la primera fila: namedtuple (_fields) o dict (claves)
+        rows = list(rows)
+        if not rows:
+            return cls(())
+        first = rows[0]
+        if isinstance(first, dict):
+            columns = tuple(first)
+            return cls(columns, [tuple(row.get(c) for c in columns) for row in rows])
+        return cls(first._fields, rows)
+
+    @classmethod
+    def from_arrow(cls, table):
+        columns = [column.to_pylist() for column in table.columns]
+        return cls(table.column_names, list(zip(*columns)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    @property
+    def empty(self):
+        return not self.rows
+
+    def extend(self, other):
+        if other.empty:
+            return self
+        if self.empty and not self.columns:
+            self.columns = other.columns
+        elif other.columns != self.columns:
+            # Mismo orden de columnas aunque vengan de otro archivo
+            index = [other.columns.index(c) for c in self.columns]
+            self.rows.extend(tuple(row[i] for i in index) for row in other.rows)
+            return self
+        self.rows.extend(other.rows)
+        return self
+
+    def dedupe(self, key_columns):
+        # Deja la última fila de cada clave, en el orden original
+        index = [self.columns.index(c) for c in key_columns]
+        last = {}
+        for position, row in enumerate(self.rows):
+            last[tuple(row[i] for i in index)] = position
+        self.rows = [self.rows[position] for position in sorted(last.values())]
+        return self
+
+    def column(self, name):
+        i = self.columns.index(name)
+        return [row[i] for row in self.rows]
+
+    def _write(self, buffer, rows, header):
+        writer = csv.writer(buffer, lineterminator="\n")
+        if header:
+            writer.writerow(self.columns)
+        writer.writerows(rows)
+
+    def csv_chunks(self, chunksize=COPY_CHUNK_ROWS):
+        # Buffers CSV sin encabezado para COPY ... FROM STDIN (None -> vacío,
+        # que COPY en formato csv lee como NULL)
+        for start in range(0, len(self.rows), chunksize):
+            buffer = io.StringIO()
+            self._write(buffer, self.rows[start:start + chunksize], header=False)
+            buffer.seek(0)
+            yield buffer
+
+    def to_csv_bytes(self):
+        buffer = io.StringIO()
+        self._write(buffer, self.rows, header=True)
+        return buffer.getvalue().encode("utf-8")
+
+    def to_arrow(self, schema=None):
+        import pyarrow as pa
+
+        if schema is None:
+            return pa.Table.from_pylist([dict(zip(self.columns, row)) for row in self.rows])
+        # Columnas en el orden del esquema; las que faltan quedan nulas
+        positions = {c: i for i, c in enumerate(self.columns)}
+        arrays = []
+        for field in schema:
+            i = positions.get(field.name)
+            convert = _converter(field.type)
+            values = [None] * len(self.rows) if i is None else [convert(row[i]) for row in self.rows]
+            arrays.append(pa.array(values, type=field.type))
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def conform(self, schema):
+        # Mismas conversiones que to_arrow(schema), sin salir de las tuplas:
+        # lo que va al COPY queda con los tipos declarados. Las columnas que
+        # el esquema no nombra pasan tal cual.
+        types = {field.name: field.type for field in schema}
+        converters = [_converter(types[c]) if c in types else None for c in self.columns]
+        if not any(converters):
+            return self
+        rows = [tuple(value if convert is None else convert(value) for convert, value in zip(converters, row))
+                for row in self.rows]
+        return Records(self.columns, rows)
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame.from_records(self.rows, columns=list(self.columns))
+
+
+def _converter(arrow_type):
+    # Igual que serialization.to_arrow: lo no convertible (p. ej. un {} donde
+    # va un entero) queda como nulo
+    import pyarrow as pa
+
+    if pa.types.is_string(arrow_type):
+        return lambda value: None if value is None else str(value)
+
+    integer = pa.types.is_integer(arrow_type)
+
+    def to_number(value):
+        if value is None:
+            return None
+        if integer and isinstance(value, int):
+            return int(value)
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            return None
+        if integer:
+            return int(number) if number.is_integer() else None
+        return number
+
+    return to_number
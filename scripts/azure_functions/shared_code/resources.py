@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import os
+import time
+
+# === Recursos compartidos entre invocaciones ===
+# El worker de Functions reutiliza el proceso mientras la app está "en
+# caliente". El engine de SQLAlchemy (con su pool de conexiones), los
+# clientes de Blob y la tabla de checkpoints se crean una sola vez por
+# proceso y quedan a nivel de módulo. Este módulo no importa nada pesado:
+# sqlalchemy, azure.storage.blob y pyarrow se importan recién al pedir el
+# recurso, así cargar una función no paga librerías que no usa.
+
+_engine = None
+_checkpoints = None
+_backup_format = None
+_blob_services = {}
+_async_blob_services = {}
+_warm = set()
+
+
+def postgres_url(sslmode=None):
+    sslmode = sslmode or os.environ.get("POSTGRES_SSLMODE", "require")
+    return (
+        f"postgresql+psycopg2://{os.environ['POSTGRES_USER']}:{os.environ['POSTGRES_PASSWORD']}"
+        f"@{os.environ['POSTGRES_HOST']}:{os.environ.get('POSTGRES_PORT', '5432')}/{os.environ['POSTGRES_DB']}"
+        f"?sslmode={sslmode}"
+    )
+
+
+def get_engine():
+    # pool_pre_ping descarta conexiones que el servidor cerró mientras la
+    # app estaba inactiva
+    global _engine
+    if _engine is None:
+        from sqlalchemy import create_engine
+        _engine = create_engine(postgres_url(), pool_pre_ping=True)
+    return _engine
+
+
+def get_checkpoints():
+    # CheckpointStore crea la tabla si no existe: una vez por proceso basta
+    global _checkpoints
+    if _checkpoints is None:
+        from shared_code.checkpoints import CheckpointStore
+        _checkpoints = CheckpointStore(get_engine())
+    return _checkpoints
+
+
+def get_backup_format():
+    # Formato de los respaldos en Blob (BLOB_FORMAT=parquet|csv)
+    global _backup_format
+    if _backup_format is None:
+        from shared_code.serialization import blob_format
+        _backup_format = blob_format()
+    return _backup_format
+
+
+def get_blob_container(conn_str=None, container=None):
+    conn_str = conn_str or os.environ["AZURE_BLOB_CONN_STR"]
+    service = _blob_services.get(conn_str)
+    if service is None:
+        from azure.storage.blob import BlobServiceClient
+        service = _blob_services[conn_str] = BlobServiceClient.from_connection_string(conn_str)
+    return service.get_container_client(container or os.environ["BLOB_CONTAINER_NAME"])
+
+
+def get_async_blob_container(conn_str=None, container=None):
+    # El cliente aio queda ligado al event loop que lo creó: se guarda uno
+    # por loop (el worker usa el mismo loop en todas las invocaciones)
+    conn_str = conn_str or os.environ["AZURE_BLOB_CONN_STR"]
+    key = (id(asyncio.get_running_loop()), conn_str)
+    service = _async_blob_services.get(key)
+    if service is None:
+        from azure.storage.blob.aio import BlobServiceClient
+        service = _async_blob_services[key] = BlobServiceClient.from_connection_string(conn_str)
+    return service.get_container_client(container or os.environ["BLOB_CONTAINER_NAME"])
+
+
+def log_startup(function_name, started):
+    # `started` es time.perf_counter() al entrar a main. La primera
+    # invocación del proceso es en frío: incluye los imports diferidos y la
+    # creación del engine y los clientes.
+    cold = function_name not in _warm
+    _warm.add(function_name)
+    elapsed = time.perf_counter() - started
+    logging.info(f"🧊 {function_name}: arranque {'en frío' if cold else 'en caliente'} en {elapsed:.2f}s")
+    return elapsed
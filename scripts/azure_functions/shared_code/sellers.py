@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import Future
+
+# === Resolución de vendedores de documentos ===
+# La API de documentos permite expandir "sellers" junto con "details", así el
+# vendedor llega embebido en cada documento y no hace falta un GET extra por
+# documento. Si la respuesta no trae los items embebidos, se consulta el
+# sellers.href una sola vez por URL y se guarda en memoria durante la ejecución.
+# La caché y el contador van con lock: run_shards comparte un mismo resolver
+# entre los hilos de todos los shards. Cada URL guarda un Future, así los
+# hilos que piden una URL en curso esperan esa consulta en vez de repetirla.
+
+DOCUMENTS_EXPAND = "[details,sellers]"
+
+# Marca un vendedor que no vino embebido y hay que consultar
+MISSING = object()
+
+
+def embedded_seller_id(document):
+    sellers = document.get("sellers") or {}
+    items = sellers.get("items")
+    if items is not None:
+        return items[0].get("id") if items else None
+    return MISSING if sellers.get("href") else None
+
+
+def seller_id_from_response(data):
+    if data and data.get("items"):
+        return data["items"][0].get("id")
+    return None
+
+
+class SellerResolver:
+    def __init__(self, client):
+        self.client = client
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+
+    def seller_id(self, document):
+        # Vendedor embebido gracias a expand=sellers
+        seller_id = embedded_seller_id(document)
+        if seller_id is not MISSING:
+            return seller_id
+
+        sellers_url = document["sellers"]["href"]
+        with self._lock:
+            future = self._cache.get(sellers_url)
+            owner = future is None
+            if owner:
+                future = self._cache[sellers_url] = Future()
+                self.lookups += 1
+        if not owner:
+            return future.result()
+
+        # La consulta va fuera del lock para no frenar a los demás hilos
+        try:
+            future.set_result(self._fetch(sellers_url))
+        except Exception as exc:
+            # Sin caché para los errores: la próxima llamada vuelve a intentar
+            with self._lock:
+                del self._cache[sellers_url]
+            future.set_exception(exc)
+        return future.result()
+
+    def _fetch(self, sellers_url):
+        return seller_id_from_response(self.client.get_json(sellers_url))
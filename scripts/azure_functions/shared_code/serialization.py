@@ -0,0 +1,225 @@
+import io
+import os
+import pyarrow as pa
+import pyarrow.parquet as pq
+from shared_code.records import Records
+
+# === Formato de los respaldos en Blob ===
+# Los respaldos de documentos, detalles y pagos se escriben en Parquet
+# comprimido (zstd por defecto) con un esquema fijo por entidad, así el
+# loader Blob -> PostgreSQL y el análisis local leen tipos ya resueltos en
+# vez de re-inferirlos desde CSV. BLOB_FORMAT=csv vuelve al formato anterior.
+# Los respaldos se escriben igual desde un DataFrame o desde un Records (el
+# camino sin pandas de las Functions); pandas se importa solo si se usa.
+
+SCHEMAS = {
+    "documentos": pa.schema([
+        ("document_id", pa.int64()),
+        ("emission_date", pa.int64()),
+        ("total_amount", pa.float64()),
+        ("net_amount", pa.float64()),
+        ("tax_amount", pa.float64()),
+        ("address", pa.string()),
+        ("municipality", pa.string()),
+        ("city", pa.string()),
+        ("state", pa.int64()),
+        ("number", pa.int64()),
+        ("client_id", pa.int64()),
+        ("document_type_id", pa.int64()),
+        ("user_id", pa.int64()),
+        ("details_url", pa.string()),
+        ("seller_url", pa.string()),
+        ("seller_id", pa.int64()),
+    ]),
+    "document_details": pa.schema([
+        ("document_id", pa.int64()),
+        ("line_number", pa.int64()),
+        ("quantity", pa.float64()),
+        ("net_unit_value", pa.float64()),
+        ("total_unit_value", pa.float64()),
+        ("net_amount", pa.float64()),
+        ("tax_amount", pa.float64()),
+        ("total_amount", pa.float64()),
+        ("variant_id", pa.int64()),
+        ("related_detail_id", pa.int64()),
+    ]),
+    "pagos": pa.schema([
+        ("payment_id", pa.int64()),
+        ("payment_date", pa.int64()),
+        ("amount", pa.float64()),
+        ("payment_method", pa.int64()),
+        ("document_id", pa.int64()),
+        ("client_id", pa.int64()),
+        ("state", pa.int64()),
+    ]),
+    # Dimensiones, por nombre de tabla (ver shared_code/dimensions.py). Las
+    # banderas de Bsale (state, allowDecimal, isCash, ...) son enteros 0/1;
+    # los campos de formato libre van como texto.
+    "clients_data": pa.schema([
+        ("client_id", pa.int64()),
+        ("first_name", pa.string()),
+        ("last_name", pa.string()),
+        ("email", pa.string()),
+        ("rut", pa.string()),
+    ]),
+    "products_data": pa.schema([
+        ("product_id", pa.int64()),
+        ("name", pa.string()),
+        ("description", pa.string()),
+        ("classification", pa.int64()),
+        ("ledger_account", pa.string()),
+        ("cost_center", pa.string()),
+        ("allow_decimal", pa.int64()),
+        ("stock_control", pa.int64()),
+        ("print_detail_pack", pa.int64()),
+        ("state", pa.int64()),
+        ("prestashop_product_id", pa.int64()),
+        ("prestashop_attribute_id", pa.int64()),
+        ("product_type_id", pa.int64()),
+    ]),
+    "product_types_data": pa.schema([
+        ("product_type_id", pa.int64()),
+        ("name", pa.string()),
+    ]),
+    "users_data": pa.schema([
+        ("user_id", pa.int64()),
+        ("first_name", pa.string()),
+        ("last_name", pa.string()),
+    ]),
+    "variants_data": pa.schema([
+        ("variant_id", pa.int64()),
+        ("description", pa.string()),
+        ("unlimited_stock", pa.int64()),
+        ("allow_negative_stock", pa.int64()),
+        ("state", pa.int64()),
+        ("bar_code", pa.string()),
+        ("code", pa.string()),
+        ("imagestion_center_cost", pa.int64()),
+        ("imagestion_account", pa.int64()),
+        ("imagestion_concept_cod", pa.int64()),
+        ("imagestion_project_cod", pa.int64()),
+        ("imagestion_category_cod", pa.int64()),
+        ("imagestion_product_id", pa.int64()),
+        ("serial_number", pa.int64()),
+        ("prestashop_combination_id", pa.int64()),
+        ("prestashop_value_id", pa.int64()),
+        ("product_id", pa.int64()),
+        ("costs_href", pa.string()),
+    ]),
+    "document_types": pa.schema([
+        ("document_type_id", pa.int64()),
+        ("description", pa.string()),
+    ]),
+    "tipos_de_pago": pa.schema([
+        ("payment_type_id", pa.int64()),
+        ("name", pa.string()),
+        ("is_creditnote", pa.int64()),
+        ("isClientCredit", pa.int64()),
+        ("isCash", pa.int64()),
+        ("state", pa.int64()),
+    ]),
+}
+
+_pandas_types = None
+
+
+def pandas_types():
+    # Tipos nullable de pandas para que los enteros con nulos no pasen a float
+    global _pandas_types
+    if _pandas_types is None:
+        import pandas as pd
+        _pandas_types = {
+            pa.int64(): pd.Int64Dtype(),
+            pa.float64(): pd.Float64Dtype(),
+            pa.string(): pd.StringDtype(),
+        }
+    return _pandas_types
+
+
+def csv_dtypes(schema):
+    # dtype= para read_csv: cada bloque se parsea con los tipos declarados
+    # en vez de inferirlos (y que dos bloques del mismo archivo difieran)
+    return {field.name: pandas_types()[field.type] for field in schema}
+
+
+def _coerce(values, dtype):
+    import pandas as pd
+
+    if isinstance(dtype, pd.StringDtype):
+        return values.astype(dtype)
+    return pd.to_numeric(values, errors="coerce").astype(dtype)
+
+
+def to_arrow(df, entity):
+    # Ajusta el DataFrame al esquema de la entidad: columnas en orden, valores
+    # no convertibles (p. ej. un {} donde va un entero) quedan como nulos
+    schema = SCHEMAS[entity]
+    if isinstance(df, Records):
+        return df.to_arrow(schema)
+    df = df.reindex(columns=schema.names)
+    for field in schema:
+        df[field.name] = _coerce(df[field.name], pandas_types()[field.type])
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def to_pandas(table):
+    return table.to_pandas(types_mapper=pandas_types().get)
+
+
+def write_parquet(df, where, entity=None, compression="zstd"):
+    # `where` puede ser una ruta o un buffer; sin esquema se infiere de df
+    if entity in SCHEMAS:
+        table = to_arrow(df, entity)
+    elif isinstance(df, Records):
+        table = df.to_arrow()
+    else:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, where, compression=compression)
+
+
+def read_parquet(source, columns=None):
+    return to_pandas(pq.read_table(source, columns=columns))
+
+
+def read_parquet_records(source, columns=None):
+    return Records.from_arrow(pq.read_table(source, columns=columns))
+
+
+class CsvFormat:
+    name = "csv"
+    extension = ".csv"
+
+    def dumps(self, df, entity=None):
+        if isinstance(df, Records):
+            return df.to_csv_bytes()
+        return df.to_csv(index=False).encode("utf-8")
+
+    def loads(self, data):
+        import pandas as pd
+        return pd.read_csv(io.BytesIO(data))
+
+
+class ParquetFormat:
+    name = "parquet"
+    extension = ".parquet"
+
+    def __init__(self, compression="zstd"):
+        self.compression = compression
+
+    def dumps(self, df, entity=None):
+        buffer = io.BytesIO()
+        write_parquet(df, buffer, entity, self.compression)
+        return buffer.getvalue()
+
+    def loads(self, data):
+        return read_parquet(io.BytesIO(data))
+
+
+def blob_format(name=None, compression=None):
+    # BLOB_FORMAT=parquet|csv, BLOB_COMPRESSION=zstd|snappy|gzip|none
+    name = (name or os.environ.get("BLOB_FORMAT", "parquet")).lower()
+    if name == "csv":
+        return CsvFormat()
+    if name == "parquet":
+        return ParquetFormat(compression or os.environ.get("BLOB_COMPRESSION", "zstd"))
+    raise ValueError(f"Formato de respaldo desconocido: {name}")
@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import os
+from collections import namedtuple
+from shared_code.fetcher import DEFAULT_MAX_WORKERS, map_ordered
+from shared_code.pg_copy import NATURAL_KEYS
+from shared_code.records import Records
+from shared_code.spool import spool_key, spool_pages
+
+# === Descarga por shards de fecha ===
+# Un rango [start, end] se divide en ventanas de un día (o de tamaño
+# adaptativo según cuántos items tiene cada tramo) que se descargan en
+# paralelo. Cada shard pagina su propia consulta con offsets cortos y guarda
+# su avance en un spool propio, así un shard terminado no se repite al
+# relanzar. Al final los spools se unen y se deduplican por clave natural.
+
+DAY = 24 * 60 * 60
+SHARD_DAYS = int(os.getenv("BSALE_SHARD_DAYS", "1"))
+# Con BSALE_SHARD_MAX_ITEMS > 0 los shards se ajustan para no superar ese
+# número de items (se parte por la mitad el tramo que se pasa)
+SHARD_MAX_ITEMS = int(os.getenv("BSALE_SHARD_MAX_ITEMS", "0"))
+
+Shard = namedtuple("Shard", ["start", "end"])
+
+
+def plan_shards(start_ts, end_ts, days=SHARD_DAYS):
+    # Ventanas contiguas de `days` días, sin solaparse. El fin es inclusivo,
+    # así que un tramo final más corto (p. ej. el segundo [hoy 00:00, hoy
+    # 00:00] de una ventana que termina a medianoche) se suma al shard
+    # anterior en vez de costar otra consulta.
+    shards = []
+    start = int(start_ts)
+    while start <= end_ts:
+        end = min(start + days * DAY - 1, int(end_ts))
+        if shards and end - start + 1 < days * DAY:
+            shards[-1] = shards[-1]._replace(end=end)
+        else:
+            shards.append(Shard(start, end))
+        start += days * DAY
+    return shards
+
+
+def adaptive_shards(count, start_ts, end_ts, max_items=SHARD_MAX_ITEMS):
+    # `count(start, end)` devuelve cuántos items hay en el tramo. Los tramos
+    # vacíos se descartan y los que superan `max_items` se parten en dos
+    # (hasta llegar a un día).
+    total = count(start_ts, end_ts)
+    if total == 0:
+        return []
+    # Días completos del tramo: un resto de menos de un día no se parte aparte
+    days = max((end_ts - start_ts + 1) // DAY, 1)
+    if total is None or total <= max_items or days <= 1:
+        return [Shard(start_ts, end_ts)]
+
+    middle = start_ts + (days // 2) * DAY
+    return adaptive_shards(count, start_ts, middle - 1, max_items) + adaptive_shards(count, middle, end_ts, max_items)
+
+
+def shards_for(client, path_or_url, params, date_param, start_ts, end_ts):
+    if SHARD_MAX_ITEMS <= 0:
+        return plan_shards(start_ts, end_ts)
+
+    def count(start, end):
+        return client.count(path_or_url, dict(params, **{date_param: f"[{start},{end}]"}))
+
+    shards = adaptive_shards(count, int(start_ts), int(end_ts))
+    logging.info(f"🧩 {len(shards)} shards adaptativos (máx. {SHARD_MAX_ITEMS} items)")
+    return shards
+
+
+def shard_params(params, date_param, shard):
+    return dict(params, **{date_param: f"[{shard.start},{shard.end}]"})
+
+
+def shard_spool_key(name, params, shard):
+    return spool_key(f"{name}-{shard.start}-{shard.end}", params)
+
+
+def run_shards(client, path_or_url, params, date_param, shards, open_spool, parse, max_workers=DEFAULT_MAX_WORKERS):
+    # Descarga los shards en paralelo; dentro de cada shard se pagina en
+    # secuencia. `open_spool(shard)` devuelve el spool del shard.
+    def run(shard):
+        spool = open_spool(shard)
+        return spool_pages(client, path_or_url, shard_params(params, date_param, shard), spool, parse, parallel=False)
+
+    spools = list(map_ordered(run, shards, max_workers=max_workers))
+    logging.info(f"🧩 {len(spools)} shards descargados")
+    return spools
+
+
+async def run_shards_async(client, path_or_url, params, date_param, shards, open_spool, parse):
+    # Versión asyncio: la concurrencia la limita el semáforo del cliente. La
+    # E/S del spool corre en hilos para no bloquear el event loop.
+    async def run(shard):
+        spool = await asyncio.to_thread(open_spool, shard)
+        if spool.done:
+            return spool
+
+        batches = client.page_batches(path_or_url, dict(shard_params(params, date_param, shard), offset=spool.offset))
+        async for offset, items in batches:
+            frames = {part: Records.of(rows) for part, rows in parse(items).items()}
+            await asyncio.to_thread(spool.write, offset, frames)
+        await asyncio.to_thread(spool.finish)
+        return spool
+
+    spools = await asyncio.gather(*(run(shard) for shard in shards))
+    logging.info(f"🧩 {len(spools)} shards descargados")
+    return spools
+
+
+def merge_spools(spools, part, key_columns=None):
+    # Une la parte `part` de todos los shards, sin duplicados por clave
+    import pandas as pd
+
+    frames = [df for spool in spools for df in spool.frames(part)]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates(subset=key_columns or NATURAL_KEYS[part], keep="last", ignore_index=True)
+
+
+def merge_spool_records(spools, part, key_columns=None):
+    # Igual que merge_spools pero sin pandas: devuelve un Records
+    merged = Records(())
+    for spool in spools:
+        merged.extend(spool.records(part))
+    if merged.empty:
+        return merged
+    return merged.dedupe(key_columns or NATURAL_KEYS[part])
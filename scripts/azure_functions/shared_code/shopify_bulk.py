@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import time
+import requests
+from shared_code.json_codec import loads
+from shared_code.shopify_orders import BULK_LINE_ITEMS, ORDER_FIELDS
+
+# === Exportación masiva de órdenes (Shopify Bulk Operations) ===
+# Para recargas históricas completas: en vez de miles de páginas de 100
+# órdenes se lanza un bulkOperationRunQuery, Shopify arma el archivo del
+# lado del servidor y se descarga un JSONL (una orden por línea) que se lee
+# en streaming, línea a línea, sin cargar el archivo entero en memoria.
+#
+#   1. submit_bulk_query()    lanza la operación
+#   2. wait_for_bulk()        consulta currentBulkOperation hasta que termina
+#   3. stream_jsonl()/read_jsonl()  URL de resultados o archivo local
+#
+# `execute(query, variables)` es la función que hace el POST GraphQL y
+# devuelve el dict de la respuesta; así este módulo no depende de cómo se
+# autentica o se limita el script. read_jsonl() permite repetir un JSONL
+# guardado (p. ej. scripts/shopify/fixtures/bulk_orders.jsonl) sin red.
+
+BULK_POLL_SECONDS = float(os.getenv("SHOPIFY_BULK_POLL_SECONDS", "5"))
+FINISHED = ("COMPLETED", "FAILED", "CANCELED", "EXPIRED")
+
+BULK_ORDERS_QUERY = """
+{
+  orders(query: %s) {
+    edges {
+      node {%s      }
+    }
+  }
+}
+"""
+
+RUN_MUTATION = """
+mutation RunBulk($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status createdAt }
+    userErrors { field message }
+  }
+}
+"""
+
+CURRENT_QUERY = """
+{
+  currentBulkOperation {
+    id
+    status
+    errorCode
+    createdAt
+    objectCount
+    url
+  }
+}
+"""
+
+
+class ShopifyBulkError(Exception):
+    pass
+
+
+def bulk_orders_query(search, line_items=False):
+    # La consulta bulk no acepta variables: el filtro va embebido (json.dumps
+    # lo deja como string GraphQL válido, con comillas escapadas). Con
+    # line_items cada línea llega como una fila más del JSONL (__parentId).
+    fields = ORDER_FIELDS + (BULK_LINE_ITEMS if line_items else "")
+    return BULK_ORDERS_QUERY % (json.dumps(search), fields)
+
+
+def submit_bulk_query(execute, query):
+    result = execute(RUN_MUTATION, {"query": query})["data"]["bulkOperationRunQuery"]
+    if result["userErrors"]:
+        # p. ej. ya hay otra operación bulk en curso para la tienda
+        raise ShopifyBulkError(f"bulkOperationRunQuery rechazada: {result['userErrors']}")
+    return result["bulkOperation"]
+
+
+def wait_for_bulk(execute, operation_id, poll_seconds=BULK_POLL_SECONDS):
+    # Devuelve la operación terminada (con `url`; None si no hubo resultados)
+    while True:
+        operation = execute(CURRENT_QUERY, None)["data"]["currentBulkOperation"]
+        if operation is None or operation["id"] != operation_id:
+            raise ShopifyBulkError(f"La operación bulk {operation_id} ya no es la actual")
+
+        if operation["status"] in FINISHED:
+            if operation["status"] != "COMPLETED":
+                raise ShopifyBulkError(
+                    f"Operación bulk {operation['status']}: {operation.get('errorCode') or 'sin código'}"
+                )
+            return operation
+
+        logging.info(f"⏳ Bulk {operation['status']}: {operation.get('objectCount') or 0} objetos")
+        time.sleep(poll_seconds)
+
+
+def _json_lines(lines):
+    for line in lines:
+        if line.strip():
+            yield loads(line)
+
+
+def stream_jsonl(url, chunk_size=1 << 16):
+    # Descarga en streaming: una línea a la vez, nunca el archivo completo
+    if not url:
+        return
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        yield from _json_lines(response.iter_lines(chunk_size=chunk_size))
+
+
+def read_jsonl(path):
+    with open(path, "rb") as f:
+        yield from _json_lines(f)
+
+
+def bulk_orders(execute, search, line_items=False, poll_seconds=BULK_POLL_SECONDS):
+    # Exporta todas las órdenes que cumplen `search`. Devuelve la operación
+    # (su createdAt sirve de high-water mark: lo modificado durante la
+    # exportación se vuelve a leer en la siguiente corrida incremental) y un
+    # generador con los nodos de cada orden y línea (ver
+    # shopify_orders.order_frames).
+    operation = submit_bulk_query(execute, bulk_orders_query(search, line_items))
+    logging.info(f"🚚 Operación bulk lanzada: {operation['id']}")
+    operation = wait_for_bulk(execute, operation["id"], poll_seconds)
+    logging.info(f"📥 Bulk lista: {operation.get('objectCount') or 0} objetos")
+    return operation, stream_jsonl(operation["url"])
@@ -0,0 +1,201 @@
+import logging
+import math
+import os
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
+from shared_code.json_codec import loads
+from shared_code.rate_limit import MAX_RETRIES, RETRY_STATUSES, backoff_delay, retry_after_seconds
+
+# === Cliente GraphQL de Shopify con presupuesto de costo ===
+# Shopify limita la Admin API GraphQL con un balde de puntos de costo: cada
+# consulta descuenta su requestedQueryCost (luego devuelve la diferencia con
+# el costo real) y el balde se recupera a restoreRate puntos por segundo.
+# Cada respuesta trae el estado en extensions.cost.throttleStatus.
+#
+# El cliente lleva una estimación local del balde (CostBucket) y con ella:
+#   - espera lo justo antes de una consulta que no cabe, en vez de chocar
+#     con un THROTTLED;
+#   - ajusta `first:` página a página al presupuesto disponible (hasta 250),
+#     según el costo por orden observado en la página anterior;
+#   - si igual llega un THROTTLED, espera a que el balde se recupere y
+#     repite la consulta sin abortar la descarga.
+# Otros errores GraphQL se propagan como ShopifyAPIError; 429/5xx y
+# timeouts se reintentan con backoff, igual que BsaleClient.
+
+SHOPIFY_API_VERSION = "2024-01"
+MAX_PAGE_SIZE = 250      # Máximo de `first:` que acepta la API
+MIN_PAGE_SIZE = 25       # Por debajo de esto conviene esperar al balde
+DEFAULT_PAGE_SIZE = 100  # Primera página, antes de conocer el costo por orden
+MAX_QUERY_COST = 1000    # Costo máximo de una sola consulta
+DEFAULT_TIMEOUT = 30
+
+
+class ShopifyAPIError(Exception):
+    pass
+
+
+class CostBucket:
+    # Estado del balde según la última respuesta, recuperado en el tiempo
+    def __init__(self):
+        self.maximum = None
+        self.available = None
+        self.restore_rate = None
+        self.updated_at = None
+
+    def update(self, throttle_status):
+        self.maximum = throttle_status["maximumAvailable"]
+        self.available = throttle_status["currentlyAvailable"]
+        self.restore_rate = throttle_status["restoreRate"]
+        self.updated_at = time.monotonic()
+
+    def estimate(self):
+        if self.available is None:
+            return None
+        restored = (time.monotonic() - self.updated_at) * self.restore_rate
+        return min(self.maximum, self.available + restored)
+
+    def seconds_until(self, cost):
+        # Espera necesaria para disponer de `cost` puntos (0 si ya están)
+        available = self.estimate()
+        if available is None or not cost or available >= cost:
+            return 0.0
+        return (min(cost, self.maximum) - available) / self.restore_rate
+
+
+def _throttled(errors):
+    return any((error.get("extensions") or {}).get("code") == "THROTTLED" for error in errors)
+
+
+class ShopifyClient:
+    def __init__(self, store, access_token, api_version=SHOPIFY_API_VERSION, timeout=DEFAULT_TIMEOUT,
+                 max_retries=MAX_RETRIES, max_page_size=MAX_PAGE_SIZE, min_page_size=MIN_PAGE_SIZE):
+        self.url = f"https://{store}/admin/api/{api_version}/graphql.json"
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_page_size = max_page_size
+        self.min_page_size = min_page_size
+        self.bucket = CostBucket()
+        self.last_cost = None
+
+        # Contadores: requests, throttled, retries, errors, esperas por tipo
+        # (paced = antes de enviar, throttle_waits, retry_waits) y el total
+        # en waited_seconds
+        self.stats = Counter()
+
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", "X-Shopify-Access-Token": access_token})
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _sleep(self, seconds, key):
+        if seconds > 0:
+            self.stats[key] += 1
+            self.stats["waited_seconds"] += seconds
+            time.sleep(seconds)
+
+    def execute(self, query, variables=None, expected_cost=None):
+        # Devuelve la respuesta completa (dict con "data"). `expected_cost`
+        # permite esperar al balde antes de enviar la consulta.
+        attempt = 0
+        while True:
+            self._sleep(self.bucket.seconds_until(expected_cost), "paced")
+            self.stats["requests"] += 1
+            try:
+                response = self.session.post(
+                    self.url, json={"query": query, "variables": variables}, timeout=self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = f"{type(exc).__name__}: {exc}"
+                delay = backoff_delay(attempt)
+            else:
+                if response.status_code == 200:
+                    data = loads(response.content)
+                    cost = (data.get("extensions") or {}).get("cost")
+                    if cost:
+                        self.last_cost = cost
+                        self.bucket.update(cost["throttleStatus"])
+
+                    errors = data.get("errors")
+                    if not errors:
+                        return data
+                    if not _throttled(errors):
+                        self.stats["errors"] += 1
+                        raise ShopifyAPIError(f"❌ Error en consulta GraphQL: {errors}")
+
+                    # THROTTLED: no consume reintentos; se espera a que el
+                    # balde tenga el costo pedido y se repite
+                    self.stats["throttled"] += 1
+                    needed = cost["requestedQueryCost"] if cost else expected_cost
+                    wait = self.bucket.seconds_until(needed) or backoff_delay(0)
+                    logging.warning(f"🐢 THROTTLED: esperando {wait:.1f}s a que se recupere el balde")
+                    self._sleep(wait, "throttle_waits")
+                    continue
+
+                error = f"{response.status_code} - {response.text}"
+                if response.status_code not in RETRY_STATUSES:
+                    self.stats["errors"] += 1
+                    raise ShopifyAPIError(f"❌ Error en API: {error}")
+                delay = retry_after_seconds(response.headers) if response.status_code == 429 else None
+                delay = delay if delay is not None else backoff_delay(attempt)
+
+            if attempt == self.max_retries:
+                self.stats["errors"] += 1
+                raise ShopifyAPIError(f"❌ Error en API tras {self.max_retries} reintentos: {error}")
+
+            attempt += 1
+            self.stats["retries"] += 1
+            logging.warning(f"🔁 Reintento {attempt}/{self.max_retries} en {delay:.1f}s: {error}")
+            self._sleep(delay, "retry_waits")
+
+    def page_size(self, item_cost):
+        # La página más grande que cabe en el presupuesto disponible (y en el
+        # tope por consulta). Con el balde casi vacío el ritmo lo pone
+        # restoreRate igual: en vez de muchas páginas mínimas se pide una de
+        # medio balde y execute espera a que se recupere.
+        available = self.bucket.estimate()
+        if not item_cost or available is None:
+            return DEFAULT_PAGE_SIZE
+        fits = math.floor(min(available, MAX_QUERY_COST) / item_cost)
+        if fits < self.min_page_size:
+            fits = math.floor(min(self.bucket.maximum / 2, MAX_QUERY_COST) / item_cost)
+        return max(1, min(self.max_page_size, fits))
+
+    def paginate(self, query, connection, variables=None):
+        # Recorre una conexión (p. ej. "orders") y entrega sus nodos. La
+        # consulta debe declarar $first: Int! y $after: String.
+        variables = dict(variables or {})
+        first, after, item_cost = DEFAULT_PAGE_SIZE, None, None
+
+        while True:
+            expected_cost = math.ceil(first * item_cost) if item_cost else None
+            data = self.execute(query, {**variables, "first": first, "after": after}, expected_cost)
+            page = data["data"][connection]
+            for edge in page["edges"]:
+                yield edge["node"]
+
+            if self.last_cost:
+                # Costo por item pedido (incluye la parte fija: estimación
+                # conservadora)
+                item_cost = self.last_cost["requestedQueryCost"] / first
+
+            if not page["pageInfo"]["hasNextPage"]:
+                return
+            after = page["pageInfo"]["endCursor"]
+            first = self.page_size(item_cost)
+
+
+def shopify_client_from_env(**kwargs):
+    return ShopifyClient(
+        os.getenv("SHOPIFY_STORE"), os.getenv("SHOPIFY_ACCESS_TOKEN"),
+        api_version=os.getenv("SHOPIFY_API_VERSION", SHOPIFY_API_VERSION), **kwargs
+    )
@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+# === Órdenes de Shopify: registros por orden y agregado diario ===
+# En vez de re-descargar todas las órdenes desde 2023 en cada corrida, se
+# guarda una fila por orden (OrderStore) y un high-water mark de updatedAt.
+# La corrida incremental pide solo las órdenes modificadas desde ahí
+# (incluye cancelaciones tardías, que cambian updatedAt), las mezcla por
+# order_id y recalcula únicamente los días que tocaron.
+#
+#   <root>/orders/YYYY-MM.csv            una fila por orden, por mes de creación (CL)
+#   <root>/state.json                    {"updated_at": "...", "synced_at": "..."}
+#   <root>/ventas_shopify.csv            agregado diario (lo que lee Power BI)
+#   <root>/ventas_shopify_por_<x>.csv    desgloses opcionales (SHOPIFY_BREAKDOWNS)
+#
+# El mes de una orden sale de createdAt, que no cambia, así que una orden
+# modificada siempre vuelve a la misma partición.
+#
+# Las órdenes se juntan en columnas (order_columns) y la conversión de zona
+# horaria, el filtro de ventas reales y las sumas por día se hacen sobre el
+# DataFrame completo (datetime64 + tz_convert + groupby), sin parsear
+# fechas ni acumular en dicts orden por orden.
+#
+# Las líneas de cada orden (order_frames) no se guardan en el store local:
+# solo viajan a PostgreSQL (shared_code/shopify_pg.py).
+
+DEFAULT_SHOPIFY_DIR = os.path.join("data", "shopify_sales")
+SHOPIFY_DIR = os.getenv("SHOPIFY_DIR", DEFAULT_SHOPIFY_DIR)
+LOCAL_TZ = "America/Santiago"
+# Margen hacia atrás sobre el high-water mark: re-leer órdenes ya vistas es
+# inofensivo (se reemplazan por order_id)
+LOOKBACK = timedelta(minutes=int(os.getenv("SHOPIFY_LOOKBACK_MINUTES", "10")))
+# Líneas por orden en la consulta paginada (en bulk vienen todas)
+LINE_ITEMS_PER_ORDER = int(os.getenv("SHOPIFY_LINE_ITEMS_PER_ORDER", "25"))
+
+# Campos de cada orden; los comparten la consulta paginada y la bulk
+ORDER_FIELDS = """
+        id
+        createdAt
+        updatedAt
+        cancelReason
+        test
+        sourceName
+        currentTotalPriceSet {
+          shopMoney {
+            amount
+            currencyCode
+          }
+        }
+"""
+
+# Líneas de cada orden (para shopify_order_lines). En la consulta paginada
+# la conexión lleva first: y suma a su costo (first x costo por línea); en
+# bulk va sin first y Shopify entrega cada línea como una fila aparte del
+# JSONL con __parentId = id de la orden.
+LINE_ITEM_FIELDS = """
+            id
+            name
+            sku
+            quantity
+            variant { id }
+            originalUnitPriceSet { shopMoney { amount } }
+            discountedTotalSet { shopMoney { amount } }
+"""
+PAGED_LINE_ITEMS = """
+        lineItems(first: %d) {
+          pageInfo { hasNextPage }
+          edges { node {%s          } }
+        }
+""" % (LINE_ITEMS_PER_ORDER, LINE_ITEM_FIELDS)
+BULK_LINE_ITEMS = """
+        lineItems {
+          edges { node {%s          } }
+        }
+""" % LINE_ITEM_FIELDS
+
+ORDER_COLUMNS = [
+    "order_id", "created_at", "updated_at", "fecha_cl", "hora_cl", "amount", "currency", "channel", "test",
+    "cancel_reason"
+]
+ORDER_DTYPES = {
+    "order_id": str, "created_at": str, "updated_at": str, "fecha_cl": str, "currency": str, "channel": str,
+    "cancel_reason": str
+}
+
+LINE_COLUMNS = ["line_item_id", "order_id", "sku", "name", "quantity", "unit_price", "total", "variant_id"]
+
+DATE_COLUMN = "Fecha (CL)"
+TOTAL_COLUMN = "Total Ventas ($)"
+COUNT_COLUMN = "Cantidad de Órdenes"
+
+# Desgloses opcionales: nombre en SHOPIFY_BREAKDOWNS -> (columna de la
+# orden, encabezado en el CSV)
+BREAKDOWNS = {
+    "hora": ("hora_cl", "Hora (CL)"),
+    "canal": ("channel", "Canal"),
+    "moneda": ("currency", "Moneda"),
+}
+
+
+def parse_timestamp(value):
+    # "2024-03-01T12:34:56Z" -> datetime con zona UTC
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def enabled_breakdowns(value=None):
+    value = value if value is not None else os.getenv("SHOPIFY_BREAKDOWNS", "")
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = set(names) - set(BREAKDOWNS)
+    if unknown:
+        raise ValueError(f"Desglose desconocido: {', '.join(sorted(unknown))} (opciones: {', '.join(BREAKDOWNS)})")
+    return names
+
+
+def _add_line(lines, order_id, item):
+    lines["line_item_id"].append(item["id"])
+    lines["order_id"].append(order_id)
+    lines["sku"].append(item.get("sku"))
+    lines["name"].append(item.get("name"))
+    lines["quantity"].append(item["quantity"])
+    lines["unit_price"].append(item["originalUnitPriceSet"]["shopMoney"]["amount"])
+    lines["total"].append(item["discountedTotalSet"]["shopMoney"]["amount"])
+    lines["variant_id"].append((item.get("variant") or {}).get("id"))
+
+
+def order_columns(nodes):
+    # Nodos GraphQL -> columnas (listas); solo se copian los valores.
+    # Las líneas llegan embebidas en la orden (consulta paginada) o como
+    # nodos sueltos con __parentId (JSONL de bulk); ambas van a `lines`.
+    columns = {name: [] for name in ("order_id", "created_at", "created_utc", "updated_at", "amount", "currency",
+                                     "channel", "test", "cancel_reason")}
+    lines = {name: [] for name in LINE_COLUMNS}
+    truncated = 0
+    for node in nodes:
+        parent_id = node.get("__parentId")
+        if parent_id is not None:
+            _add_line(lines, parent_id, node)
+            continue
+
+        money = node["currentTotalPriceSet"]["shopMoney"]
+        columns["order_id"].append(node["id"])
+        columns["created_at"].append(node["createdAt"])
+        # createdAt siempre viene en UTC ("...Z"); sin la zona NumPy lo
+        # parsea directo, mucho más rápido que el parser ISO de pandas
+        columns["created_utc"].append(node["createdAt"][:19])
+        columns["updated_at"].append(node["updatedAt"])
+        columns["amount"].append(money["amount"])
+        columns["currency"].append(money["currencyCode"])
+        columns["channel"].append(node.get("sourceName"))
+        columns["test"].append(node["test"])
+        columns["cancel_reason"].append(node["cancelReason"])
+
+        line_items = node.get("lineItems")
+        if line_items is not None:
+            for edge in line_items["edges"]:
+                _add_line(lines, node["id"], edge["node"])
+            truncated += line_items["pageInfo"]["hasNextPage"]
+
+    if truncated:
+        logging.warning(f"⚠️ {truncated} órdenes con más de {LINE_ITEMS_PER_ORDER} líneas quedaron truncadas "
+                        "(subir SHOPIFY_LINE_ITEMS_PER_ORDER o usar SHOPIFY_MODE=bulk)")
+    return columns, lines
+
+
+def order_frames(nodes):
+    # (órdenes, líneas) como DataFrames
+    columns, lines = order_columns(nodes)
+    created = pd.DatetimeIndex(np.array(columns.pop("created_utc"), dtype="datetime64[s]"))
+    created = created.tz_localize("UTC").tz_convert(LOCAL_TZ).tz_localize(None)
+
+    # Arrays ya tipados: pandas no tiene que inferir el tipo columna a columna
+    df = pd.DataFrame({name: np.array(values, dtype=object) for name, values in columns.items()}, copy=False)
+    df["amount"] = np.array(columns["amount"], dtype=float)
+    df["test"] = np.array(columns["test"], dtype=bool)
+    df["fecha_cl"] = created.values.astype("datetime64[D]").astype(str)
+    df["hora_cl"] = created.hour
+
+    line_df = pd.DataFrame({name: np.array(values, dtype=object) for name, values in lines.items()}, copy=False)
+    line_df["quantity"] = np.array(lines["quantity"], dtype=np.int64)
+    line_df["unit_price"] = np.array(lines["unit_price"], dtype=float)
+    line_df["total"] = np.array(lines["total"], dtype=float)
+    return df[ORDER_COLUMNS], line_df[LINE_COLUMNS]
+
+
+def sales_mask(df):
+    # Venta real: ni de prueba, ni cancelada, ni de monto cero
+    return ~df["test"].astype(bool) & df["cancel_reason"].isna() & (df["amount"] != 0)
+
+
+def daily_totals(df, by=None):
+    # Total y cantidad de ventas reales por día (y por `by`, si se pide)
+    keys = ["fecha_cl"] + ([by] if by else [])
+    sales = df.loc[sales_mask(df), keys + ["amount"]]
+    totals = sales.groupby(keys, sort=True, dropna=False)["amount"].agg(["sum", "size"]).reset_index()
+    totals["sum"] = totals["sum"].round(2)
+    header = {"fecha_cl": DATE_COLUMN, "sum": TOTAL_COLUMN, "size": COUNT_COLUMN}
+    if by:
+        header[by] = next(label for column, label in BREAKDOWNS.values() if column == by)
+    return totals.rename(columns=header)
+
+
+def _write_csv_atomic(df, path, encoding="utf-8"):
+    # Como en spool: se escribe a un temporal y se renombra
+    tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    df.to_csv(tmp_path, index=False, encoding=encoding, lineterminator="\n")
+    os.replace(tmp_path, path)
+
+
+class OrderStore:
+    def __init__(self, root=SHOPIFY_DIR, breakdowns=None):
+        self.root = root
+        self.orders_dir = os.path.join(root, "orders")
+        self.state_path = os.path.join(root, "state.json")
+        self.daily_path = os.path.join(root, "ventas_shopify.csv")
+        self.breakdowns = enabled_breakdowns() if breakdowns is None else breakdowns
+        os.makedirs(self.orders_dir, exist_ok=True)
+
+    # --- high-water mark ---
+
+    def high_water_mark(self):
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f).get("updated_at")
+        except FileNotFoundError:
+            return None
+
+    def since(self):
+        # Filtro updated_at para la próxima corrida (None = carga completa)
+        mark = self.high_water_mark()
+        if mark is None:
+            return None
+        return (parse_timestamp(mark) - LOOKBACK).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def save_high_water_mark(self, updated_at):
+        tmp_path = os.path.join(self.root, ".state.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"updated_at": updated_at, "synced_at": datetime.now().astimezone().isoformat()}, f)
+        os.replace(tmp_path, self.state_path)
+
+    # --- órdenes por mes ---
+
+    def months(self):
+        return sorted(name[:-4] for name in os.listdir(self.orders_dir) if name.endswith(".csv"))
+
+    def _month_path(self, month):
+        return os.path.join(self.orders_dir, f"{month}.csv")
+
+    def read_month(self, month):
+        path = self._month_path(month)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=ORDER_COLUMNS)
+        # reindex: archivos anteriores sin hora_cl/channel quedan con nulos
+        return pd.read_csv(path, dtype=ORDER_DTYPES).reindex(columns=ORDER_COLUMNS)
+
+    def read_all(self):
+        months = [self.read_month(month) for month in self.months()]
+        return pd.concat(months, ignore_index=True) if months else pd.DataFrame(columns=ORDER_COLUMNS)
+
+    def clear(self):
+        for month in self.months():
+            os.remove(self._month_path(month))
+
+    def merge(self, orders):
+        # Reemplaza por order_id solo en los meses recibidos y devuelve las
+        # órdenes (ya mezcladas) de los días tocados
+        touched = []
+        for month, changed in orders.groupby(orders["fecha_cl"].str[:7], sort=False):
+            current = changed
+            if os.path.exists(self._month_path(month)):
+                current = pd.concat([self.read_month(month), changed], ignore_index=True)
+            current = current.drop_duplicates(subset="order_id", keep="last")
+            current = current.sort_values(["created_at", "order_id"], kind="stable")
+            _write_csv_atomic(current, self._month_path(month))
+            touched.append(current[current["fecha_cl"].isin(changed["fecha_cl"].unique())])
+        return pd.concat(touched, ignore_index=True) if touched else pd.DataFrame(columns=ORDER_COLUMNS)
+
+    # --- agregado diario y desgloses ---
+
+    def _outputs(self):
+        # (ruta, columna de desglose o None) de cada CSV de agregados
+        yield self.daily_path, None
+        for name in self.breakdowns:
+            yield os.path.join(self.root, f"ventas_shopify_por_{name}.csv"), BREAKDOWNS[name][0]
+
+    def write_daily(self, orders):
+        # Carga completa: todos los agregados desde cero, en la misma pasada
+        for path, by in self._outputs():
+            _write_csv_atomic(daily_totals(orders, by), path, encoding="utf-8-sig")
+
+    def update_daily(self, touched):
+        # Recalcula solo los días tocados; un día que se quedó sin ventas
+        # (p. ej. su única orden se canceló) sale del agregado
+        if touched.empty:
+            return
+        days = touched["fecha_cl"].unique()
+        for path, by in self._outputs():
+            recomputed = daily_totals(touched, by)
+            if os.path.exists(path):
+                current = pd.read_csv(path, encoding="utf-8-sig", dtype={DATE_COLUMN: str})
+                current = current[~current[DATE_COLUMN].isin(days)]
+                recomputed = pd.concat([current, recomputed], ignore_index=True)
+            keys = [column for column in recomputed.columns if column not in (TOTAL_COLUMN, COUNT_COLUMN)]
+            _write_csv_atomic(recomputed.sort_values(keys, kind="stable"), path, encoding="utf-8-sig")
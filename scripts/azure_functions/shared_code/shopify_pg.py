@@ -0,0 +1,122 @@
+import logging
+import time
+from shared_code.pg_copy import DEFAULT_CHUNKSIZE, CopyResult, _copy_into, _run
+from shared_code.shopify_orders import LINE_COLUMNS, ORDER_COLUMNS, sales_mask
+
+# === Órdenes de Shopify en PostgreSQL ===
+# Hechos a nivel de orden y de línea, más un agregado diario que Power BI
+# consulta directo (sin releer los CSV en cada refresh):
+#
+#   shopify_orders        una fila por orden (PK order_id), is_sale ya calculado
+#   shopify_order_lines   una fila por línea (PK line_item_id); sku cruza con
+#                         variants_data.code de Bsale
+#   shopify_sales_daily   ventas reales por fecha_cl (PK), mismo criterio que
+#                         ventas_shopify.csv
+#
+# load_orders() carga un lote de órdenes cambiadas en UNA transacción:
+# COPY a tablas temporales, upsert de órdenes, reemplazo de las líneas de
+# esas órdenes (una edición puede quitar líneas) y recálculo en el agregado
+# diario solo de los días que tocan. Con replace=True (cargas completas)
+# primero se vacían las tres tablas.
+
+ORDERS_TABLE = "shopify_orders"
+LINES_TABLE = "shopify_order_lines"
+DAILY_TABLE = "shopify_sales_daily"
+
+DDL = [
+    f"""CREATE TABLE IF NOT EXISTS {ORDERS_TABLE} (
+        order_id TEXT PRIMARY KEY,
+        created_at TIMESTAMPTZ NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL,
+        fecha_cl DATE NOT NULL,
+        hora_cl SMALLINT NOT NULL,
+        amount NUMERIC(14, 2) NOT NULL,
+        currency TEXT,
+        channel TEXT,
+        test BOOLEAN NOT NULL,
+        cancel_reason TEXT,
+        is_sale BOOLEAN NOT NULL
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_{ORDERS_TABLE}_fecha_cl ON {ORDERS_TABLE} (fecha_cl) WHERE is_sale",
+    f"CREATE INDEX IF NOT EXISTS ix_{ORDERS_TABLE}_updated_at ON {ORDERS_TABLE} (updated_at)",
+    f"""CREATE TABLE IF NOT EXISTS {LINES_TABLE} (
+        line_item_id TEXT PRIMARY KEY,
+        order_id TEXT NOT NULL,
+        sku TEXT,
+        name TEXT,
+        quantity INTEGER NOT NULL,
+        unit_price NUMERIC(14, 2),
+        total NUMERIC(14, 2),
+        variant_id TEXT
+    )""",
+    f"CREATE INDEX IF NOT EXISTS ix_{LINES_TABLE}_order_id ON {LINES_TABLE} (order_id)",
+    f"CREATE INDEX IF NOT EXISTS ix_{LINES_TABLE}_sku ON {LINES_TABLE} (sku)",
+    f"""CREATE TABLE IF NOT EXISTS {DAILY_TABLE} (
+        fecha_cl DATE PRIMARY KEY,
+        total_sales NUMERIC(16, 2) NOT NULL,
+        order_count INTEGER NOT NULL,
+        refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )""",
+]
+
+
+def _load_work(cursor, orders, lines, replace, chunksize):
+    for statement in DDL:
+        cursor.execute(statement)
+    if replace:
+        cursor.execute(f"TRUNCATE {ORDERS_TABLE}, {LINES_TABLE}, {DAILY_TABLE}")
+
+    order_columns = ORDER_COLUMNS + ["is_sale"]
+    columns = ", ".join(order_columns)
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in order_columns if c != "order_id")
+
+    cursor.execute(f"CREATE TEMP TABLE staging_orders (LIKE {ORDERS_TABLE}) ON COMMIT DROP")
+    cursor.execute(f"CREATE TEMP TABLE staging_lines (LIKE {LINES_TABLE}) ON COMMIT DROP")
+    _copy_into(cursor, "staging_orders", orders.assign(is_sale=sales_mask(orders))[order_columns], chunksize)
+    _copy_into(cursor, "staging_lines", lines[LINE_COLUMNS], chunksize)
+
+    # Órdenes: gana la última versión de cada order_id del lote
+    cursor.execute(
+        f"INSERT INTO {ORDERS_TABLE} ({columns}) "
+        f"SELECT DISTINCT ON (order_id) {columns} FROM staging_orders ORDER BY order_id, updated_at DESC "
+        f"ON CONFLICT (order_id) DO UPDATE SET {updates}"
+    )
+    upserted = cursor.rowcount
+
+    # Líneas: las de las órdenes del lote se reemplazan completas
+    line_columns = ", ".join(LINE_COLUMNS)
+    line_updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in LINE_COLUMNS if c != "line_item_id")
+    cursor.execute(f"DELETE FROM {LINES_TABLE} WHERE order_id IN (SELECT order_id FROM staging_orders)")
+    cursor.execute(
+        f"INSERT INTO {LINES_TABLE} ({line_columns}) "
+        f"SELECT DISTINCT ON (line_item_id) {line_columns} FROM staging_lines ORDER BY line_item_id "
+        f"ON CONFLICT (line_item_id) DO UPDATE SET {line_updates}"
+    )
+    line_rows = cursor.rowcount
+
+    # Agregado diario: solo los días del lote; un día sin ventas desaparece
+    cursor.execute(f"DELETE FROM {DAILY_TABLE} WHERE fecha_cl IN (SELECT DISTINCT fecha_cl FROM staging_orders)")
+    cursor.execute(
+        f"INSERT INTO {DAILY_TABLE} (fecha_cl, total_sales, order_count) "
+        f"SELECT fecha_cl, SUM(amount), COUNT(*) FROM {ORDERS_TABLE} "
+        f"WHERE is_sale AND fecha_cl IN (SELECT DISTINCT fecha_cl FROM staging_orders) GROUP BY fecha_cl"
+    )
+    days = cursor.rowcount
+    return upserted, line_rows, days
+
+
+def load_orders(engine, orders, lines, replace=False, chunksize=DEFAULT_CHUNKSIZE):
+    # Devuelve {tabla: CopyResult}
+    if orders.empty and not replace:
+        return {}
+    started = time.perf_counter()
+    upserted, line_rows, days = _run(engine, lambda cursor: _load_work(cursor, orders, lines, replace, chunksize))
+
+    seconds = time.perf_counter() - started
+    logging.info(f"🚚 Shopify → PostgreSQL: {upserted} órdenes, {line_rows} líneas, {days} días de "
+                 f"{DAILY_TABLE} en {seconds:.2f}s")
+    return {
+        ORDERS_TABLE: CopyResult(upserted, seconds),
+        LINES_TABLE: CopyResult(line_rows, seconds),
+        DAILY_TABLE: CopyResult(days, seconds),
+    }
@@ -0,0 +1,174 @@
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+from shared_code.bsale_client import DEFAULT_BATCH_PAGES
+from shared_code.records import Records
+from shared_code.serialization import read_parquet, read_parquet_records, write_parquet
+
+# === Spool de paginación reanudable ===
+# Las descargas largas guardan cada lote de páginas en un spool (carpeta
+# local o prefijo en Blob) junto con el offset alcanzado. Si el proceso se
+# corta, al relanzarlo con los mismos parámetros continúa desde el último
+# lote completo en vez de empezar de cero.
+#
+#   <spool>/batch-<offset>-<parte>.parquet   un archivo por lote y parte
+#   <spool>/state.json                       {"offset": ..., "done": ...}
+#
+# Cada lote puede tener varias partes (p. ej. "documentos" y
+# "document_details"); si la parte tiene esquema en serialization.SCHEMAS
+# se escribe con él. Los lotes se escriben desde Records (sin pandas) y se
+# leen como DataFrames (frames/read) o como Records (records).
+
+SPOOL_DIR = os.getenv("SPOOL_DIR", "data/spool")
+
+
+def spool_key(name, params):
+    # Mismo nombre y parámetros -> mismo spool
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:10]
+    return f"{name}-{digest}"
+
+
+def _batch_name(offset, part):
+    return f"batch-{offset:07d}-{part}.parquet"
+
+
+class LocalSpool:
+    def __init__(self, key, root=SPOOL_DIR):
+        self.path = os.path.join(root, key)
+        os.makedirs(self.path, exist_ok=True)
+        self.state = self._load_state()
+
+    def _load_state(self):
+        try:
+            with open(os.path.join(self.path, "state.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"offset": 0, "done": False, "parts": []}
+
+    def _save_state(self):
+        # Escritura atómica: un corte nunca deja state.json a medias
+        tmp_path = os.path.join(self.path, ".state.json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, os.path.join(self.path, "state.json"))
+
+    @property
+    def offset(self):
+        return self.state["offset"]
+
+    @property
+    def done(self):
+        return self.state["done"]
+
+    def write(self, offset, frames):
+        # Primero los datos, después el offset: lo que indica state.json
+        # siempre está en disco
+        for part, df in frames.items():
+            if df.empty:
+                continue
+            name = _batch_name(offset, part)
+            tmp_path = os.path.join(self.path, f".{name}.tmp")
+            write_parquet(df, tmp_path, part)
+            os.replace(tmp_path, os.path.join(self.path, name))
+            if part not in self.state["parts"]:
+                self.state["parts"].append(part)
+        self.state["offset"] = offset
+        self._save_state()
+
+    def finish(self):
+        self.state["done"] = True
+        self._save_state()
+
+    def _batches(self, part):
+        suffix = f"-{part}.parquet"
+        return sorted(name for name in os.listdir(self.path) if name.startswith("batch-") and name.endswith(suffix))
+
+    def _open_batch(self, name):
+        return os.path.join(self.path, name)
+
+    def frames(self, part):
+        for name in self._batches(part):
+            yield read_parquet(self._open_batch(name))
+
+    def read(self, part):
+        import pandas as pd
+
+        frames = list(self.frames(part))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def records(self, part):
+        merged = Records(())
+        for name in self._batches(part):
+            merged.extend(read_parquet_records(self._open_batch(name)))
+        return merged
+
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class BlobSpool(LocalSpool):
+    # Mismo spool sobre un container de Blob (para Functions o máquinas sin
+    # disco persistente)
+    def __init__(self, container_client, key, prefix="spool"):
+        self.container_client = container_client
+        self.path = f"{prefix}/{key}"
+        self.state = self._load_state()
+
+    def _blob(self, name):
+        return self.container_client.get_blob_client(f"{self.path}/{name}")
+
+    def _load_state(self):
+        blob = self._blob("state.json")
+        if not blob.exists():
+            return {"offset": 0, "done": False, "parts": []}
+        return json.loads(blob.download_blob().readall())
+
+    def _save_state(self):
+        self._blob("state.json").upload_blob(json.dumps(self.state), overwrite=True)
+
+    def write(self, offset, frames):
+        for part, df in frames.items():
+            if df.empty:
+                continue
+            buffer = io.BytesIO()
+            write_parquet(df, buffer, part)
+            self._blob(_batch_name(offset, part)).upload_blob(buffer.getvalue(), overwrite=True)
+            if part not in self.state["parts"]:
+                self.state["parts"].append(part)
+        self.state["offset"] = offset
+        self._save_state()
+
+    def _batches(self, part):
+        suffix = f"-{part}.parquet"
+        return sorted(
+            blob.name.rsplit("/", 1)[1] for blob in self.container_client.list_blobs(name_starts_with=f"{self.path}/batch-")
+            if blob.name.endswith(suffix)
+        )
+
+    def _open_batch(self, name):
+        return io.BytesIO(self._blob(name).download_blob().readall())
+
+    def clear(self):
+        for blob in self.container_client.list_blobs(name_starts_with=f"{self.path}/"):
+            self.container_client.delete_blob(blob.name)
+
+
+def spool_pages(client, path_or_url, params, spool, parse, batch_pages=DEFAULT_BATCH_PAGES, parallel=True):
+    # Descarga `path_or_url` desde el offset del spool y guarda cada lote.
+    # `parse(items)` devuelve {parte: filas}. Un spool ya terminado no vuelve
+    # a pedir nada.
+    if spool.done:
+        return spool
+    if spool.offset:
+        logging.info(f"⏩ Retomando descarga desde el offset {spool.offset}")
+
+    for offset, items in client.page_batches(path_or_url, dict(params, offset=spool.offset), batch_pages,
+                                            parallel=parallel):
+        spool.write(offset, {part: Records.of(rows) for part, rows in parse(items).items()})
+        logging.info(f"💾 Lote guardado en el spool (offset {offset})")
+
+    spool.finish()
+    return spool
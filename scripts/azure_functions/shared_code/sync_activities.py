@@ -0,0 +1,236 @@
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from shared_code.bsale_client import DEFAULT_RATE_PER_SECOND, client_from_env
+from shared_code.checkpoints import CheckpointStore, utc_midnight
+from shared_code.dimensions import DIMENSIONS
+from shared_code.documents import DocumentParser
+from shared_code.orchestration import FAIL, FETCH_DIMENSION, FETCH_SHARD, LOAD, PLAN
+from shared_code.payments import payment_record
+from shared_code.pg_copy import load_tables
+from shared_code.rate_limit import HostRateLimiter
+from shared_code.resources import get_backup_format, get_blob_container, get_engine, log_startup
+from shared_code.sellers import DOCUMENTS_EXPAND
+from shared_code.shards import Shard, merge_spool_records, plan_shards, shard_params, shard_spool_key
+from shared_code.spool import BlobSpool, LocalSpool, spool_key, spool_pages
+
+# === Actividades de la sincronización diaria ===
+# Implementación de las actividades que reparte shared_code/orchestration.py.
+# Cada actividad recibe y devuelve JSON; los recursos (Bsale, PostgreSQL,
+# spools, respaldos) llegan en SyncResources, así la misma clase corre en
+# Azure (resources_from_env) o en local (local_resources).
+
+Source = namedtuple("Source", ["path", "params", "date_param", "date_column", "parts"])
+
+SOURCES = {
+    "documentos": Source("documents.json", {"expand": DOCUMENTS_EXPAND}, "emissiondaterange", "emission_date",
+                         ["documentos", "document_details"]),
+    "pagos": Source("payments.json", {}, "recorddaterange", "payment_date", ["pagos"]),
+}
+
+# Prefijo del respaldo de cada parte, igual que UpdateDocuments/UpdatePayments
+BACKUP_NAMES = {
+    "documentos": "documentos/documentos",
+    "document_details": "document_details/document_details",
+    "pagos": "pagos/payments",
+}
+
+# bsale(): cliente Bsale (context manager); engine: SQLAlchemy;
+# open_spool(clave): spool; upload(nombre, bytes): guarda un respaldo
+SyncResources = namedtuple("SyncResources", ["bsale", "engine", "open_spool", "upload"])
+
+
+def initial_start(engine, entity):
+    # Solo se usa la primera vez, mientras no exista checkpoint
+    column = SOURCES[entity].date_column
+    with engine.connect() as conn:
+        last_timestamp = conn.execute(text(f"SELECT MAX({column}) FROM {entity}")).scalar()
+
+    if last_timestamp is None:
+        return (datetime.now(timezone.utc) - timedelta(days=90)).timestamp()
+    return utc_midnight(datetime.fromtimestamp(last_timestamp, timezone.utc)).timestamp()
+
+
+class SyncActivities:
+    def __init__(self, resources):
+        self.resources = resources
+
+    # Lo que toca PostgreSQL pasa por estos tres métodos;
+    # scripts/upload_to_postgres/sync_offline.py los reemplaza por versiones
+    # en memoria
+    def checkpoints(self):
+        return CheckpointStore(self.resources.engine)
+
+    def initial_start(self, entity):
+        return initial_start(self.resources.engine, entity)
+
+    def load_tables(self, loads):
+        return load_tables(self.resources.engine, loads)
+
+    def activities(self):
+        return {
+            PLAN: self.plan,
+            FETCH_SHARD: self.fetch_shard,
+            FETCH_DIMENSION: self.fetch_dimension,
+            LOAD: self.load,
+            FAIL: self.fail,
+        }
+
+    def plan(self, settings):
+        # Una ventana por entidad: la interrumpida (sus shards terminados ya
+        # están en el spool) o una nueva hasta hoy a medianoche UTC
+        checkpoints = self.checkpoints()
+        window_end = int(utc_midnight().timestamp())
+
+        windows, shards = {}, []
+        for entity in settings.get("entities", list(SOURCES)):
+            window = checkpoints.next_window(entity, window_end, lambda: self.initial_start(entity))
+            if window is None:
+                continue
+            windows[entity] = {"start": window.window_start, "end": window.window_end}
+            shards += [{"entity": entity, "start": shard.start, "end": shard.end}
+                       for shard in plan_shards(window.window_start, window.window_end)]
+
+        return {
+            "window_end": window_end,
+            "windows": windows,
+            "shards": shards,
+            "dimensions": settings.get("dimensions", list(DIMENSIONS)),
+            "caught_up": all(window["end"] >= window_end for window in windows.values()),
+        }
+
+    def _parse(self, entity, client):
+        # parse(items) -> {parte: filas}, como espera spool_pages
+        if entity == "documentos":
+            parser = DocumentParser(client)
+            return lambda items: dict(zip(SOURCES[entity].parts, parser.parse_all(items)))
+        return lambda items: {"pagos": [payment_record(pay) for pay in items]}
+
+    def fetch_shard(self, task):
+        source = SOURCES[task["entity"]]
+        shard = Shard(task["start"], task["end"])
+        key = shard_spool_key(f"sync-{task['entity']}", {}, shard)
+        spool = self.resources.open_spool(key)
+
+        with self.resources.bsale() as client:
+            spool_pages(client, source.path, shard_params(source.params, source.date_param, shard), spool,
+                        self._parse(task["entity"], client), parallel=False)
+        return {"entity": task["entity"], "spool": key}
+
+    def fetch_dimension(self, task):
+        dimension = DIMENSIONS[task["name"]]
+        key = spool_key(f"sync-dim-{task['name']}", {"day": task["day"]})
+        spool = self.resources.open_spool(key)
+
+        with self.resources.bsale() as client:
+            spool_pages(client, dimension.path, {}, spool,
+                        lambda items: {task["name"]: [dimension.row(item) for item in items]})
+        return {"dimension": task["name"], "spool": key}
+
+    def load(self, payload):
+        plan, results = payload["plan"], payload["results"]
+        open_spool = self.resources.open_spool
+        backup_format = get_backup_format()
+        loads, backups, spools = [], {}, []
+
+        for entity, window in plan["windows"].items():
+            entity_spools = [open_spool(r["spool"]) for r in results if r.get("entity") == entity]
+            spools += entity_spools
+            for part in SOURCES[entity].parts:
+                records = merge_spool_records(entity_spools, part)
+                if records.empty:
+                    continue
+                blob_name = f"{BACKUP_NAMES[part]}_{window['start']}_to_{window['end']}{backup_format.extension}"
+                backups[blob_name] = backup_format.dumps(records, part)
+                loads.append((part, [records], "upsert"))
+
+        for result in results:
+            if "dimension" not in result:
+                continue
+            dimension = DIMENSIONS[result["dimension"]]
+            spool = open_spool(result["spool"])
+            spools.append(spool)
+            records = merge_spool_records([spool], result["dimension"], [dimension.key_column])
+            if records.empty:
+                continue
+            # Las dimensiones quedan en el mismo CSV que lee etl_blob_to_postgres
+            backups[dimension.blob_name] = records.to_csv_bytes()
+            loads.append((dimension.table_name, [records], "replace"))
+
+        for blob_name, data in backups.items():
+            self.resources.upload(blob_name, data)
+            logging.info(f"📄 Guardado en Blob: {blob_name}")
+
+        results_by_table = self.load_tables(loads) if loads else {}
+
+        # Recién con la carga confirmada se avanza el high-water mark
+        checkpoints = self.checkpoints()
+        for entity in plan["windows"]:
+            checkpoints.complete(entity)
+        for spool in spools:
+            spool.clear()
+
+        return {table_name: result.rows for table_name, result in results_by_table.items()}
+
+    def fail(self, payload):
+        # Conserva ventana y spools: la próxima orquestación retoma
+        checkpoints = self.checkpoints()
+        for entity in payload["entities"]:
+            checkpoints.fail(entity, payload["error"])
+
+
+def resources_from_env():
+    # Bsale, PostgreSQL y Blob reales, configurados como las demás funciones.
+    # Todas las actividades del proceso comparten el presupuesto de peticiones.
+    access_token = os.environ["BSALE_ACCESS_TOKEN"]
+    rate_limiter = HostRateLimiter(float(os.getenv("BSALE_RATE_PER_SECOND", DEFAULT_RATE_PER_SECOND)))
+    container_client = get_blob_container()
+
+    def upload(blob_name, data):
+        container_client.get_blob_client(blob_name).upload_blob(data, overwrite=True)
+
+    return SyncResources(
+        bsale=lambda: client_from_env(access_token, rate_limiter=rate_limiter),
+        engine=get_engine(),
+        open_spool=lambda key: BlobSpool(container_client, key),
+        upload=upload,
+    )
+
+
+def local_resources(root, engine, bsale):
+    # Spools y respaldos en disco bajo `root`, para correr run_inline sin
+    # Azure (contra un PostgreSQL local y un cliente Bsale real o de prueba)
+    def upload(blob_name, data):
+        path = os.path.join(root, "backups", blob_name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    return SyncResources(
+        bsale=bsale,
+        engine=engine,
+        open_spool=lambda key: LocalSpool(key, os.path.join(root, "spool")),
+        upload=upload,
+    )
+
+
+_activities = None
+
+
+def sync_activities():
+    # Una instancia por proceso de Functions: el engine y los clientes se
+    # reutilizan entre invocaciones de las actividades
+    global _activities
+    if _activities is None:
+        _activities = SyncActivities(resources_from_env())
+    return _activities
+
+
+def run_activity(name, payload, started):
+    # Punto de entrada de las funciones de actividad; `started` se toma al
+    # entrar a main, antes del import diferido de este módulo
+    activity = sync_activities().activities()[name]
+    log_startup(name, started)
+    return activity(payload)
@@ -0,0 +1,147 @@
+import json
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.dimensions import variant_row
+from shared_code.documents import detail_record, document_record
+from shared_code.json_codec import DECODERS
+from shared_code.payments import payment_record
+
+# === Micro-benchmark: decodificación JSON + extracción de campos ===
+# Compara, sobre páginas sintéticas de la API (50 items, documentos con
+# details y sellers expandidos), el camino actual (json.loads + cadenas de
+# .get()) contra orjson/msgspec + .get() y contra Structs tipados de msgspec
+# (shared_code/bsale_structs.py). Solo corre los decodificadores instalados.
+#
+#   python scripts/benchmarks/json_decoding.py [repeticiones]
+
+REPEAT = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+ITEMS_PER_PAGE = 50
+DETAILS_PER_DOCUMENT = 6
+
+
+def fake_document(i):
+    return {
+        "href": f"https://api.bsale.cl/v1/documents/{i}.json", "id": i, "emissionDate": 1700000000 + i,
+        "expirationDate": 1700000000 + i, "generationDate": 1700000000 + i, "number": 1000 + i,
+        "totalAmount": 19990.0, "netAmount": 16798.0, "taxAmount": 3192.0, "exemptAmount": 0.0,
+        "address": "Av. Siempre Viva 742", "municipality": "Providencia", "city": "Santiago", "state": 0,
+        "urlPdf": f"https://app.bsale.cl/view/{i}.pdf", "token": "abc123" * 4,
+        "client": {"href": f"https://api.bsale.cl/v1/clients/{i % 300}.json", "id": i % 300},
+        "document_type": {"href": "https://api.bsale.cl/v1/document_types/1.json", "id": 1},
+        "office": {"href": "https://api.bsale.cl/v1/offices/1.json", "id": 1},
+        "user": {"href": "https://api.bsale.cl/v1/users/3.json", "id": 3},
+        "sellers": {"href": f"https://api.bsale.cl/v1/documents/{i}/sellers.json", "count": 1,
+                    "items": [{"href": "https://api.bsale.cl/v1/users/7.json", "id": 7, "firstName": "Ana"}]},
+        "details": {
+            "href": f"https://api.bsale.cl/v1/documents/{i}/details.json", "count": DETAILS_PER_DOCUMENT,
+            "items": [{
+                "href": f"https://api.bsale.cl/v1/documents/{i}/details/{n}.json", "id": i * 10 + n,
+                "lineNumber": n + 1, "quantity": 1.0, "netUnitValue": 8399.0, "totalUnitValue": 9995.0,
+                "netAmount": 8399.0, "taxAmount": 1596.0, "totalAmount": 9995.0, "netDiscount": 0.0,
+                "totalDiscount": 0.0, "relatedDetailId": 0,
+                "variant": {"href": f"https://api.bsale.cl/v1/variants/{n}.json", "id": n},
+            } for n in range(DETAILS_PER_DOCUMENT)],
+        },
+    }
+
+
+def fake_payment(i):
+    return {
+        "href": f"https://api.bsale.cl/v1/payments/{i}.json", "id": i, "recordDate": 1700000000 + i,
+        "amount": 19990.0, "operationNumber": "", "isCreditPayment": 0, "createdAt": 1700000000 + i, "state": 0,
+        "payment_type": {"href": "https://api.bsale.cl/v1/payment_types/1.json", "id": 1},
+        "document": {"href": f"https://api.bsale.cl/v1/documents/{i}.json", "id": i},
+        "user": {"href": "https://api.bsale.cl/v1/users/3.json", "id": 3},
+    }
+
+
+def fake_variant(i):
+    return {
+        "href": f"https://api.bsale.cl/v1/variants/{i}.json", "id": i, "description": f"Talla {i % 12}",
+        "unlimitedStock": 0, "allowNegativeStock": 0, "state": 0, "barCode": f"780{i:09d}", "code": f"SKU-{i}",
+        "imagestionCenterCost": 0, "imagestionAccount": 0, "imagestionConceptCod": 0, "imagestionProyectCod": 0,
+        "imagestionCategoryCod": 0, "imagestionProductId": 0, "serialNumber": 0, "prestashopCombinationId": 0,
+        "prestashopValueId": 0,
+        "product": {"href": f"https://api.bsale.cl/v1/products/{i // 4}.json", "id": i // 4},
+        "attribute_values": {"href": f"https://api.bsale.cl/v1/variants/{i}/attribute_values.json"},
+        "costs": {"href": f"https://api.bsale.cl/v1/variants/{i}/costs.json"},
+    }
+
+
+def page(builder):
+    items = [builder(i) for i in range(ITEMS_PER_PAGE)]
+    return json.dumps({"href": "", "count": 10_000, "limit": ITEMS_PER_PAGE, "offset": 0, "items": items}).encode()
+
+
+PAGES = {
+    "documents": page(fake_document),
+    "payments": page(fake_payment),
+    "variants": page(fake_variant),
+}
+
+
+def extract_with_get(kind, data):
+    # Camino actual: dicts + builders con .get()
+    items = data["items"]
+    if kind == "documents":
+        rows = []
+        for doc in items:
+            rows.append(document_record(doc, doc["sellers"]["items"][0].get("id")))
+            rows.extend(detail_record(doc.get("id"), item) for item in doc["details"]["items"])
+        return rows
+    if kind == "payments":
+        return [payment_record(pay) for pay in items]
+    return [variant_row(variant) for variant in items]
+
+
+def extract_typed(kind, raw):
+    from shared_code import bsale_structs
+
+    page_struct = bsale_structs.decode_page(kind, raw)
+    if kind == "documents":
+        rows = []
+        for doc in page_struct.items:
+            rows.append(bsale_structs.document_record(doc, doc.sellers.items[0].id))
+            rows.extend(bsale_structs.detail_record(doc.id, item) for item in doc.details.items)
+        return rows
+    if kind == "payments":
+        return [bsale_structs.payment_record(pay) for pay in page_struct.items]
+    return [bsale_structs.variant_row(variant) for variant in page_struct.items]
+
+
+def candidates():
+    # El primero es el camino actual (json de la stdlib + .get()): es la
+    # referencia x1.0 contra la que se mide cada alternativa
+    for name, factory in sorted(DECODERS.items(), key=lambda decoder: decoder[0] != "json"):
+        try:
+            loads = factory()
+        except ImportError:
+            print(f"⏭️ {name} no está instalado")
+            continue
+        yield f"{name} + .get()", lambda kind, raw, loads=loads: extract_with_get(kind, loads(raw))
+    try:
+        import msgspec  # noqa: F401
+    except ImportError:
+        return
+    yield "msgspec Structs", extract_typed
+
+
+def main():
+    results = list(candidates())
+    print(f"📏 {REPEAT} repeticiones por página de {ITEMS_PER_PAGE} items\n")
+    for kind, raw in PAGES.items():
+        print(f"📄 {kind} ({len(raw) / 1024:,.0f} KiB por página)")
+        baseline = None
+        for label, run in results:
+            seconds = min(timeit.repeat(lambda: run(kind, raw), number=REPEAT, repeat=3)) / REPEAT
+            if baseline is None:
+                baseline = seconds
+            print(f"   {label:<18} {seconds * 1e3:8.3f} ms/página   x{baseline / seconds:4.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
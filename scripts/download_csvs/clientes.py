@@ -1,56 +1,24 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.dimensions import client_row
 
 # === Load API Token ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === API Configuration ===
-BASE_URL = "https://api.bsale.cl/v1/clients.json"
-
-# Parameters for the API request (pagination)
-params = {
-    "limit": 50,  # Limit of clients per request
-    "offset": 0   # Starting point for pagination
-}
-
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === API Client ===
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Download Client Data ===
-client_data = []
 print("🔄 Downloading clients...")
 
-while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-    
-    # Check if the request was successful
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        break
-
-    data = response.json()
-    clients = data.get("items", [])
-    
-    if not clients:
-        break
-
-    for client in clients:
-        # Extract only the necessary client data
-        client_info = {
-            "client_id": client.get("id"),
-            "first_name": client.get("firstName"),
-            "last_name": client.get("lastName"),
-            "email": client.get("email"),
-            "rut": client.get("code"),
-        }
-        client_data.append(client_info)
-
-    # Update the offset for pagination
-    params["offset"] += params["limit"]
+# Same row as the Functions (shared_code.dimensions)
+client_data = [client_row(client) for client in bsale.clients()]
 
 # === Save Data to CSV ===
 if client_data:
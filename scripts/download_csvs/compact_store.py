@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.partitioned_store import PartitionedStore
+
+# === Compact the partitioned store ===
+# Each incremental run adds one Parquet file per touched month. This job
+# merges them into a single deduplicated file per month (run it weekly or
+# whenever the partitions start to pile up files).
+for entity in ["documentos", "document_details"]:
+    store = PartitionedStore(entity)
+    compacted = store.compact()
+
+    if compacted:
+        for month, rows in compacted.items():
+            print(f"🗜️ {entity} month={month}: {rows} rows")
+    else:
+        print(f"✅ {entity}: nothing to compact ({len(store.partitions())} partitions)")
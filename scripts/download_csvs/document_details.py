@@ -1,75 +1,82 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
-import time
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.documents import DetailRecord, detail_record
+from shared_code.fetcher import map_ordered
+from shared_code.partitioned_store import PartitionedStore, detail_months
 
 # === Load the API Token from .env ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === Path to the 'documentos.csv' file ===
-documents_file_path = "C:/Users/celto/OneDrive - Personal/OneDrive/Data/Github/skinautica-bsale-powerbi/data/documentos/documentos.csv"
+# === Partitioned store (the same one update_documents.py maintains) ===
+documents_store = PartitionedStore("documentos")
+details_store = PartitionedStore("document_details")
+
+# Read only the columns needed to fetch the details and partition them
+documents_df = documents_store.read(columns=["document_id", "emission_date", "details_url"])
+
+# Details are appended to the store every BATCH_DOCUMENTS documents, so the
+# backfill never holds the whole history in memory
+BATCH_DOCUMENTS = int(os.getenv("DETAILS_BATCH_DOCUMENTS", "1000"))
 
-# Read the documents data from the CSV file
-documents_df = pd.read_csv(documents_file_path)
+# === API Client ===
+# Concurrency and request rate come from BSALE_MAX_WORKERS / BSALE_RATE_PER_SECOND
+bsale = client_from_env(ACCESS_TOKEN)
 
-# === Extract the details_url and Fetch Details ===
-document_details_data = []
+# Fetch the line items of a single document
+def fetch_details(document):
+    document_id, details_url = document
+    if not isinstance(details_url, str) or not details_url:
+        return []
+    return [detail_record(document_id, item) for item in bsale.document_details(details_url)]
+
+# Each batch goes to the partition of its documents' emission month. A batch
+# holds every line of its documents, and store.read() keeps the last version
+# of each (document_id, line_number), so re-running the backfill after a
+# failure (BsaleAPIError after retries) only refreshes what was already saved
+def save_batch(rows):
+    details_df = pd.DataFrame(rows, columns=DetailRecord._fields)
+    return details_store.append(details_df, detail_months(documents_df, details_df))
+
+# === Fetch Details Concurrently and Append Them to the Store ===
+documents = documents_df[["document_id", "details_url"]].itertuples(index=False, name=None)
 
-# Initialize a counter for tracking processed documents
 processed_documents = 0
+saved_details = 0
+batch = []
+print(f"🔄 Downloading details for {len(documents_df)} documents ({bsale.max_workers} workers)...")
+
+try:
+    # Results arrive in the same order as the documents in the store
+    for details in map_ordered(fetch_details, documents, max_workers=bsale.max_workers):
+        batch.extend(details)
+        processed_documents += 1
 
-for index, row in documents_df.iterrows():
-    # Get the details URL for each document
-    details_url = row['details_url']
-    
-    if details_url:
-        # Send a GET request to the details URL
-        response = requests.get(details_url, headers={"access_token": ACCESS_TOKEN})
-        
-        if response.status_code == 200:
-            details_data = response.json()
-            
-            for item in details_data.get("items", []):
-                # Extract the details for each line item in the document
-                document_detail = {
-                    "document_id": row["document_id"],  # Document ID from the main documents file
-                    "line_number": item.get("lineNumber"),
-                    "quantity": item.get("quantity"),
-                    "net_unit_value": item.get("netUnitValue"),
-                    "total_unit_value": item.get("totalUnitValue"),
-                    "net_amount": item.get("netAmount"),
-                    "tax_amount": item.get("taxAmount"),
-                    "total_amount": item.get("totalAmount"),
-                    "variant_id": item.get("variant", {}).get("id"),
-                    "related_detail_id": item.get("relatedDetailId")
-                }
-                document_details_data.append(document_detail)
-        
-        else:
-            print(f"❌ Error fetching details for document {row['document_id']}: {response.status_code}")
-    
-    # Increment the counter after processing each document
-    processed_documents += 1
+        if processed_documents % BATCH_DOCUMENTS == 0:
+            if batch:
+                save_batch(batch)
+                saved_details += len(batch)
+                batch = []
+            print(f"🔄 Processed {processed_documents} documents...")
 
-    # Print progress for every 100 documents processed
-    if processed_documents % 100 == 0:
-        print(f"🔄 Processed {processed_documents} documents...")
+    if batch:
+        save_batch(batch)
+        saved_details += len(batch)
+except BaseException:
+    print(f"❌ Download failed after {processed_documents} documents; "
+          f"{saved_details} details already saved to '{details_store.path}'")
+    raise
+finally:
+    bsale.close()
 
-    time.sleep(1)  # Add a slight delay between requests to avoid rate limiting
+print(f"📊 Bsale requests: {dict(bsale.stats)}")
 
-# === Save Data to CSV ===
-if document_details_data:
-    output_dir = "C:/Users/celto/OneDrive - Personal/OneDrive/Data/Github/skinautica-bsale-powerbi/data/document_details/"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    details_file_path = os.path.join(output_dir, "document_details.csv")
-    
-    # Save to CSV
-    details_df = pd.DataFrame(document_details_data)
-    details_df.to_csv(details_file_path, index=False)
-    
-    print(f"✅ {len(details_df)} document details saved to '{details_file_path}'")
+if saved_details:
+    print(f"✅ {saved_details} document details saved to '{details_store.path}'")
 else:
     print("⚠️ No document details found.")
@@ -1,52 +1,35 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.dimensions import document_type_row
 
 # === Load the API Token from .env ===
 # This will load your Bsale API token stored in the .env file
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === API Configuration ===
-# Base URL for the Bsale API
-BASE_URL = "https://api.bsale.cl/v1/document_types.json"
-
-# Set the headers with the API token for authentication
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === API Client ===
+# Shared Bsale client, authenticated with the API token
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Function to Download Document Types ===
 def download_document_types():
     print("🔄 Downloading document types...")
 
-    # Make a GET request to the Bsale API to fetch document types
-    response = requests.get(BASE_URL, headers=headers)
-
-    # Check if the request was successful (HTTP status code 200)
-    if response.status_code != 200:
-        print("❌ Error:", response.status_code, response.text)
-        return
-
-    # Parse the JSON response to extract document types
-    document_types = response.json().get("items", [])
+    # Fetch every document type from the Bsale API
+    document_types = list(bsale.document_types())
 
     # Check if we received any document types
     if not document_types:
         print("⚠️ No document types found.")
         return
 
-    # Initialize an empty list to store the document types data
-    document_type_details = []
-
-    # Loop through each document type and extract relevant details
-    for doc_type in document_types:
-        document_type_data = {
-            "document_type_id": doc_type.get("id"),
-            "description": doc_type.get("name"),
-        }
-        document_type_details.append(document_type_data)
+    # Extract the relevant details (same row as the Functions, shared_code.dimensions)
+    document_type_details = [document_type_row(doc_type) for doc_type in document_types]
 
     # === Save the document types data to a CSV file ===
     output_dir = "data/document_types/"
@@ -1,12 +1,18 @@
-import requests
-import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
 import time
 from tkinter import Tk, Label, Button
 from tkinter import messagebox
 from tkcalendar import Calendar
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.documents import document_record
+from shared_code.sellers import DOCUMENTS_EXPAND, SellerResolver
+from shared_code.shards import merge_spools, run_shards, shard_spool_key, shards_for
+from shared_code.spool import LocalSpool
+
 # === Load the API Token ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
@@ -58,88 +64,43 @@ def get_dates():
 # Function to download data based on the date range
 def download_data(start_timestamp, end_timestamp):
     # === API Configuration ===
-    BASE_URL = "https://api.bsale.cl/v1/documents.json"
-    
     # Parameters for the API request
     params = {
         "emissiondaterange": f"[{start_timestamp},{end_timestamp}]",  # Date range in UNIX timestamp format
-        "expand": "details",  # To expand and get the details of each document
-        "limit": 50,  # Limit the number of documents per request (pagination)
-        "offset": 0    # Starting point for pagination
+        "expand": DOCUMENTS_EXPAND  # To expand the details and sellers of each document
     }
     
-    headers = {
-        "access_token": ACCESS_TOKEN
-    }
+    bsale = client_from_env(ACCESS_TOKEN)
+    # Only the document rows are saved here, so no DocumentParser: it would
+    # fetch every truncated details list just to throw the lines away
+    sellers = SellerResolver(bsale)
 
     # === Download Documents ===
-    document_details = []
     print(f"🔄 Downloading documents from {start_timestamp} to {end_timestamp}...")
 
-    while True:
-        response = requests.get(BASE_URL, headers=headers, params=params)
-        
-        # Check if the request was successful
-        if response.status_code != 200:
-            print(f"❌ Error: {response.status_code}, {response.text}")
-            break
-
-        data = response.json()
-        documents = data.get("items", [])
-        
-        if not documents:
-            break
-
-        for document in documents:
-            # Extract basic document information
-            document_data = {
-                "document_id": document.get("id"),
-                "emission_date": document.get("emissionDate"),
-                "total_amount": document.get("totalAmount"),
-                "net_amount": document.get("netAmount"),
-                "tax_amount": document.get("taxAmount"),
-                "address": document.get("address"),
-                "municipality": document.get("municipality"),
-                "city": document.get("city"),
-                "state": document.get("state"),
-                "number": document.get("number"),
-                "client_id": document.get("client", {}).get("id"),
-                "document_type_id": document.get("document_type", {}).get("id"),
-                "user_id": document.get("user", {}).get("id"),
-                "details_url": document.get("details", {}).get("href"),  # Extract href for details
-                "seller_url": document.get("sellers", {}).get("href")  # Extract href for sellers
-            }
-
-            # Now, let's fetch the seller's details using the 'sellers_url' 
-            sellers_url = document_data["seller_url"]
-            if sellers_url:
-                seller_response = requests.get(sellers_url, headers={"access_token": ACCESS_TOKEN})
-
-            if seller_response.status_code == 200:
-                seller_data = seller_response.json()
-                # Extract the seller's ID
-                if seller_data.get("items"):
-                    seller_id = seller_data["items"][0].get("id")
-                    document_data["seller_id"] = seller_id
-                else:
-                    document_data["seller_id"] = None
-            else:
-                document_data["seller_id"] = None
-
-            document_details.append(document_data)
-
-        # Update the offset to fetch the next set of documents
-        params["offset"] += params["limit"]
+    # The range is split into per-day shards (adaptive with BSALE_SHARD_MAX_ITEMS)
+    # that download concurrently. Each shard spools its batches to disk with the
+    # offset reached, so a re-run with the same dates skips finished shards and
+    # resumes the rest. Only the document rows are saved here; line items are
+    # handled by update_documents.py
+    shards = shards_for(bsale, "documents.json", params, "emissiondaterange", start_timestamp, end_timestamp)
+    print(f"🧩 {len(shards)} shards")
+    spools = run_shards(
+        bsale, "documents.json", params, "emissiondaterange", shards,
+        lambda shard: LocalSpool(shard_spool_key("documentos", params, shard)),
+        lambda docs: {"documentos": [document_record(doc, sellers.seller_id(doc)) for doc in docs]},
+        max_workers=bsale.max_workers
+    )
+    df = merge_spools(spools, "documentos")
 
     # === Save Data to CSV ===
-    if document_details:
+    if not df.empty:
         output_dir = "data/documentos/"
         os.makedirs(output_dir, exist_ok=True)
 
         filename = f"documentos_{start_timestamp}_to_{end_timestamp}.csv"
         filepath = os.path.join(output_dir, filename)
 
-        df = pd.DataFrame(document_details)
         df.to_csv(filepath, index=False)
 
         print(f"✅ {len(df)} document records saved to '{filepath}'")
@@ -150,5 +111,9 @@ def download_data(start_timestamp, end_timestamp):
     else:
         print(f"⚠️ No documents found for the given date range.")
 
+    # The output is complete: the spools are no longer needed
+    for spool in spools:
+        spool.clear()
+
 # === Start the process ===
 get_dates()
@@ -1,69 +1,49 @@
-import requests
-import pandas as pd
-from datetime import datetime, timedelta
-import time
+from datetime import date
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.payments import payment_record
+from shared_code.spool import LocalSpool, spool_key, spool_pages
 
 # === Cargar el token de acceso ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === Configuración de la API de pagos ===
-BASE_URL = "https://api.bsale.io/v1/payments.json"
-
-# Parámetros para la consulta (filtrar por rango de fechas)
-params = {
-    "limit": 50,                   # Limitar la cantidad de resultados por solicitud (ajustar según sea necesario)
-    "offset": 0                    # Paginación (ajustar si hay más de 50 resultados)
-}
-
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === Cliente de la API de pagos ===
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Descargar los pagos ===
-payments_data = []
 print(f"🔄 Descargando pagos...")
 
-while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-
-    # Verificación de la respuesta de la API
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        break
 
-    data = response.json()
-    payments = data.get("items", [])
+def payment_rows(payments):
+    return {"pagos": [payment_record(payment) for payment in payments]}
 
-    if not payments:
-        break
 
-    for payment in payments:
-        payment_data = {
-            "payment_id": payment.get("id"),
-            "payment_date": payment.get("recordDate"),
-            "amount": payment.get("amount"),
-            "payment_method": payment.get("payment_type", {}).get("id"),
-            "document_id": payment.get("document", {}).get("id"),
-            "client_id": payment.get("user", {}).get("id"),
-            "state": payment.get("state", {}),
-        }
-        payments_data.append(payment_data)
+# Cada lote de páginas queda en el spool junto con el offset alcanzado: si la
+# descarga se corta, al relanzar el script el mismo día continúa desde el
+# último lote. La clave lleva la fecha de la corrida, así un spool que quedó
+# de otro día (p. ej. terminado pero sin CSV) no se reutiliza como actual.
+params = {"run_date": date.today().isoformat()}
+spool = LocalSpool(spool_key("pagos", params))
+spool_pages(bsale, "payments.json", {}, spool, payment_rows)
+df = spool.read("pagos")
 
-    # Paginación: actualizamos el offset para obtener más resultados si hay más pagos
-    params["offset"] += params["limit"]
+# La descarga quedó completa y los pagos están en memoria: el spool ya no se
+# necesita
+spool.clear()
 
 # === Guardar los pagos en un archivo CSV ===
-if payments_data:
+if not df.empty:
     output_dir = "data/pagos/"
     os.makedirs(output_dir, exist_ok=True)
 
     filename = f"pagos.csv"
     filepath = os.path.join(output_dir, filename)
 
-    df = pd.DataFrame(payments_data)
     df.to_csv(filepath, index=False)
 
     print(f"✅ {len(df)} pagos guardados en '{filepath}'")
@@ -1,65 +1,24 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.dimensions import product_row
 
 # === Load API Token ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === API Configuration ===
-BASE_URL = "https://api.bsale.cl/v1/products.json"
-
-# Parameters for the API request (pagination)
-params = {
-    "limit": 50,  # Limit of products per request
-    "offset": 0   # Starting point for pagination
-}
-
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === API Client ===
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Download Product Data ===
-product_data = []
 print("🔄 Downloading products...")
 
-while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-    
-    # Check if the request was successful
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        break
-
-    data = response.json()
-    products = data.get("items", [])
-    
-    if not products:
-        break
-
-    for product in products:
-        # Extract the necessary product data, handling nested structures
-        product_info = {
-            "product_id": product.get("id"),
-            "name": product.get("name"),
-            "description": product.get("description"),
-            "classification": product.get("classification"),
-            "ledger_account": product.get("ledgerAccount"),
-            "cost_center": product.get("costCenter"),
-            "allow_decimal": product.get("allowDecimal"),
-            "stock_control": product.get("stockControl"),
-            "print_detail_pack": product.get("printDetailPack"),
-            "state": product.get("state"),
-            "prestashop_product_id": product.get("prestashopProductId"),
-            "prestashop_attribute_id": product.get("presashopAttributeId"),
-            # Handle nested "product_type"
-            "product_type_id": product.get("product_type", {}).get("id"),
-        }
-        product_data.append(product_info)
-
-    # Update the offset for pagination
-    params["offset"] += params["limit"]
+# Same row as the Functions (shared_code.dimensions)
+product_data = [product_row(product) for product in bsale.products()]
 
 # === Save Data to CSV ===
 if product_data:
@@ -1,54 +1,24 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.dimensions import user_row
 
 # === Load API Token ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === API Configuration ===
-BASE_URL = "https://api.bsale.cl/v1/users.json"
-
-# Parameters for the API request (pagination)
-params = {
-    "limit": 50,  # Limit of users per request
-    "offset": 0   # Starting point for pagination
-}
-
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === API Client ===
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Download User Data ===
-user_data = []
 print("🔄 Downloading users...")
 
-while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-    
-    # Check if the request was successful
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        break
-
-    data = response.json()
-    users = data.get("items", [])
-    
-    if not users:
-        break
-
-    for user in users:
-        # Extract only the necessary user data
-        user_info = {
-            "user_id": user.get("id"),
-            "first_name": user.get("firstName"),
-            "last_name": user.get("lastName"),
-        }
-        user_data.append(user_info)
-
-    # Update the offset for pagination
-    params["offset"] += params["limit"]
+# Same row as the Functions (shared_code.dimensions)
+user_data = [user_row(user) for user in bsale.users()]
 
 # === Save Data to CSV ===
 if user_data:
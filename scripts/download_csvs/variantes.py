@@ -1,71 +1,24 @@
-import requests
 import pandas as pd
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.dimensions import variant_row
 
 # === Load API Token ===
 load_dotenv(dotenv_path=".env")
 ACCESS_TOKEN = os.getenv("BSALE_ACCESS_TOKEN")
 
-# === API Configuration ===
-BASE_URL = "https://api.bsale.cl/v1/variants.json"
-
-# Parameters for the API request (pagination)
-params = {
-    "limit": 50,  # Limit of variants per request
-    "offset": 0   # Starting point for pagination
-}
-
-headers = {
-    "access_token": ACCESS_TOKEN
-}
+# === API Client ===
+bsale = client_from_env(ACCESS_TOKEN)
 
 # === Download Variant Data ===
-variant_data = []
 print("🔄 Downloading variants...")
 
-while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-    
-    # Check if the request was successful
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
-        break
-
-    data = response.json()
-    variants = data.get("items", [])
-    
-    if not variants:
-        break
-
-    for variant in variants:
-        # Extract the necessary variant data, handling nested structures
-        variant_info = {
-            "variant_id": variant.get("id"),
-            "description": variant.get("description"),
-            "unlimited_stock": variant.get("unlimitedStock"),
-            "allow_negative_stock": variant.get("allowNegativeStock"),
-            "state": variant.get("state"),
-            "bar_code": variant.get("barCode"),
-            "code": variant.get("code"),
-            "imagestion_center_cost": variant.get("imagestionCenterCost"),
-            "imagestion_account": variant.get("imagestionAccount"),
-            "imagestion_concept_cod": variant.get("imagestionConceptCod"),
-            "imagestion_project_cod": variant.get("imagestionProyectCod"),
-            "imagestion_category_cod": variant.get("imagestionCategoryCod"),
-            "imagestion_product_id": variant.get("imagestionProductId"),
-            "serial_number": variant.get("serialNumber"),
-            "prestashop_combination_id": variant.get("prestashopCombinationId"),
-            "prestashop_value_id": variant.get("prestashopValueId"),
-            # Handle nested "product" and extract "id" as product_id
-            "product_id": variant.get("product", {}).get("id"),
-            # Handle nested "costs" and extract "href" for costs
-            "costs_href": variant.get("costs", {}).get("href"),
-        }
-        variant_data.append(variant_info)
-
-    # Update the offset for pagination
-    params["offset"] += params["limit"]
+# Same row as the Functions (shared_code.dimensions)
+variant_data = [variant_row(variant) for variant in bsale.variants()]
 
 # === Save Data to CSV ===
 if variant_data:
@@ -1,115 +1,109 @@
-import requests
-import json
+import logging
 import os
+import sys
 from dotenv import load_dotenv
-from datetime import datetime
-from zoneinfo import ZoneInfo
-import pandas as pd
-from collections import defaultdict
 
-# Cargar credenciales
-load_dotenv(dotenv_path=".env")
-SHOPIFY_STORE = os.getenv("SHOPIFY_STORE")
-ACCESS_TOKEN = os.getenv("SHOPIFY_ACCESS_TOKEN")
-url = f"https://{SHOPIFY_STORE}/admin/api/2024-01/graphql.json"
-
-headers = {
-    "Content-Type": "application/json",
-    "X-Shopify-Access-Token": ACCESS_TOKEN
-}
-
-# Template de consulta paginada con filtro por fecha
-def build_query(cursor=None):
-    cursor_clause = f', after: "{cursor}"' if cursor else ""
-    return f"""
-    {{
-      orders(first: 100{cursor_clause}, query: "created_at:>=2023-01-01") {{
-        pageInfo {{
-          hasNextPage
-          endCursor
-        }}
-        edges {{
-          node {{
-            createdAt
-            cancelReason
-            test
-            currentTotalPriceSet {{
-              shopMoney {{
-                amount
-                currencyCode
-              }}
-            }}
-          }}
-        }}
-      }}
-    }}
-    """
-
-# Inicializar estructuras
-ventas_por_dia = defaultdict(float)
-ordenes_por_dia = defaultdict(int)
-
-# Obtener todas las órdenes con paginación
-has_next_page = True
-cursor = None
-total_ordenes = 0
-
-while has_next_page:
-    query = build_query(cursor)
-    response = requests.post(url, headers=headers, json={"query": query})
-    res_data = response.json()
-
-    if "errors" in res_data:
-        print("❌ Error en consulta GraphQL:")
-        print(json.dumps(res_data, indent=2))
-        break
-
-    orders_data = res_data["data"]["orders"]
-    for order in orders_data["edges"]:
-        nodo = order["node"]
-
-        if nodo["test"] or nodo["cancelReason"] is not None:
-            continue
-
-        monto_venta = float(nodo["currentTotalPriceSet"]["shopMoney"]["amount"])
-        if monto_venta == 0:
-            continue
-
-        created_utc = datetime.fromisoformat(nodo["createdAt"].replace("Z", "")).replace(tzinfo=ZoneInfo("UTC"))
-        created_cl = created_utc.astimezone(ZoneInfo("America/Santiago"))
-        fecha_solo = created_cl.date()
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.shopify_bulk import bulk_orders, read_jsonl
+from shared_code.shopify_client import shopify_client_from_env
+from shared_code.shopify_orders import (DATE_COLUMN, DEFAULT_SHOPIFY_DIR, ORDER_FIELDS, PAGED_LINE_ITEMS, SHOPIFY_DIR,
+                                        OrderStore, daily_totals, order_frames)
 
-        ventas_por_dia[fecha_solo] += monto_venta
-        ordenes_por_dia[fecha_solo] += 1
-        total_ordenes += 1
-
-    # Avanzar a la siguiente página
-    has_next_page = orders_data["pageInfo"]["hasNextPage"]
-    cursor = orders_data["pageInfo"]["endCursor"]
-
-print(f"\n📦 Total de órdenes procesadas: {total_ordenes}")
-
-# Crear DataFrame
-data = [
-    {
-        "Fecha (CL)": fecha,
-        "Total Ventas ($)": round(ventas_por_dia[fecha], 2),
-        "Cantidad de Órdenes": ordenes_por_dia[fecha]
+# Cargar credenciales (SHOPIFY_STORE, SHOPIFY_ACCESS_TOKEN)
+load_dotenv(dotenv_path=".env")
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+# SHOPIFY_MODE=incremental (por defecto) trae solo lo modificado desde el
+# último high-water mark; "full" (o la primera corrida) recarga todo
+# paginando; "bulk" recarga todo con una operación bulk (ver shopify_bulk).
+# Con SHOPIFY_BULK_FILE=<archivo.jsonl> el modo bulk lee ese JSONL en vez
+# de lanzar la operación (sin red, p. ej. scripts/shopify/fixtures/). Una
+# reproducción es una carga completa: exige un SHOPIFY_DIR propio para no
+# pisar el store real y nunca carga PostgreSQL.
+# SHOPIFY_BREAKDOWNS=hora,canal,moneda agrega CSVs por día y hora (CL), por
+# canal (sourceName) y por moneda, calculados en la misma pasada.
+# SHOPIFY_LOAD_POSTGRES=1 además carga órdenes y líneas en PostgreSQL
+# (shopify_orders, shopify_order_lines, shopify_sales_daily); la primera vez
+# conviene hacerlo con una carga completa.
+MODE = os.getenv("SHOPIFY_MODE", "incremental")
+START_DATE = os.getenv("SHOPIFY_START_DATE", "2023-01-01")
+BULK_FILE = os.getenv("SHOPIFY_BULK_FILE")
+LOAD_POSTGRES = os.getenv("SHOPIFY_LOAD_POSTGRES") == "1"
+REPLAY = MODE == "bulk" and bool(BULK_FILE)
+
+if REPLAY:
+    if os.path.abspath(SHOPIFY_DIR) == os.path.abspath(DEFAULT_SHOPIFY_DIR):
+        sys.exit(f"❌ SHOPIFY_BULK_FILE reemplazaría el store real ({DEFAULT_SHOPIFY_DIR}); "
+                 "define SHOPIFY_DIR con otra carpeta, p. ej. data/shopify_replay")
+    if LOAD_POSTGRES:
+        print("⚠️ SHOPIFY_LOAD_POSTGRES se ignora al reproducir un JSONL guardado")
+        LOAD_POSTGRES = False
+
+# Consulta paginada; filtro, cursor y tamaño de página van como variables
+# GraphQL (`first` lo ajusta el cliente según el presupuesto de costo).
+# Ordenada por UPDATED_AT para que el high-water mark avance en orden.
+# Las líneas solo se piden si van a PostgreSQL (suben el costo por orden).
+ORDERS_QUERY = """
+query Orders($first: Int!, $after: String, $search: String!) {
+  orders(first: $first, after: $after, query: $search, sortKey: UPDATED_AT) {
+    pageInfo {
+      hasNextPage
+      endCursor
     }
-    for fecha in sorted(ventas_por_dia)
-]
-
-df = pd.DataFrame(data)
-
-print("\n📊 Ventas reales por día (desde 2023-01-01):")
-print(df)
-
-# Crear carpeta data/shopify_sales si no existe
-output_dir = os.path.join("data", "shopify_sales")
-os.makedirs(output_dir, exist_ok=True)
-
-# Guardar CSV
-csv_path = os.path.join(output_dir, "ventas_shopify.csv")
-df.to_csv(csv_path, index=False, encoding="utf-8-sig")
-
-print(f"\n✅ CSV guardado en: {csv_path}")
+    edges {
+      node {%s      }
+    }
+  }
+}
+""" % (ORDER_FIELDS + (PAGED_LINE_ITEMS if LOAD_POSTGRES else ""))
+
+shopify = shopify_client_from_env()
+
+store = OrderStore()
+since = store.since() if MODE == "incremental" else None
+
+search = f"created_at:>={START_DATE}"
+if since:
+    search += f" AND updated_at:>='{since}'"
+    print(f"🔄 Órdenes modificadas desde {since}...")
+else:
+    print(f"🔄 Carga completa de órdenes desde {START_DATE}...")
+
+high_water_mark = None
+if REPLAY:
+    print(f"📂 Leyendo exportación bulk guardada: {BULK_FILE}")
+    orders, lines = order_frames(read_jsonl(BULK_FILE))
+elif MODE == "bulk":
+    operation, stream = bulk_orders(shopify.execute, search, line_items=LOAD_POSTGRES)
+    orders, lines = order_frames(stream)
+    high_water_mark = operation["createdAt"]
+else:
+    orders, lines = order_frames(shopify.paginate(ORDERS_QUERY, "orders", {"search": search}))
+print(f"\n📦 Órdenes recibidas: {len(orders)} ({len(lines)} líneas)")
+
+if since is None:
+    # Carga completa: se reemplazan las órdenes y el agregado entero
+    store.clear()
+    touched = store.merge(orders)
+    store.write_daily(orders)
+else:
+    touched = store.merge(orders)
+    store.update_daily(touched)
+
+if LOAD_POSTGRES:
+    from sqlalchemy import create_engine
+    from shared_code.resources import postgres_url
+    from shared_code.shopify_pg import load_orders
+
+    load_orders(create_engine(postgres_url()), orders, lines, replace=since is None)
+
+# Recién con todo escrito (y cargado) se avanza el high-water mark
+if not orders.empty:
+    store.save_high_water_mark(high_water_mark or orders["updated_at"].max())
+
+recalculados = daily_totals(touched)
+print(f"\n📊 Días recalculados: {touched['fecha_cl'].nunique()}")
+print(recalculados.set_index(DATE_COLUMN).to_string() if not recalculados.empty else "   (sin ventas)")
+
+print(f"\n📡 Shopify: {dict(shopify.stats)}")
+print(f"\n✅ CSV guardado en: {store.daily_path}")
@@ -0,0 +1,51 @@
+from sqlalchemy import create_engine
+from dotenv import load_dotenv
+import json
+import logging
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.orchestration import daily_sync, run_inline
+from shared_code.resources import postgres_url
+from shared_code.sync_activities import SyncActivities, local_resources, resources_from_env
+
+# === Sincronización diaria en proceso ===
+# Corre el mismo orquestador que DailySyncOrchestrator sin el runtime de
+# Durable: las actividades se ejecutan en hilos de este proceso. Por defecto
+# los spools y respaldos quedan en disco (LOCAL_SYNC_DIR) y solo se usan
+# Bsale y PostgreSQL; con SYNC_USE_AZURE=1 se usan los mismos recursos que
+# en Azure (spools y respaldos en Blob).
+# Con SYNC_OFFLINE=1 no se usa ni Bsale ni PostgreSQL: un cliente falso con
+# datos en memoria y tablas/checkpoints en memoria (sync_offline.py, junto a este script),
+# y al final se comparan las tablas cargadas con el dataset.
+# SYNC_OFFLINE_FAILURES='{"payments.json": 1}' hace fallar la primera
+# corrida para probar que la segunda retoma la ventana.
+
+load_dotenv(dotenv_path=".env")
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+if os.getenv("SYNC_OFFLINE") == "1":
+    from sync_offline import offline_sync
+
+    activities, context, problems = offline_sync(failures=json.loads(os.getenv("SYNC_OFFLINE_FAILURES", "{}")))
+    print(f"🎉 Sincronización sin red: { {name: len(rows) for name, rows in activities.tables.items()} }")
+    print(f"📈 Último estado: {context.custom_status}")
+    for problem in problems:
+        print(f"❌ {problem}")
+    sys.exit(1 if problems else 0)
+
+if os.getenv("SYNC_USE_AZURE") == "1":
+    resources = resources_from_env()
+else:
+    engine = create_engine(postgres_url())
+    resources = local_resources(os.getenv("LOCAL_SYNC_DIR", "data/daily_sync"), engine,
+                                lambda: client_from_env(os.getenv("BSALE_ACCESS_TOKEN")))
+
+# Entrada opcional del orquestador, p. ej. '{"entities": ["pagos"], "dimensions": []}'
+settings = json.loads(os.getenv("SYNC_INPUT", "{}"))
+
+loaded, context = run_inline(daily_sync, settings, SyncActivities(resources).activities())
+print(f"🎉 Sincronización completa: {loaded}")
+print(f"📈 Último estado: {context.custom_status}")
@@ -1,15 +1,21 @@
 import os
-import pandas as pd
+import sys
 from dotenv import load_dotenv
+from azure.core import MatchConditions
 from azure.storage.blob import BlobServiceClient
 from sqlalchemy import create_engine
-import io
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.blob_manifest import BlobManifest, pending_blobs
+from shared_code.blob_stream import BLOB_CLIENT_OPTIONS, read_blob_chunks
+from shared_code.pg_copy import copy_frames, upsert_frames
+from shared_code.serialization import SCHEMAS
 
 # Cargar variables de entorno
 load_dotenv()
 
 # Conexión Azure Blob
-blob_service = BlobServiceClient.from_connection_string(os.getenv("AZURE_BLOB_CONN_STR"))
+blob_service = BlobServiceClient.from_connection_string(os.getenv("AZURE_BLOB_CONN_STR"), **BLOB_CLIENT_OPTIONS)
 container_client = blob_service.get_container_client(os.getenv("BLOB_CONTAINER_NAME"))
 
 # Conexión PostgreSQL
@@ -17,32 +23,45 @@ engine = create_engine(
     f"postgresql+psycopg2://{os.getenv('POSTGRES_USER')}:{os.getenv('POSTGRES_PASSWORD')}@{os.getenv('POSTGRES_HOST')}:{os.getenv('POSTGRES_PORT')}/{os.getenv('POSTGRES_DB')}?sslmode=require"
 )
 
-# Lista de archivos que queremos cargar
-archivos_a_cargar = {
-    "clients/clients_data.csv",
-    "document_details/document_details.csv",
-    "document_types/document_types.csv",
-    "documentos/documentos.csv",
-    "pagos/pagos.csv",
-    "product_types/product_types_data.csv",
-    "products/products_data.csv",
-    "tipos_de_pago/tipos_de_pago.csv",
-    "users/users_data.csv",
-    "variants/variants_data.csv"
+# Blobs a cargar: snapshot completo -> reemplaza la tabla; prefijo -> upsert
+# del snapshot y de los incrementales que escriben las Functions
+FUENTES = {
+    "clients/clients_data.csv": ("clients_data", "replace"),
+    "document_details/": ("document_details", "upsert"),
+    "document_types/document_types.csv": ("document_types", "replace"),
+    "documentos/": ("documentos", "upsert"),
+    "pagos/": ("pagos", "upsert"),
+    "product_types/product_types_data.csv": ("product_types_data", "replace"),
+    "products/products_data.csv": ("products_data", "replace"),
+    "tipos_de_pago/tipos_de_pago.csv": ("tipos_de_pago", "replace"),
+    "users/users_data.csv": ("users_data", "replace"),
+    "variants/variants_data.csv": ("variants_data", "replace")
 }
 
-# Procesar solo los archivos seleccionados
-for blob in container_client.list_blobs():
-    if blob.name in archivos_a_cargar:
-        print(f"📥 Descargando: {blob.name}")
-        blob_client = container_client.get_blob_client(blob.name)
-        content = blob_client.download_blob().readall()
-        df = pd.read_csv(io.BytesIO(content))
-
-        table_name = os.path.splitext(os.path.basename(blob.name))[0].lower().replace("-", "_").replace(" ", "_")
-        print(f"🛠️ Cargando en PostgreSQL: {table_name}")
-        
-        df.to_sql(table_name, engine, if_exists="replace", index=False)
-        print(f"✅ Tabla {table_name} cargada con éxito.\n")
-
-print("🎉 Proceso completo.")
+manifest = BlobManifest(engine)
+pendientes, sin_cambios = pending_blobs(container_client, FUENTES, manifest)
+
+for table_name in sorted(sin_cambios):
+    print(f"⏭️ Sin cambios: {table_name}")
+
+# Procesar solo los blobs nuevos o modificados
+for blob, table_name, mode in pendientes:
+    print(f"📥 Descargando: {blob.name}")
+    blob_client = container_client.get_blob_client(blob.name)
+    # Se descarga por rangos exactamente la versión listada (la que queda en
+    # el manifest) y cada bloque de filas (CSV o Parquet) va directo al COPY.
+    # Lector y carga usan el esquema declarado de la tabla: todos los bloques
+    # llegan con los mismos tipos, sin inferirlos bloque a bloque.
+    schema = SCHEMAS[table_name]
+    frames = read_blob_chunks(blob_client, blob.name, schema=schema, etag=blob.etag,
+                              match_condition=MatchConditions.IfNotModified)
+
+    print(f"🛠️ Cargando en PostgreSQL: {table_name} ({mode})")
+    if mode == "replace":
+        result = copy_frames(engine, frames, table_name, if_exists="replace", schema=schema)
+    else:
+        result = upsert_frames(engine, frames, table_name, schema=schema)
+    manifest.record(blob, table_name, result.rows)
+    print(f"✅ Tabla {table_name} cargada con éxito ({result.rows} filas, {result.rows_per_second:,.0f} filas/s).\n")
+
+print(f"🎉 Proceso completo: {len(pendientes)} blobs cargados, {len(sin_cambios)} tablas sin cambios.")
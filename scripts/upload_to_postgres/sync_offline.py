@@ -0,0 +1,285 @@
+import json
+import os
+import random
+import sys
+import tempfile
+from collections import namedtuple
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import BSALE_BASE_URL, BsaleAPIError, BsaleClient
+from shared_code.checkpoints import COMPLETED, FAILED, RUNNING, Checkpoint, CheckpointStore, utc_midnight
+from shared_code.dimensions import DIMENSIONS
+from shared_code.orchestration import daily_sync, run_inline
+from shared_code.pg_copy import CopyResult, NATURAL_KEYS
+from shared_code.records import Records
+from shared_code.shards import DAY
+from shared_code.spool import LocalSpool
+from shared_code.sync_activities import SyncActivities, SyncResources
+
+# === Sincronización diaria sin red ni PostgreSQL ===
+# Arnés para probar la sincronización completa (orquestador, shards,
+# spools, parser, carga y checkpoints) sin Bsale ni base de datos:
+#
+#   FakeBsaleClient        BsaleClient real (paginación, reintentos, JSON)
+#                          que responde desde un dataset en memoria
+#   MemoryCheckpointStore  CheckpointStore con la misma lógica de ventanas,
+#                          guardado en un dict
+#   OfflineSyncActivities  SyncActivities con checkpoints y tablas en memoria
+#
+# run_offline() corre daily_sync con run_inline y check_offline() compara
+# las tablas cargadas con el dataset. `failures` hace fallar las primeras N
+# peticiones a una ruta (p. ej. {"payments.json": 99}) para probar que
+# FailSync conserva la ventana y la corrida siguiente la retoma.
+# Vive fuera de shared_code para no publicarse con las Functions; se usa desde
+# daily_sync_local.py (SYNC_OFFLINE=1).
+
+OFFLINE_TOKEN = "offline"
+
+# details: {document_id: líneas completas}, también de los documentos que
+# llegan con el detalle truncado
+Dataset = namedtuple("Dataset", ["documents", "payments", "details", "dimensions"])
+
+
+def _document(rng, document_id, emission_date):
+    lines = [{
+        "lineNumber": line,
+        "quantity": rng.choice([1, 1, 2, 0.5]),
+        "netUnitValue": 8403.0,
+        "totalUnitValue": 10000.0,
+        "netAmount": 8403.0,
+        "taxAmount": 1597.0,
+        "totalAmount": 10000.0,
+        "variant": {"id": rng.randrange(1, 50)},
+        "relatedDetailId": None,
+    } for line in range(1, rng.randrange(2, 5))]
+    details_href = f"{BSALE_BASE_URL}/documents/{document_id}/details.json"
+    sellers_href = f"{BSALE_BASE_URL}/documents/{document_id}/sellers.json"
+    document = {
+        "id": document_id,
+        "emissionDate": emission_date,
+        "totalAmount": 10000.0 * len(lines),
+        "netAmount": 8403.0 * len(lines),
+        "taxAmount": 1597.0 * len(lines),
+        "address": None,
+        "municipality": "Santiago",
+        "city": "Santiago",
+        "state": 0,
+        "number": 1000 + document_id,
+        "client": {"id": rng.randrange(1, 20)} if rng.random() < 0.7 else {},
+        "document_type": {"id": 1},
+        "user": {"id": 1},
+        "details": {"href": details_href, "count": len(lines), "items": lines},
+        "sellers": {"href": sellers_href, "items": [{"id": 2}]},
+    }
+    # Algunos documentos llegan con el detalle truncado o sin el vendedor
+    # expandido: el parser tiene que pedirlos a su href
+    if document_id % 10 == 0:
+        document["details"]["items"] = lines[:1]
+    if document_id % 7 == 0:
+        del document["sellers"]["items"]
+    return document, lines
+
+
+def offline_dataset(window_end, days=3, documents_per_day=120, payments_per_day=60, seed=0):
+    # Documentos y pagos repartidos en los `days` días anteriores a
+    # `window_end`, más unas pocas filas por dimensión
+    rng = random.Random(seed)
+    documents, payments, details = [], [], {}
+    for day in range(days):
+        day_start = window_end - (days - day) * DAY
+        for _ in range(documents_per_day):
+            document, lines = _document(rng, len(documents) + 1, day_start + rng.randrange(DAY))
+            documents.append(document)
+            details[document["id"]] = lines
+        for _ in range(payments_per_day):
+            payment_id = len(payments) + 1
+            payments.append({
+                "id": payment_id,
+                "recordDate": day_start + rng.randrange(DAY),
+                "amount": 10000.0,
+                "payment_type": {"id": rng.randrange(1, 5)},
+                "document": {"id": rng.randrange(1, len(documents) + 1)},
+                "user": {"id": 1},
+                "state": 0,
+            })
+
+    dimensions = {dimension.path: [{"id": i, "name": f"{name} {i}", "product": {"id": i}, "product_type": {"id": 1}}
+                                   for i in range(1, 6)]
+                  for name, dimension in DIMENSIONS.items()}
+    return Dataset(documents, payments, details, dimensions)
+
+
+class FakeResponse(namedtuple("FakeResponse", ["status_code", "content", "headers"])):
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+
+def _in_range(value, date_range):
+    start, end = (int(part) for part in date_range.strip("[]").split(","))
+    return start <= value <= end
+
+
+class FakeBsaleClient(BsaleClient):
+    # Solo se reemplaza get(): todo lo demás (get_json, reintentos, páginas,
+    # lotes, paralelismo) es el código real del cliente
+    def __init__(self, dataset, failures=None, **kwargs):
+        # `failures` ({ruta: peticiones que fallan}) se comparte entre los
+        # clientes de una corrida: cada falla se consume una sola vez
+        kwargs.setdefault("max_retries", 0)
+        super().__init__(OFFLINE_TOKEN, **kwargs)
+        self.dataset = dataset
+        self.failures = failures if failures is not None else {}
+
+    def _items(self, path, params):
+        if path == "documents.json":
+            return [document for document in self.dataset.documents
+                    if _in_range(document["emissionDate"], params["emissiondaterange"])]
+        if path == "payments.json":
+            return [payment for payment in self.dataset.payments
+                    if _in_range(payment["recordDate"], params["recorddaterange"])]
+        if path.startswith("documents/"):
+            _, document_id, endpoint = path.split("/")
+            return self.dataset.details[int(document_id)] if endpoint == "details.json" else [{"id": 2}]
+        return self.dataset.dimensions[path]
+
+    def get(self, path_or_url, params=None):
+        self._count("requests")
+        path = self._url(path_or_url)[len(BSALE_BASE_URL) + 1:]
+        if self.failures.get(path):
+            self.failures[path] -= 1
+            return FakeResponse(400, b'{"error": "falla simulada"}', {})
+
+        params = params or {}
+        items = self._items(path, params)
+        offset, limit = int(params.get("offset", 0)), int(params.get("limit", 50))
+        page = {"count": len(items), "limit": limit, "offset": offset, "items": items[offset:offset + limit]}
+        return FakeResponse(200, json.dumps(page).encode("utf-8"), {})
+
+
+class MemoryCheckpointStore(CheckpointStore):
+    # next_window() es el de CheckpointStore; solo cambia dónde se guarda
+    def __init__(self):
+        self.rows = {}
+
+    def get(self, entity):
+        return self.rows.get(entity)
+
+    def start(self, entity, window_start, window_end):
+        previous = self.rows.get(entity)
+        high_water_mark = previous.high_water_mark if previous else None
+        self.rows[entity] = Checkpoint(entity, high_water_mark, window_start, window_end, 0, RUNNING)
+        return self.rows[entity]
+
+    def advance(self, entity, offset):
+        self.rows[entity] = self.rows[entity]._replace(last_offset=offset, status=RUNNING)
+
+    def complete(self, entity):
+        checkpoint = self.rows[entity]
+        self.rows[entity] = checkpoint._replace(high_water_mark=checkpoint.window_end, last_offset=0,
+                                                status=COMPLETED)
+
+    def fail(self, entity, error):
+        self.rows[entity] = self.rows[entity]._replace(status=FAILED)
+
+
+class OfflineSyncActivities(SyncActivities):
+    # Tablas en memoria con la misma semántica que load_tables: upsert por
+    # clave natural para los hechos, reemplazo completo para dimensiones
+    def __init__(self, resources, backups, first_window_days=3):
+        super().__init__(resources)
+        self.backups = backups
+        self.first_window_days = first_window_days
+        self.store = MemoryCheckpointStore()
+        self.tables = {}
+
+    def checkpoints(self):
+        return self.store
+
+    def initial_start(self, entity):
+        return utc_midnight().timestamp() - self.first_window_days * DAY
+
+    def load_tables(self, loads):
+        results = {}
+        for table_name, frames, mode in loads:
+            merged = Records(())
+            for records in frames:
+                merged.extend(records)
+            if mode == "upsert":
+                merged = self.tables.get(table_name, Records(merged.columns)).extend(merged)
+                merged.dedupe(NATURAL_KEYS[table_name])
+            self.tables[table_name] = merged
+            results[table_name] = CopyResult(len(merged), 0.0)
+        return results
+
+
+def offline_activities(root, dataset, failures=None, first_window_days=3):
+    # Spools en disco bajo `root` (como local_resources); respaldos, tablas y
+    # checkpoints en memoria
+    failures = dict(failures or {})
+    backups = {}
+    resources = SyncResources(
+        bsale=lambda: FakeBsaleClient(dataset, failures),
+        engine=None,
+        open_spool=lambda key: LocalSpool(key, os.path.join(root, "spool")),
+        upload=backups.__setitem__,
+    )
+    return OfflineSyncActivities(resources, backups, first_window_days)
+
+
+def run_offline(activities, settings=None, max_workers=4):
+    # Devuelve (filas cargadas por tabla, contexto) o lanza el error de la
+    # actividad que falló, igual que en Durable
+    return run_inline(daily_sync, settings or {}, activities.activities(), max_workers)
+
+
+def check_offline(activities, dataset, root):
+    # Lista de diferencias entre lo cargado y el dataset (vacía si todo cuadra)
+    problems = []
+    tables = activities.tables
+
+    def ids(table_name, column):
+        return set(tables[table_name].column(column)) if table_name in tables else set()
+
+    expected_documents = {document["id"] for document in dataset.documents}
+    if ids("documentos", "document_id") != expected_documents:
+        problems.append(f"documentos: {len(ids('documentos', 'document_id'))} de {len(expected_documents)}")
+
+    expected_details = sum(len(lines) for lines in dataset.details.values())
+    if len(tables.get("document_details", ())) != expected_details:
+        problems.append(f"document_details: {len(tables.get('document_details', ()))} de {expected_details}")
+
+    if ids("pagos", "payment_id") != {payment["id"] for payment in dataset.payments}:
+        problems.append(f"pagos: {len(ids('pagos', 'payment_id'))} de {len(dataset.payments)}")
+
+    for dimension in DIMENSIONS.values():
+        if len(tables.get(dimension.table_name, ())) != len(dataset.dimensions[dimension.path]):
+            problems.append(f"{dimension.table_name}: {len(tables.get(dimension.table_name, ()))} filas")
+
+    for entity, checkpoint in activities.store.rows.items():
+        if checkpoint.status != COMPLETED:
+            problems.append(f"checkpoint {entity}: {checkpoint.status}")
+
+    spool_root = os.path.join(root, "spool")
+    leftover = os.listdir(spool_root) if os.path.isdir(spool_root) else []
+    if leftover:
+        problems.append(f"spools sin limpiar: {leftover}")
+    return problems
+
+
+def offline_sync(days=3, failures=None, root=None):
+    # Corrida completa de punta a punta: si hay `failures`, la primera
+    # orquestación falla y la segunda retoma la ventana. Devuelve
+    # (activities, contexto de la última corrida, problemas).
+    root = root or tempfile.mkdtemp(prefix="daily-sync-offline-")
+    dataset = offline_dataset(int(utc_midnight().timestamp()), days=days)
+    activities = offline_activities(root, dataset, failures, first_window_days=days)
+
+    try:
+        _, context = run_offline(activities)
+    except BsaleAPIError:
+        failed = {entity: checkpoint.status for entity, checkpoint in activities.store.rows.items()}
+        if FAILED not in failed.values():
+            raise
+        _, context = run_offline(activities)
+    return activities, context, check_offline(activities, dataset, root)
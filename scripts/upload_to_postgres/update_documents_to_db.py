@@ -1,11 +1,21 @@
 from dotenv import load_dotenv
 import os
-import requests
+import sys
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import create_engine, text
 from azure.storage.blob import BlobServiceClient
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.checkpoints import CheckpointStore, utc_midnight
+from shared_code.documents import DocumentParser
+from shared_code.pg_copy import upsert_dataframe
+from shared_code.sellers import DOCUMENTS_EXPAND
+from shared_code.serialization import blob_format
+from shared_code.shards import merge_spools, run_shards, shard_spool_key, shards_for
+from shared_code.spool import LocalSpool
+
 # === Cargar variables de entorno desde .env ===
 load_dotenv(dotenv_path=".env")
 
@@ -25,129 +35,93 @@ pg_engine = create_engine(
 blob_service = BlobServiceClient.from_connection_string(AZURE_BLOB_CONN_STR)
 container_client = blob_service.get_container_client(BLOB_CONTAINER)
 
-# === Obtener última fecha desde la tabla documentos ===
-print("🔍 Obteniendo última fecha de documentos...")
-with pg_engine.connect() as conn:
-    result = conn.execute(text("SELECT MAX(emission_date) FROM documentos"))
-    last_saved_datetime = result.scalar()
+checkpoints = CheckpointStore(pg_engine)
+backup_format = blob_format()
+
+
+# === Punto de partida la primera vez (sin checkpoint) ===
+def initial_start():
+    print("🔍 Obteniendo última fecha de documentos...")
+    with pg_engine.connect() as conn:
+        last_saved_timestamp = conn.execute(text("SELECT MAX(emission_date) FROM documentos")).scalar()
+
+    if last_saved_timestamp is None:
+        return (datetime.now(timezone.utc) - timedelta(days=90)).timestamp()
+    return pd.to_datetime(last_saved_timestamp, unit="s").normalize().timestamp()
 
-if last_saved_datetime is None:
-    last_saved_datetime = datetime.now(timezone.utc) - timedelta(days=90)
-else:
-    last_saved_datetime = pd.to_datetime(last_saved_datetime, unit="s").normalize() + timedelta(days=1)
 
 # Usamos UTC para evitar problemas de zona horaria
-yesterday = datetime.datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-start_ts = int(last_saved_datetime.timestamp())
-end_ts = int(yesterday.timestamp())
-
-print(f"🗕️ Descargando documentos desde {start_ts} hasta {end_ts}...")
-
-# === Configuración de API Bsale ===
-BASE_URL = "https://api.bsale.cl/v1/documents.json"
-params = {
-    "emissiondaterange": f"[{start_ts},{end_ts}]",
-    "expand": "details",
-    "limit": 50,
-    "offset": 0
-}
-headers = { "access_token": BSALE_ACCESS_TOKEN }
-
-documentos = []
+end_ts = int(utc_midnight().timestamp())
+bsale = client_from_env(BSALE_ACCESS_TOKEN)
+parser = DocumentParser(bsale)
+
+
+def parse_batch(documents):
+    # Documentos y detalles salen del mismo payload expandido
+    documentos, detalles = parser.parse_all(documents)
+    return {"documentos": documentos, "document_details": detalles}
+
+
+# Primero la ventana interrumpida (si la hay), luego la nueva hasta hoy
 while True:
-    res = requests.get(BASE_URL, headers=headers, params=params)
-    if res.status_code != 200:
-        print(f"❌ Error en API: {res.status_code} - {res.text}")
+    window = checkpoints.next_window("documentos", end_ts, initial_start)
+    if window is None:
+        print("⚠️ No hay nuevos documentos para descargar.")
         break
 
-    items = res.json().get("items", [])
-    if not items:
+    print(f"🗕️ Descargando documentos desde {window.window_start} hasta {window.window_end}...")
+
+    # === Configuración de API Bsale ===
+    params = {
+        "emissiondaterange": f"[{window.window_start},{window.window_end}]",
+        "expand": DOCUMENTS_EXPAND
+    }
+    suffix = f"{window.window_start}_to_{window.window_end}"
+
+    try:
+        # La ventana se divide en shards por día que se descargan en paralelo.
+        # Cada shard guarda sus lotes en un spool local con el offset
+        # alcanzado: si el script se corta, los shards terminados no se repiten.
+        shards = shards_for(bsale, "documents.json", params, "emissiondaterange", window.window_start, window.window_end)
+        spools = run_shards(
+            bsale, "documents.json", params, "emissiondaterange", shards,
+            lambda shard: LocalSpool(shard_spool_key("update_documents_to_db", params, shard)),
+            parse_batch,
+            max_workers=bsale.max_workers
+        )
+        df_docs = merge_spools(spools, "documentos")
+        df_detalles = merge_spools(spools, "document_details")
+        print(f"🧩 {len(shards)} shards: {len(df_docs)} documentos, {len(df_detalles)} detalles")
+
+        # === Guardar documentos en Blob y PostgreSQL ===
+        if not df_docs.empty:
+            doc_blob_name = f"documentos/documentos_{suffix}{backup_format.extension}"
+            container_client.get_blob_client(doc_blob_name).upload_blob(backup_format.dumps(df_docs, "documentos"), overwrite=True)
+            print(f"📄 Documentos guardados en Blob: {doc_blob_name}")
+
+            result = upsert_dataframe(pg_engine, df_docs, "documentos")
+            print(f"✅ Documentos cargados (upsert) en PostgreSQL: {result.rows} ({result.rows_per_second:,.0f} filas/s)")
+
+        # === Guardar detalles en Blob y PostgreSQL ===
+        if not df_detalles.empty:
+            details_blob_name = f"document_details/document_details_{suffix}{backup_format.extension}"
+            container_client.get_blob_client(details_blob_name).upload_blob(backup_format.dumps(df_detalles, "document_details"), overwrite=True)
+            print(f"📄 Detalles guardados en Blob: {details_blob_name}")
+
+            result = upsert_dataframe(pg_engine, df_detalles, "document_details")
+            print(f"✅ Detalles cargados (upsert) en PostgreSQL: {result.rows} ({result.rows_per_second:,.0f} filas/s)")
+    except Exception as exc:
+        # El checkpoint marca la ventana como fallida; los spools conservan
+        # lo descargado por cada shard
+        checkpoints.fail("documentos", exc)
+        raise
+
+    for spool in spools:
+        spool.clear()
+    checkpoints.complete("documentos")
+    if window.window_end >= end_ts:
         break
 
-    for doc in items:
-        doc_data = {
-            "document_id": doc.get("id"),
-            "emission_date": doc.get("emissionDate"),
-            "total_amount": doc.get("totalAmount"),
-            "net_amount": doc.get("netAmount"),
-            "tax_amount": doc.get("taxAmount"),
-            "address": doc.get("address"),
-            "municipality": doc.get("municipality"),
-            "city": doc.get("city"),
-            "state": doc.get("state"),
-            "number": doc.get("number"),
-            "client_id": doc.get("client", {}).get("id"),
-            "document_type_id": doc.get("document_type", {}).get("id"),
-            "user_id": doc.get("user", {}).get("id"),
-            "details_url": doc.get("details", {}).get("href"),
-            "seller_url": doc.get("sellers", {}).get("href")
-        }
-
-        if doc_data["seller_url"]:
-            sres = requests.get(doc_data["seller_url"], headers=headers)
-            if sres.status_code == 200:
-                sitems = sres.json().get("items", [])
-                doc_data["seller_id"] = sitems[0]["id"] if sitems else None
-            else:
-                doc_data["seller_id"] = None
-
-        documentos.append(doc_data)
-
-    params["offset"] += params["limit"]
-
-if not documentos:
-    print("⚠️ No se encontraron nuevos documentos.")
-    exit()
-
-df_docs = pd.DataFrame(documentos)
-
-# === Guardar documentos en Blob ===
-doc_blob_name = f"documentos/documentos_{start_ts}_to_{end_ts}.csv"
-blob_client = container_client.get_blob_client(doc_blob_name)
-blob_client.upload_blob(df_docs.to_csv(index=False), overwrite=True)
-print(f"📄 Documentos guardados en Blob: {doc_blob_name}")
-
-# === Insertar documentos en PostgreSQL ===
-df_docs["emission_date"] = df_docs["emission_date"].astype("int64")
-df_docs.to_sql("documentos", pg_engine, if_exists="append", index=False)
-print(f"✅ Documentos insertados en PostgreSQL: {len(df_docs)}")
-
-# === Descargar detalles de cada documento ===
-print("🔍 Descargando detalles de documentos...")
-detalles = []
-
-for row in df_docs.itertuples():
-    if row.details_url:
-        dres = requests.get(row.details_url, headers=headers)
-        if dres.status_code == 200:
-            for item in dres.json().get("items", []):
-                detalles.append({
-                    "document_id": row.document_id,
-                    "line_number": item.get("lineNumber"),
-                    "quantity": item.get("quantity"),
-                    "net_unit_value": item.get("netUnitValue"),
-                    "total_unit_value": item.get("totalUnitValue"),
-                    "net_amount": item.get("netAmount"),
-                    "tax_amount": item.get("taxAmount"),
-                    "total_amount": item.get("totalAmount"),
-                    "variant_id": item.get("variant", {}).get("id"),
-                    "related_detail_id": item.get("relatedDetailId")
-                })
-
-if not detalles:
-    print("⚠️ No se encontraron detalles.")
-    exit()
-
-df_detalles = pd.DataFrame(detalles)
-
-# === Guardar detalles en Blob ===
-details_blob_name = f"document_details/document_details_{start_ts}_to_{end_ts}.csv"
-container_client.get_blob_client(details_blob_name).upload_blob(df_detalles.to_csv(index=False), overwrite=True)
-print(f"📄 Detalles guardados en Blob: {details_blob_name}")
-
-# === Insertar detalles en PostgreSQL ===
-df_detalles.to_sql("document_details", pg_engine, if_exists="append", index=False)
-print(f"✅ Detalles insertados en PostgreSQL: {len(df_detalles)}")
-
+print(f"🔍 Detalles truncados re-consultados: {parser.detail_fetches}")
+print(f"📊 Peticiones a Bsale: {dict(bsale.stats)}")
 print("🌟 Proceso completo.")
-
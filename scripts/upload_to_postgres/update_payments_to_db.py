@@ -1,10 +1,18 @@
-import requests
 import pandas as pd
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import create_engine, text
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "azure_functions"))
+from shared_code.bsale_client import client_from_env
+from shared_code.checkpoints import CheckpointStore, utc_midnight
+from shared_code.payments import payment_record
+from shared_code.pg_copy import upsert_records
+from shared_code.records import Records
+from shared_code.serialization import blob_format
 
 # === Cargar variables de entorno ===
 load_dotenv(dotenv_path=".env")
@@ -24,75 +32,62 @@ engine = create_engine(
 blob_service = BlobServiceClient.from_connection_string(AZURE_BLOB_CONN_STR)
 container_client = blob_service.get_container_client(BLOB_CONTAINER)
 
-# === Obtener la fecha máxima de payment_date en la base ===
-with engine.connect() as conn:
-    result = conn.execute(text("SELECT MAX(payment_date) FROM pagos"))
-    last_payment_timestamp = result.scalar()
-
-if last_payment_timestamp is None:
-    last_saved_datetime = datetime.now(timezone.utc) - timedelta(days=90)
-else:
-    last_saved_datetime = pd.to_datetime(last_payment_timestamp, unit="s").normalize() + timedelta(days=1)
+checkpoints = CheckpointStore(engine)
+backup_format = blob_format()
 
-start_ts = int(last_saved_datetime.timestamp())
 
-# Calcular el timestamp de ayer (UTC a las 00:00)
-today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-yesterday_ts = int(today.timestamp())
+# === Punto de partida la primera vez (sin checkpoint) ===
+def initial_start():
+    with engine.connect() as conn:
+        last_payment_timestamp = conn.execute(text("SELECT MAX(payment_date) FROM pagos")).scalar()
 
-# === Validar rango de fechas ===
-if start_ts >= yesterday_ts:
-    print("⚠️ No hay nuevos pagos para descargar: el rango de fechas es inválido.")
-    exit()
+    if last_payment_timestamp is None:
+        return (datetime.now(timezone.utc) - timedelta(days=90)).timestamp()
+    return pd.to_datetime(last_payment_timestamp, unit="s").normalize().timestamp()
 
-# === Configuración API ===
-BASE_URL = "https://api.bsale.cl/v1/payments.json"
-params = {
-    "recorddaterange": f"[{start_ts},{yesterday_ts}]",
-    "limit": 50,
-    "offset": 0
-}
-headers = {"access_token": ACCESS_TOKEN}
 
-# === Descarga de pagos ===
-payments_data = []
-print(f"🔄 Descargando pagos desde {start_ts} hasta {yesterday_ts}...")
+# Calcular el timestamp de hoy (UTC a las 00:00)
+yesterday_ts = int(utc_midnight().timestamp())
+bsale = client_from_env(ACCESS_TOKEN)
 
+# Primero la ventana interrumpida (si la hay), luego la nueva hasta hoy
 while True:
-    response = requests.get(BASE_URL, headers=headers, params=params)
-    if response.status_code != 200:
-        print(f"❌ Error: {response.status_code}, {response.text}")
+    window = checkpoints.next_window("pagos", yesterday_ts, initial_start)
+    if window is None:
+        print("⚠️ No hay nuevos pagos para descargar.")
         break
 
-    items = response.json().get("items", [])
-    if not items:
+    # === Configuración API ===
+    params = {
+        "recorddaterange": f"[{window.window_start},{window.window_end}]",
+        "offset": window.last_offset
+    }
+    print(f"🔄 Descargando pagos desde {window.window_start} hasta {window.window_end} (offset {window.last_offset})...")
+
+    try:
+        # Cada lote se respalda y se carga antes de avanzar el checkpoint
+        for offset, payments in bsale.page_batches("payments.json", params):
+            # Misma fila que UpdatePayments y la sincronización diaria; los
+            # tipos (payment_date BIGINT, etc.) salen del esquema declarado
+            records = Records.of([payment_record(payment) for payment in payments])
+
+            # Guardar respaldo en Blob (Parquet por defecto, BLOB_FORMAT=csv para CSV)
+            blob_path = f"pagos/payments_{window.window_start}_to_{window.window_end}_{offset:07d}{backup_format.extension}"
+            container_client.get_blob_client(blob_path).upload_blob(backup_format.dumps(records, "pagos"), overwrite=True)
+            print(f"📄 Pagos guardados en Blob Storage: {blob_path}")
+
+            # Insertar en PostgreSQL
+            result = upsert_records(engine, records, "pagos")
+            print(f"✅ {result.rows} pagos cargados (upsert) en la base de datos ({result.rows_per_second:,.0f} filas/s).")
+
+            checkpoints.advance("pagos", offset)
+    except Exception as exc:
+        # El checkpoint conserva ventana y offset para retomar
+        checkpoints.fail("pagos", exc)
+        raise
+
+    checkpoints.complete("pagos")
+    if window.window_end >= yesterday_ts:
         break
 
-    for payment in items:
-        payments_data.append({
-            "payment_id": payment.get("id"),
-            "payment_date": payment.get("recordDate"),
-            "amount": payment.get("amount"),
-            "payment_method": payment.get("payment_type", {}).get("id"),
-            "document_id": payment.get("document", {}).get("id"),
-            "client_id": payment.get("user", {}).get("id"),
-            "state": payment.get("state", {})
-        })
-
-    params["offset"] += params["limit"]
-
-# === Guardar CSV en Blob y PostgreSQL ===
-if payments_data:
-    df = pd.DataFrame(payments_data)
-    df["payment_date"] = df["payment_date"].astype("int64")
-
-    # Guardar CSV en Blob
-    blob_path = f"pagos/payments_{start_ts}_to_{yesterday_ts}.csv"
-    container_client.get_blob_client(blob_path).upload_blob(df.to_csv(index=False), overwrite=True)
-    print(f"📄 Pagos guardados en Blob Storage: {blob_path}")
-
-    # Insertar en PostgreSQL
-    df.to_sql("pagos", engine, if_exists="append", index=False)
-    print(f"✅ {len(df)} pagos insertados en la base de datos.")
-else:
-    print("⚠️ No se encontraron pagos en el rango especificado.")
+print(f"📊 Peticiones a Bsale: {dict(bsale.stats)}")